@@ -0,0 +1,15 @@
+"""
+Makes the shared helpers in `scripts/` importable from the advanced Cirq examples.
+
+The examples are run as scripts from their own directory, so they `import _paths` before importing
+modules from other directories of the repository, such as `metrics` from `scripts/`.
+"""
+import os
+import sys
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+for directory in ["scripts"]:
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.append(path)
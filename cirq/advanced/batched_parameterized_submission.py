@@ -3,19 +3,14 @@ This advanced example demonstrates how one can submit a list of circuits with a
 """
 import os
 
-import numpy as np
 import sympy
+from chunking import ChunkScheduler
 from iqm.cirq_iqm.iqm_sampler import IQMSampler
-from iqm.cirq_iqm.optimizers import simplify_circuit
+from streaming import histograms
+from sweep_compiler import SweepCompiler
 
 import cirq
 
-
-def fold_func(x: np.ndarray) -> str:
-    """Fold the measured bit arrays into strings."""
-    return ''.join(map(lambda x: chr(x + ord('0')), x))
-
-
 HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
 sampler = IQMSampler(HELMI_CORTEX_URL)
 device = sampler.device
@@ -34,6 +29,9 @@ circuit_template = cirq.Circuit([
     cirq.measure(q1, q2, key='m'),
 ])
 
+# Decompose, route and simplify the template once, each sweep point only resolves the theta gates
+compiler = SweepCompiler(circuit_template, device)
+
 # Create a list of cirq.Circuits and their corresponding parameter sweeps
 circuit_list = []
 
@@ -45,22 +43,13 @@ for i in range(num_circuits_in_batch):
     param_sweep = cirq.Linspace(
         theta.name, start=0, stop=1, length=num_sweeps_in_circuit,
     )
-    for param_values in param_sweep:
-        # Resolve the parameters for the circuit
-        resolved_circuit = cirq.resolve_parameters(
-            circuit_template, param_values,
-        )
-        decomposed_circuit = device.decompose_circuit(resolved_circuit)
-        routed_circuit, _, _ = device.route_circuit(decomposed_circuit)
-        simplified_circuit = simplify_circuit(routed_circuit)
-
-        circuit_list.append(simplified_circuit)
-
-# Use run_iqm_batch instead of sampler.run_sweep
-results = sampler.run_iqm_batch(circuit_list, repetitions=1000)
+    circuit_list.extend(compiler.resolve_sweep(param_sweep))
 
-for i, result in enumerate(results):
+# Use run_iqm_batch instead of sampler.run_sweep. The circuits are sent in chunks within the request
+# limits of the server, and each histogram is printed as soon as its chunk has finished.
+scheduler = ChunkScheduler(sampler, max_circuits=10)
+for i, counts in histograms(scheduler.stream(circuit_list, repetitions=1000), key="m"):
     batch_idx = i // num_sweeps_in_circuit
     sweep_idx = i % num_sweeps_in_circuit
     print(f'Batch #{batch_idx}, Sweep #{sweep_idx}')
-    print(result.histogram(key="m", fold_func=fold_func))
+    print(counts.to_dict(style="cirq"))
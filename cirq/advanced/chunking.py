@@ -0,0 +1,154 @@
+"""
+Split oversized batches into chunks that respect the request limits of the server.
+
+Sending thousands of circuits in one `run_iqm_batch` call can exceed the request size and timeout
+limits of the server, and a single invalid circuit fails the whole batch. `ChunkScheduler`
+
+- splits the circuits into consecutive chunks by serialized payload size, total shots and number of
+  circuits,
+- keeps `max_in_flight` chunks submitted, so the next chunk is uploaded while the previous one runs,
+- retries a chunk which failed with a transient error, a timeout or a lost connection, with a growing
+  delay,
+- splits a chunk which the server rejected in halves right away until the failing circuits are
+  isolated, so one bad circuit does not fail its neighbours and costs no retries,
+- returns the results in the original order of the circuits.
+
+Usage:
+
+    from chunking import ChunkScheduler
+
+    scheduler = ChunkScheduler(sampler, max_payload_bytes=2_000_000)
+    results = scheduler.run(circuits, repetitions=1000)
+"""
+import time
+
+import requests
+from iqm.cirq_iqm.serialize import serialize_circuit
+from iqm.iqm_client import APITimeoutError
+from streaming import run_chunk, stream_chunks
+
+import cirq
+
+DEFAULT_MAX_PAYLOAD_BYTES = 5_000_000
+DEFAULT_MAX_SHOTS = 1_000_000
+DEFAULT_MAX_CIRCUITS = 200
+# Errors which do not depend on the circuits, a chunk failing with one of them is sent again as it is
+TRANSIENT_ERRORS = (
+    TimeoutError, ConnectionError, APITimeoutError, requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+)
+
+
+def payload_size(circuit: cirq.Circuit) -> int:
+    """
+    Returns the size in bytes of the circuit as serialized in an IQM run request.
+
+    Circuits that are not native to IQM devices are measured by their Cirq JSON instead.
+    """
+    try:
+        return len(serialize_circuit(circuit).model_dump_json())
+    except (TypeError, ValueError):
+        return len(cirq.to_json(circuit))
+
+
+def plan_chunks(
+    sizes: list[int], repetitions: int, max_payload_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES,
+    max_shots: int = DEFAULT_MAX_SHOTS, max_circuits: int = DEFAULT_MAX_CIRCUITS,
+) -> list[list[int]]:
+    """
+    Groups consecutive circuits with the given payload sizes into chunks within all three limits.
+
+    A circuit which exceeds a limit on its own gets a chunk of its own.
+    """
+    chunks = []
+    chunk, chunk_bytes = [], 0
+    for index, size in enumerate(sizes):
+        if chunk and (
+            chunk_bytes + size > max_payload_bytes
+            or (len(chunk) + 1) * repetitions > max_shots
+            or len(chunk) + 1 > max_circuits
+        ):
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(index)
+        chunk_bytes += size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class ChunkScheduler:
+    """
+    Runs lists of circuits on `sampler` in chunks, see the module documentation.
+
+    `retries` is the number of times a chunk which failed with one of `TRANSIENT_ERRORS` is sent again,
+    with `backoff` seconds of delay doubling every attempt. Other errors are not retried, the chunk is
+    split in halves instead. If `raise_errors` is False, a circuit that fails on its own, or the circuits
+    of a chunk that still fails with a transient error, get the exception in place of a result instead of
+    stopping the whole run.
+    """
+
+    def __init__(
+        self, sampler, max_payload_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES, max_shots: int = DEFAULT_MAX_SHOTS,
+        max_circuits: int = DEFAULT_MAX_CIRCUITS, max_in_flight: int = 2, retries: int = 2, backoff: float = 1.0,
+        raise_errors: bool = True,
+    ):
+        self.sampler = sampler
+        self.max_payload_bytes = max_payload_bytes
+        self.max_shots = max_shots
+        self.max_circuits = max_circuits
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self.raise_errors = raise_errors
+
+    def plan(self, circuits, repetitions: int) -> list[list[int]]:
+        """
+        Returns the chunks of circuit indices the circuits are sent in.
+        """
+        return plan_chunks(
+            [payload_size(circuit) for circuit in circuits], repetitions,
+            self.max_payload_bytes, self.max_shots, self.max_circuits,
+        )
+
+    def _submit(self, circuits, repetitions: int) -> list:
+        """
+        Runs one chunk and returns its results, sending it again after transient errors.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return list(run_chunk(self.sampler, circuits, repetitions))
+            except TRANSIENT_ERRORS:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+
+    def _run_chunk(self, circuits, repetitions: int) -> list:
+        """
+        Runs one chunk and returns its results, splitting the chunk in halves if the server rejects it.
+        """
+        try:
+            return self._submit(circuits, repetitions)
+        except Exception as e:  # the server reports invalid circuits with different errors
+            if isinstance(e, TRANSIENT_ERRORS) or len(circuits) == 1:
+                if self.raise_errors:
+                    raise
+                return [e] * len(circuits)
+        middle = len(circuits) // 2
+        return self._run_chunk(circuits[:middle], repetitions) + self._run_chunk(circuits[middle:], repetitions)
+
+    def stream(self, circuits, repetitions: int, ordered: bool = True):
+        """
+        Yields (index, result) tuples as the chunks finish, see `streaming.stream_chunks`.
+        """
+        circuits = list(circuits)
+
+        def run(chunk):
+            return self._run_chunk([circuits[i] for i in chunk], repetitions)
+
+        return stream_chunks(run, self.plan(circuits, repetitions), self.max_in_flight, ordered)
+
+    def run(self, circuits, repetitions: int) -> list:
+        """
+        Runs every circuit and returns the results in the order of `circuits`.
+        """
+        return [result for _, result in self.stream(circuits, repetitions)]
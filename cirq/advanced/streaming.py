@@ -0,0 +1,143 @@
+"""
+Stream the results of a large batch as it runs.
+
+`sampler.run_iqm_batch(circuits)` returns only after every circuit of the batch has run, and all the
+measurement arrays are held in memory until the loop over the results is done. `stream_batch` splits the
+circuits into chunks of `chunk_size`, keeps at most `max_in_flight` chunks running at a time and yields
+each result as soon as its chunk finishes, so post-processing overlaps with the device run and only the
+chunks in flight are kept in memory.
+
+`stream_histograms` packs the measurements of every result into `PackedCounts` right away and drops the
+raw arrays, and `RunningHistogram` adds up the counts of many results.
+
+Usage:
+
+    from streaming import RunningHistogram, stream_histograms
+
+    total = RunningHistogram()
+    for index, counts in stream_histograms(sampler, circuits, repetitions=1000, key="m"):
+        print(index, counts.to_dict(style="cirq"))
+        total.add(counts)
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import _paths  # noqa: F401
+from packed_counts import PackedCounts
+
+DEFAULT_CHUNK_SIZE = 50
+
+
+def run_chunk(sampler, circuits, repetitions: int) -> list:
+    """
+    Runs a list of circuits as one batch, with `run_batch` for samplers without `run_iqm_batch`.
+    """
+    if hasattr(sampler, "run_iqm_batch"):
+        return sampler.run_iqm_batch(circuits, repetitions=repetitions)
+    return [results[0] for results in sampler.run_batch(circuits, repetitions=repetitions)]
+
+
+def stream_chunks(run, chunks: list[list[int]], max_in_flight: int = 2, ordered: bool = True):
+    """
+    Calls `run(chunk)` for every chunk of circuit indices from a pool of worker threads and yields
+    (index, result) tuples as the chunks finish. `run` returns the results of the circuits of the chunk.
+
+    At most `max_in_flight` chunks run at a time. With `ordered` the chunks are yielded in the order of
+    `chunks`, a finished chunk waits for the chunks before it. Otherwise they are yielded in order of completion.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+    pending = iter(enumerate(chunks))
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        running = {}
+        finished = {}
+        next_chunk = 0
+
+        def fill():
+            # Finished chunks waiting for an earlier one count towards the window, which bounds the memory
+            while len(running) + len(finished) < max_in_flight:
+                number, chunk = next(pending, (None, None))
+                if chunk is None:
+                    return
+                running[executor.submit(run, chunk)] = number
+
+        fill()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[running.pop(future)] = future.result()
+
+            ready = sorted(finished) if not ordered else []
+            while ordered and next_chunk in finished:
+                ready.append(next_chunk)
+                next_chunk += 1
+            for number in ready:
+                results = finished.pop(number)
+                fill()
+                yield from zip(chunks[number], results)
+
+
+def stream_batch(
+    sampler, circuits, repetitions: int, chunk_size: int = DEFAULT_CHUNK_SIZE, max_in_flight: int = 2,
+    ordered: bool = True,
+):
+    """
+    Runs the circuits in chunks of `chunk_size` and yields (index, result) tuples as the chunks finish,
+    see `stream_chunks`.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    circuits = list(circuits)
+    chunks = [
+        list(range(start, min(start + chunk_size, len(circuits)))) for start in range(0, len(circuits), chunk_size)
+    ]
+
+    def run(chunk):
+        return run_chunk(sampler, [circuits[i] for i in chunk], repetitions)
+
+    return stream_chunks(run, chunks, max_in_flight, ordered)
+
+
+def histograms(stream, key: str):
+    """
+    Turns a stream of (index, result) tuples into (index, PackedCounts) of the measurement `key`.
+
+    A circuit which failed in a `ChunkScheduler` with `raise_errors=False` has its exception in place of
+    a result, it is passed on as (index, exception).
+    """
+    for index, result in stream:
+        if isinstance(result, Exception):
+            yield index, result
+        else:
+            yield index, PackedCounts.from_measurements(result.measurements[key])
+
+
+def stream_histograms(sampler, circuits, repetitions: int, key: str, **kwargs):
+    """
+    Like `stream_batch`, but yields (index, PackedCounts) of the measurement `key` of each result.
+    """
+    return histograms(stream_batch(sampler, circuits, repetitions, **kwargs), key)
+
+
+class RunningHistogram:
+    """
+    The sum of the counts of many results of the same measurement.
+    """
+
+    def __init__(self, key: str = None):
+        self.key = key
+        self.counts = None
+        self.num_results = 0
+
+    def add(self, result):
+        """
+        Adds a `PackedCounts` or the measurement `key` of a `cirq.Result`.
+        """
+        counts = result if isinstance(result, PackedCounts) else PackedCounts.from_measurements(
+            result.measurements[self.key],
+        )
+        self.counts = counts if self.counts is None else self.counts.merge(counts)
+        self.num_results += 1
+
+    def to_dict(self, style: str = "cirq") -> dict:
+        return self.counts.to_dict(style=style) if self.counts is not None else {}
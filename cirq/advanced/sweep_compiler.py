@@ -0,0 +1,66 @@
+"""
+Compile a parameterized circuit once for a whole sweep.
+
+Resolving the parameters first and then decomposing, routing and simplifying every resolved circuit
+repeats the same work for each sweep point, although only a few gate angles differ between them.
+`SweepCompiler` decomposes, routes and simplifies the symbolic template once, records the moments which
+still contain parameterized operations and builds each resolved circuit by resolving only those
+operations. All other moments are shared between the resolved circuits.
+
+The resolved circuits are native to the device. As the template is simplified before the angles are known,
+gates which become trivial for a particular value (for example `Z**0`) are kept rather than removed.
+
+Usage:
+
+    from sweep_compiler import SweepCompiler
+
+    compiler = SweepCompiler(circuit_template, sampler.device)
+    circuits = compiler.resolve_sweep(cirq.Linspace("theta", start=0, stop=1, length=1000))
+    results = sampler.run_iqm_batch(circuits, repetitions=1000)
+"""
+from iqm.cirq_iqm.optimizers import simplify_circuit
+
+import cirq
+
+
+class SweepCompiler:
+    """
+    A parameterized circuit decomposed, routed and optionally simplified once for `device`.
+    """
+
+    def __init__(self, circuit: cirq.Circuit, device, simplify: bool = True):
+        self.circuit = circuit
+        self.device = device
+        decomposed = device.decompose_circuit(circuit)
+        routed, self.initial_mapping, self.final_mapping = device.route_circuit(decomposed)
+        self.compiled = simplify_circuit(routed) if simplify else routed
+
+        self.parameter_names = sorted(cirq.parameter_names(self.compiled))
+        # Only these moments change between sweep points: (index, fixed operations, parameterized operations)
+        self._slots = []
+        for index, moment in enumerate(self.compiled.moments):
+            parameterized = [op for op in moment.operations if cirq.is_parameterized(op)]
+            if parameterized:
+                fixed = [op for op in moment.operations if not cirq.is_parameterized(op)]
+                self._slots.append((index, fixed, parameterized))
+
+    @property
+    def num_parameterized_operations(self) -> int:
+        return sum(len(slot[2]) for slot in self._slots)
+
+    def resolve(self, resolver: cirq.ParamResolverOrSimilarType) -> cirq.Circuit:
+        """
+        Returns the compiled circuit with the parameter values of `resolver` assigned.
+        """
+        resolver = cirq.ParamResolver(resolver)
+        moments = list(self.compiled.moments)
+        for index, fixed, parameterized in self._slots:
+            resolved = [cirq.resolve_parameters(op, resolver) for op in parameterized]
+            moments[index] = cirq.Moment(fixed + resolved)
+        return cirq.Circuit.from_moments(*moments)
+
+    def resolve_sweep(self, sweep: cirq.Sweepable) -> list[cirq.Circuit]:
+        """
+        Returns one resolved circuit for each point of the sweep, in the order of the sweep.
+        """
+        return [self.resolve(resolver) for resolver in cirq.to_resolvers(sweep)]
@@ -0,0 +1,74 @@
+"""
+Target of `scripts/sweep_launcher.py` for the theta sweep of `parameterized_submission.py`.
+
+`evaluate` runs the sweep points of one shard as one batch and returns the probabilities of the outcomes
+00, 01, 10 and 11 for every point, in the cirq order where Alice is the leftmost bit. Without
+`HELMI_CORTEX_URL` the circuits are simulated noiselessly for the Adonis architecture of Helmi.
+
+Run the module on its own to check the order of the outcomes: theta = 0.5 flips only Alice, so all the
+probability is in the outcome 10.
+
+Usage:
+
+    python ../../scripts/sweep_launcher.py submit theta_sweep sweep_shard.py:evaluate theta=0:1:1000 --shards 10
+    python sweep_shard.py
+"""
+import os
+
+import numpy as np
+import sympy
+from chunking import ChunkScheduler
+from streaming import histograms
+from sweep_compiler import SweepCompiler
+
+import cirq
+
+REPETITIONS = 1000
+
+
+def get_sampler():
+    HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
+    if not HELMI_CORTEX_URL:
+        from iqm.cirq_iqm import Adonis
+
+        print("Environment variable HELMI_CORTEX_URL is not set. Simulating the circuits instead.")
+        return cirq.Simulator(), Adonis()
+    from iqm.cirq_iqm.iqm_sampler import IQMSampler
+
+    sampler = IQMSampler(HELMI_CORTEX_URL)
+    return sampler, sampler.device
+
+
+def evaluate(points: np.ndarray, names: list[str]) -> np.ndarray:
+    """
+    Returns the (points, 4) outcome probabilities of the circuit at every theta in `points`.
+    """
+    sampler, device = get_sampler()
+    q1, q2 = cirq.NamedQubit('Alice'), cirq.NamedQubit('Bob')
+    theta = sympy.Symbol("theta")
+    circuit_template = cirq.Circuit([
+        cirq.H(q1),
+        cirq.CNOT(q1, q2),
+        cirq.Z(q1) ** theta,
+        cirq.Z(q2) ** theta,
+        cirq.CNOT(q1, q2),
+        cirq.H(q1),
+        cirq.measure(q1, q2, key='m'),
+    ])
+    compiler = SweepCompiler(circuit_template, device)
+    column = names.index("theta")
+    circuits = [compiler.resolve({"theta": value}) for value in points[:, column]]
+
+    probabilities = np.zeros((len(points), 4))
+    scheduler = ChunkScheduler(sampler)
+    for i, counts in histograms(scheduler.stream(circuits, repetitions=REPETITIONS), key="m"):
+        # PackedCounts has the first measured qubit as bit 0, cirq has it as the leftmost bit
+        indices, values = counts.reorder(list(reversed(range(counts.num_bits)))).to_distribution()
+        probabilities[i, indices] = values
+    return probabilities
+
+
+if __name__ == "__main__":
+    row = evaluate(np.array([[0.5]]), ["theta"])[0]
+    print(f"Probabilities of 00, 01, 10 and 11 at theta = 0.5: {row}")
+    assert np.allclose(row, [0, 0, 1, 0]), "Outcome columns are not in cirq order"
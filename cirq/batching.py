@@ -0,0 +1,89 @@
+"""
+Collect circuits and run compatible ones as a single batch job.
+
+`IQMSampler.run_iqm_batch` runs a list of circuits in one job. A `BatchPlanner` collects the circuits a
+script wants to run, groups the ones with the same number of repetitions and submits each group with
+one `run_iqm_batch` call. Samplers without `run_iqm_batch`, such as `cirq.Simulator`, use the generic
+`run_batch` instead. Every added circuit gets a `BatchedResult` which holds its own `cirq.Result`
+once the batch has run.
+
+Usage:
+
+    from batching import BatchPlanner
+
+    planner = BatchPlanner(sampler)
+    handles = [planner.add(circuit, repetitions=1000) for circuit in circuits]
+    planner.run()
+    results = [handle.result() for handle in handles]
+"""
+
+
+class BatchedResult:
+    """
+    The result of one circuit of a batch job.
+    """
+
+    def __init__(self, circuit, repetitions: int):
+        self.circuit = circuit
+        self.repetitions = repetitions
+        self._result = None
+
+    @property
+    def done(self) -> bool:
+        return self._result is not None
+
+    def result(self):
+        if not self.done:
+            raise RuntimeError("The batch containing this circuit has not been run yet")
+        return self._result
+
+
+class BatchPlanner:
+    """
+    Groups circuits with equal repetitions into one batch per group.
+
+    The calibration set is fixed by the sampler, so circuits of one planner always share it.
+    `max_circuits` limits the number of circuits in one batch.
+    """
+
+    def __init__(self, sampler, max_circuits: int = 200):
+        self.sampler = sampler
+        self.max_circuits = max_circuits
+        self._pending = []
+
+    def add(self, circuit, repetitions: int) -> BatchedResult:
+        """
+        Adds a circuit to the next batch and returns the handle of its result.
+        """
+        handle = BatchedResult(circuit, repetitions)
+        self._pending.append(handle)
+        return handle
+
+    def plan(self) -> list[list[BatchedResult]]:
+        """
+        Returns the pending circuits grouped into batches, keeping the order in which they were added.
+        """
+        groups = {}
+        for handle in self._pending:
+            groups.setdefault(handle.repetitions, []).append(handle)
+
+        batches = []
+        for group in groups.values():
+            for start in range(0, len(group), self.max_circuits):
+                batches.append(group[start:start + self.max_circuits])
+        return batches
+
+    def _run_batch(self, circuits, repetitions):
+        if hasattr(self.sampler, "run_iqm_batch"):
+            return self.sampler.run_iqm_batch(circuits, repetitions=repetitions)
+        return [results[0] for results in self.sampler.run_batch(circuits, repetitions=repetitions)]
+
+    def run(self):
+        """
+        Runs every planned batch and stores the results in the handles.
+        """
+        for batch in self.plan():
+            results = self._run_batch([handle.circuit for handle in batch], batch[0].repetitions)
+            for handle, result in zip(batch, results):
+                handle._result = result
+        self._pending = []
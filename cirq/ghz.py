@@ -2,18 +2,14 @@ import argparse
 import os
 from argparse import RawTextHelpFormatter
 
-import numpy as np
+import _paths  # noqa: F401
 from iqm.cirq_iqm import Adonis
 from iqm.cirq_iqm.iqm_sampler import IQMSampler
+from metrics import classical_fidelity, ghz_distribution, total_variation_distance
+from packed_counts import PackedCounts
 
 import cirq
 
-
-def fold_func(x: np.ndarray) -> str:
-    """Fold the measured bit arrays into strings."""
-    return ''.join(map(lambda x: chr(x + ord('0')), x))
-
-
 """
 
 This example creates a 5 qubit GHZ state in cirq
@@ -82,7 +78,7 @@ def main():
     shots = 10000
 
     bell_vd = []
-    id_dist = [0.5, 0, 0, 0.5]
+    target = ghz_distribution(2)  # |00> + |11> / sqrt(2)
 
     print(" ")
     print(offset + "================================ ")
@@ -103,17 +99,10 @@ def main():
         decomposed_circuit = adonis.decompose_circuit(circuit)
 
         result = sampler.run(decomposed_circuit, repetitions=shots)
-        counts = result.histogram(key='M', fold_func=fold_func)
+        counts = PackedCounts.from_measurements(result.measurements['M']).to_dict(style='cirq')
 
-        values = counts.values()
-        values_list = list(values)
-
-        vd = 0  # Variational distance
-        fid1 = 0  # Fidelity
-        for i in range(len(counts)):
-            vd += np.abs(values_list[i] / shots - id_dist[i])
-            vd = 0.5 * vd
-            fid1 += np.sqrt((values_list[i] / shots) * id_dist[i])
+        vd = total_variation_distance(counts, target)  # Variational distance
+        fid1 = classical_fidelity(counts, target)  # Fidelity
 
         bell_vd.append(vd)
 
@@ -129,9 +118,7 @@ def main():
 
         count += 1
 
-    id_dist = [0 for i in range(32)]
-    id_dist[0] = 0.5
-    id_dist[31] = 0.5
+    target = ghz_distribution(5)
 
     q = [cirq.NamedQubit(f"QB{j + 1}") for j in range(5)]
     circuit = cirq.Circuit()
@@ -145,17 +132,10 @@ def main():
     decomposed_circuit = adonis.decompose_circuit(circuit)
 
     result = sampler.run(decomposed_circuit, repetitions=shots)
-    counts = result.histogram(key='M', fold_func=fold_func)
-
-    values = counts.values()
-    values_list = list(values)
+    counts = PackedCounts.from_measurements(result.measurements['M']).to_dict(style='cirq')
 
-    vd = 0
-    fid2 = 0
-    for i in range(len(counts)):
-        vd += np.abs(values_list[i] / shots - id_dist[i])
-        vd = 0.5 * vd
-        fid2 += np.sqrt((values_list[i] / shots) * id_dist[i])
+    vd = total_variation_distance(counts, target)
+    fid2 = classical_fidelity(counts, target)
 
     print(" ")
     print(offset + "================================ ")
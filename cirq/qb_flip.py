@@ -5,17 +5,14 @@ import argparse
 import os
 from argparse import RawTextHelpFormatter
 
-import numpy as np
+import _paths  # noqa: F401
+from batching import BatchPlanner
 from iqm.cirq_iqm.iqm_sampler import IQMSampler
+from packed_counts import PackedCounts
 
 import cirq
 
 
-def fold_func(x: np.ndarray) -> str:
-    """Fold the measured bit arrays into strings."""
-    return ''.join(map(lambda x: chr(x + ord('0')), x))
-
-
 def get_args():
     parser = argparse.ArgumentParser(
         description="Qubit flipping options", formatter_class=RawTextHelpFormatter,
@@ -96,14 +93,19 @@ def flip_qubits(qubits: list[int], backend: str, shots: int, verbose: bool):
             circuit = single_flip_circuit(qb)
             circuits.append(circuit)
 
-    for i, circuit in enumerate(circuits):
+    # All circuits are submitted together as one batch job
+    planner = BatchPlanner(sampler)
+    handles = [planner.add(circuit, repetitions=shots) for circuit in circuits]
+    planner.run()
+
+    for i, (circuit, handle) in enumerate(zip(circuits, handles)):
         if verbose:
             print(f"Circuit {i+1}:\n")
             print(circuit)
 
-        result = sampler.run(circuit, repetitions=shots)
+        result = handle.result()
 
-        counts = result.histogram(key='M', fold_func=fold_func)
+        counts = PackedCounts.from_measurements(result.measurements['M']).to_dict(style='cirq')
 
         if qubits is None:
             success_probability = calculate_success_probability(
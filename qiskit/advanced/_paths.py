@@ -0,0 +1,16 @@
+"""
+Makes the Qiskit examples and the shared helpers in `scripts/` importable from the advanced examples.
+
+The examples are run as scripts from their own directory, so they `import _paths` before importing
+modules from other directories of the repository, such as `backends` from `qiskit/`. `scripts/` is
+added as well, since the Qiskit examples import their helpers from there.
+"""
+import os
+import sys
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+for directory in ["qiskit", "scripts"]:
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.append(path)
@@ -0,0 +1,300 @@
+"""
+Classical shadows: estimate many observables of a state from randomized Pauli measurements.
+
+Full state tomography needs 3^n measurement circuits and a 4^n parameter fit, see `tomography.py`. A
+classical shadow measures every qubit in a random Pauli basis instead. Each shot is one snapshot of the
+state, and the snapshots estimate the expectation value of any k-local Pauli observable with an error
+that shrinks with the number of snapshots, independent of n. With median-of-means, the number of
+snapshots needed for M observables grows only with log(M) (Huang, Kueng and Preskill, Nature Physics
+16, 1050).
+
+- The measurement circuit is one parameterized circuit with an r(theta_q, phi_q) rotation on every qubit.
+  It is transpiled once with a CircuitTemplate, and each random basis setting only binds its angles.
+  Every setting is measured with `shots_per_setting` shots, in chunks of circuits per job.
+- The snapshots are stored as an (N, n) uint8 array with 2 * basis + outcome for every qubit, where the
+  basis is 0, 1 or 2 for X, Y or Z, together with the basis setting each snapshot was measured in.
+  The shots of one setting are not independent, so median-of-means keeps every setting in one group,
+  assigning the settings to the groups in random order, and the errors are computed over the settings.
+- Pauli observables are given as labels like "XXI" in the Qiskit order, where the last character is
+  qubit 0. Their estimates are computed for all observables and snapshots at once with matrix products.
+- The fidelity with a pure target state, for example the GHZ state of `ghz.py`, is estimated
+  directly from the snapshots without expanding it into Pauli observables.
+
+Usage:
+
+    python classical_shadows.py --qubits 5 --backend helmi --snapshots 6000
+"""
+import argparse
+import math
+
+import _paths  # noqa: F401
+import numpy as np
+from backends import BACKENDS, get_backend
+from batching import BatchPlanner
+from circuit_templates import CircuitTemplate
+from tomography import BASES, BASIS_ROTATIONS, ghz_circuit
+
+from qiskit import ClassicalRegister, QuantumCircuit
+from qiskit.circuit import ParameterVector
+from qiskit.quantum_info import Statevector
+
+# (theta, phi) of the r gate of every basis, the Z basis needs no rotation
+ANGLES = np.array([BASIS_ROTATIONS[basis] or (0.0, 0.0) for basis in BASES])
+PAULI_CODES = {"I": 0, "X": 1, "Y": 2, "Z": 3}
+
+_EIGENSTATES = np.array([
+    [[1, 1], [1, -1]],  # X: |+>, |->
+    [[1, 1j], [1, -1j]],  # Y: |+i>, |-i>
+    [[1, 0], [0, 1]],  # Z: |0>, |1>
+]) / np.array([np.sqrt(2), np.sqrt(2), 1])[:, None, None]
+# Inverted single-qubit measurement channel 3 |s><s| - I of every basis and outcome, indexed by 2 * basis + outcome
+SNAPSHOT_OPERATORS = np.array([
+    3 * np.outer(state, state.conj()) - np.eye(2) for basis in _EIGENSTATES for state in basis
+])
+
+
+def shadow_template(circuit: QuantumCircuit, backend, **transpile_options) -> CircuitTemplate:
+    """
+    Returns the measurement circuit of a state circuit without measurements, with the parameter vectors
+    `theta` and `phi` of the basis rotations, transpiled once.
+    """
+    num_qubits = circuit.num_qubits
+    theta = ParameterVector("theta", num_qubits)
+    phi = ParameterVector("phi", num_qubits)
+    measured = circuit.copy(name=f"{circuit.name}-shadow")
+    measured.add_register(ClassicalRegister(num_qubits, "meas"))
+    measured.barrier()
+    for qubit in range(num_qubits):
+        measured.r(theta[qubit], phi[qubit], qubit)
+    measured.measure(range(num_qubits), range(num_qubits))
+    return CircuitTemplate(measured, backend, **transpile_options)
+
+
+def shadow_size(num_observables: int, locality: int, epsilon: float, delta: float = 0.01) -> tuple[int, int]:
+    """
+    Returns the number of snapshots and of median-of-means groups which estimate `num_observables`
+    Pauli observables acting on at most `locality` qubits to within `epsilon` with probability 1 - delta.
+    """
+    groups = math.ceil(2 * math.log(2 * num_observables / delta))
+    per_group = math.ceil(34 * 3 ** locality / epsilon ** 2)
+    return groups * per_group, groups
+
+
+def _block_sums(values: np.ndarray, labels: np.ndarray, num_labels: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the sums along the first axis and the sizes of the blocks of values with labels 0 to num_labels - 1.
+    """
+    order = np.argsort(labels, kind="stable")
+    sizes = np.bincount(labels, minlength=num_labels)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    return np.add.reduceat(values[order], starts[sizes > 0], axis=0), sizes[sizes > 0]
+
+
+def median_of_means(values: np.ndarray, groups: int, settings: np.ndarray = None, seed: int = 0) -> np.ndarray:
+    """
+    Splits the snapshots along the first axis into `groups` groups and returns the median of the group means.
+
+    Snapshots with the same entry in `settings` stay in the same group, and the settings are assigned to
+    the groups in random order. Without `settings` every snapshot is its own setting.
+    """
+    settings = np.arange(len(values)) if settings is None else np.asarray(settings)
+    _, settings = np.unique(settings, return_inverse=True)
+    num_settings = int(settings.max()) + 1
+    groups = max(1, min(groups, num_settings))
+    group_of_setting = np.empty(num_settings, dtype=np.int64)
+    group_of_setting[np.random.default_rng(seed).permutation(num_settings)] = (
+        np.arange(num_settings) * groups // num_settings
+    )
+    sums, sizes = _block_sums(values, group_of_setting[settings], groups)
+    return np.median(sums / sizes.reshape(-1, *[1] * (values.ndim - 1)), axis=0)
+
+
+def standard_error(values: np.ndarray, settings: np.ndarray = None) -> np.ndarray:
+    """
+    Returns the standard error of the mean of the snapshots along the first axis, from the spread of the
+    means of the settings. Without `settings` every snapshot is its own setting.
+    """
+    if settings is None:
+        return values.std(axis=0, ddof=1) / np.sqrt(len(values))
+    _, settings = np.unique(settings, return_inverse=True)
+    sums, sizes = _block_sums(values, settings, int(settings.max()) + 1)
+    means = sums / sizes.reshape(-1, *[1] * (values.ndim - 1))
+    return means.std(axis=0, ddof=1) / np.sqrt(len(means))
+
+
+class ClassicalShadow:
+    """
+    The snapshots of a state as an (N, n) uint8 array of 2 * basis + outcome per qubit, qubit 0 first, and
+    the (N,) index of the basis setting of every snapshot. Without settings every snapshot is its own setting.
+    """
+
+    def __init__(self, snapshots: np.ndarray, settings: np.ndarray = None):
+        self.snapshots = np.asarray(snapshots, dtype=np.uint8)
+        self.settings = np.arange(len(self.snapshots)) if settings is None else np.asarray(settings)
+
+    @property
+    def num_snapshots(self) -> int:
+        return self.snapshots.shape[0]
+
+    @property
+    def num_qubits(self) -> int:
+        return self.snapshots.shape[1]
+
+    @property
+    def bases(self) -> np.ndarray:
+        return self.snapshots >> 1
+
+    @property
+    def outcomes(self) -> np.ndarray:
+        return self.snapshots & 1
+
+    def save(self, path: str):
+        np.savez_compressed(path, snapshots=self.snapshots, settings=self.settings)
+
+    @classmethod
+    def load(cls, path: str) -> "ClassicalShadow":
+        with np.load(path) as data:
+            return cls(data["snapshots"], data["settings"] if "settings" in data else None)
+
+    def _pauli_codes(self, observables: list[str]) -> np.ndarray:
+        codes = np.zeros((len(observables), self.num_qubits), dtype=np.uint8)
+        for row, label in zip(codes, observables):
+            if len(label) != self.num_qubits:
+                raise ValueError(f"Observable {label} does not act on {self.num_qubits} qubits")
+            row[:] = [PAULI_CODES[c] for c in reversed(label)]
+        return codes
+
+    def pauli_snapshots(self, observables: list[str]) -> np.ndarray:
+        """
+        Returns the single-snapshot estimates of Pauli observables as an (N, observables) array.
+
+        A snapshot estimates 3^k (-1)^(parity of the outcomes on the support) for an observable with k
+        non-identity Paulis if it measured all of them in their own basis, and 0 otherwise.
+        """
+        codes = self._pauli_codes(observables)
+        support = (codes > 0).astype(np.int32)
+        bases = self.bases
+        # matches[i, j] counts the qubits of observable j that snapshot i measured in the right basis
+        matches = sum(
+            (bases == basis).astype(np.int32) @ (codes == basis + 1).astype(np.int32).T for basis in range(3)
+        )
+        weights = support.sum(axis=1)
+        parity = (self.outcomes.astype(np.int32) @ support.T) & 1
+        return np.where(matches == weights, (1 - 2 * parity) * 3.0 ** weights, 0.0)
+
+    def expectation_values(self, observables: list[str], groups: int = 10) -> np.ndarray:
+        """
+        Returns the median-of-means estimates of the expectation values of Pauli observables.
+        """
+        return median_of_means(self.pauli_snapshots(observables), groups, self.settings)
+
+    def fidelity_snapshots(self, state: np.ndarray, chunk_size: int = 1024) -> np.ndarray:
+        """
+        Returns the single-snapshot estimates <psi| rho_i |psi> of the fidelity with a pure state vector.
+        """
+        num_qubits = self.num_qubits
+        # Axis 0 of the reshaped state vector is the highest qubit
+        psi = np.asarray(state, dtype=complex).reshape((2,) * num_qubits)
+        estimates = np.empty(self.num_snapshots)
+        for start in range(0, self.num_snapshots, chunk_size):
+            operators = SNAPSHOT_OPERATORS[self.snapshots[start:start + chunk_size]]
+            applied = np.broadcast_to(psi, (len(operators),) + psi.shape)
+            for qubit in range(num_qubits):
+                axis = num_qubits - qubit
+                applied = np.moveaxis(
+                    np.einsum("nij,n...j->n...i", operators[:, qubit], np.moveaxis(applied, axis, -1)), -1, axis,
+                )
+            estimates[start:start + chunk_size] = np.real(applied.reshape(len(operators), -1) @ psi.conj().ravel())
+        return estimates
+
+    def fidelity(self, state: np.ndarray, groups: int = 10) -> float:
+        """
+        Returns the median-of-means estimate of the fidelity with a pure state vector.
+        """
+        return float(median_of_means(self.fidelity_snapshots(state), groups, self.settings))
+
+
+def random_settings(num_settings: int, num_qubits: int, seed: int = None) -> np.ndarray:
+    """
+    Returns random Pauli bases as a (settings, n) uint8 array of 0, 1 or 2 for X, Y or Z.
+    """
+    return np.random.default_rng(seed).integers(0, 3, size=(num_settings, num_qubits), dtype=np.uint8)
+
+
+def collect_shadow(
+    circuit: QuantumCircuit, backend, num_snapshots: int, shots_per_setting: int = 10, chunk_size: int = 200,
+    seed: int = None, **transpile_options,
+) -> ClassicalShadow:
+    """
+    Measures a state circuit without measurements in random Pauli bases and returns its snapshots.
+    """
+    num_qubits = circuit.num_qubits
+    template = shadow_template(circuit, backend, **transpile_options)
+    settings = random_settings(math.ceil(num_snapshots / shots_per_setting), num_qubits, seed)
+    angles = ANGLES[settings]
+    planner = BatchPlanner(backend, max_circuits=chunk_size)
+    handles = [
+        planner.add(template.bind({"theta": a[:, 0], "phi": a[:, 1]}), shots=shots_per_setting) for a in angles
+    ]
+    planner.run()
+
+    snapshots = []
+    bit_weights = 1 << np.arange(num_qubits)
+    counts_per_setting = []
+    for setting, handle in zip(settings, handles):
+        counts = handle.get_counts()
+        outcomes = np.repeat(
+            np.array([int(key.replace(" ", ""), 2) for key in counts]), list(counts.values()),
+        )
+        bits = ((outcomes[:, None] & bit_weights) > 0).astype(np.uint8)
+        snapshots.append(2 * setting + bits)
+        counts_per_setting.append(len(outcomes))
+    return ClassicalShadow(np.concatenate(snapshots), np.repeat(np.arange(len(settings)), counts_per_setting))
+
+
+def neighbour_correlators(num_qubits: int) -> list[str]:
+    """
+    Returns the Z_q Z_(q+1) observables, which are 1 for the GHZ state.
+    """
+    return ["I" * (num_qubits - q - 2) + "ZZ" + "I" * q for q in range(num_qubits - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classical shadow of a GHZ state")
+    parser.add_argument("--qubits", type=int, default=5, help="Number of qubits of the GHZ state. Default 5.")
+    parser.add_argument("--backend", default="helmi", choices=BACKENDS, help="Backend to run on. Default helmi.")
+    parser.add_argument("--snapshots", type=int, default=6000, help="Number of snapshots. Default 6000.")
+    parser.add_argument("--shots-per-setting", type=int, default=10, help="Shots per basis setting. Default 10.")
+    parser.add_argument("--groups", type=int, default=10, help="Median-of-means groups. Default 10.")
+    parser.add_argument("--seed", type=int, help="Seed of the random bases")
+    parser.add_argument(
+        "--observables", nargs="*", default=[],
+        help="Pauli observables to estimate besides the Z_q Z_(q+1) ones, for example XXXXX",
+    )
+    parser.add_argument("--output", help="Save the snapshots to this .npz file")
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend)
+    circuit = ghz_circuit(args.qubits)
+    shadow = collect_shadow(
+        circuit, backend, args.snapshots, args.shots_per_setting, seed=args.seed, optimization_level=3,
+    )
+    if args.output:
+        shadow.save(args.output)
+    print(f"Collected {shadow.num_snapshots} snapshots, {shadow.snapshots.nbytes} bytes")
+
+    fidelity_snapshots = shadow.fidelity_snapshots(Statevector(circuit).data)
+    fidelity = median_of_means(fidelity_snapshots, args.groups, shadow.settings)
+    error = standard_error(fidelity_snapshots, shadow.settings)
+    print(f"Fidelity with the GHZ state: {fidelity:.3f} +- {error:.3f}")
+    # An observable on k qubits needs about 3^k times the snapshots of a single-qubit one
+    observables = neighbour_correlators(args.qubits) + args.observables
+    pauli_snapshots = shadow.pauli_snapshots(observables)
+    values = median_of_means(pauli_snapshots, args.groups, shadow.settings)
+    errors = standard_error(pauli_snapshots, shadow.settings)
+    for label, value, error in zip(observables, values, errors):
+        print(f"<{label}> = {value:+.3f} +- {error:.3f}")
+
+
+if __name__ == "__main__":
+    main()
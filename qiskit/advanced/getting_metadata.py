@@ -1,24 +1,14 @@
 """
 This example demonstrates how to get metadata about your job submitted with Qiskit
 """
-import os
 
-from iqm.qiskit_iqm import IQMProvider
-from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
+import _paths  # noqa: F401
+from backends import get_backend
 
 from qiskit import QuantumCircuit, transpile
 
-backend = IQMFakeAdonis()
-
-# Set up the Helmi backend
-HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
-if not HELMI_CORTEX_URL:
-    print("Environment variable HELMI_CORTEX_URL is not set. Are you running on Lumi? Falling back to a simulator.")
-    # raise ValueError("Environment variable HELMI_CORTEX_URL is not set")
-
-else:
-    provider = IQMProvider(HELMI_CORTEX_URL)
-    backend = provider.get_backend()
+# Set up the Helmi backend, the fake backend without HELMI_CORTEX_URL
+backend = get_backend("helmi")
 
 # Retrieving backend information
 print(f'Native operations: {backend.operation_names}')
@@ -13,28 +13,20 @@ As part of the analysis, the experiment estimates the density matrix of the stat
 Additional details on Qiskit Experiments can be found here: https://qiskit.org/ecosystem/experiments/ and
 more infot on the StateTomography experiment can be found here:
 https://github.com/qiskit-community/qiskit-experiments/blob/0.7.0/docs/manuals/verification/state_tomography.rst
+
+For tomography of 4-6 qubits, see tomography.py.
 """
 
-import os
 
-from iqm.qiskit_iqm import IQMProvider
-from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
+import _paths  # noqa: F401
+from backends import get_backend
 from qiskit_experiments.library import StateTomography
 
 from qiskit import QuantumCircuit
 from qiskit.visualization import plot_state_city
 
-backend = IQMFakeAdonis()
-
-# Set up the Helmi backend
-HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
-if not HELMI_CORTEX_URL:
-    print("Environment variable HELMI_CORTEX_URL is not set. Are you running on Lumi? Falling back to a simulator.")
-    # raise ValueError("Environment variable HELMI_CORTEX_URL is not set")
-
-else:
-    provider = IQMProvider(HELMI_CORTEX_URL)
-    backend = provider.get_backend()
+# Set up the Helmi backend, the fake backend without HELMI_CORTEX_URL
+backend = get_backend("helmi")
 
 circuit = QuantumCircuit(2, name='Bell pair circuit')
 circuit.h(0)
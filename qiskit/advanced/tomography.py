@@ -0,0 +1,252 @@
+"""
+State tomography of several qubits without qiskit-experiments.
+
+`state-tomography.py` runs the StateTomography experiment, which transpiles each of the 3^n measurement
+circuits and fits the state in a single thread. This pipeline is meant for 4-6 qubits:
+
+- The state circuit is transpiled once through the transpile cache. The 3^n measurement circuits are
+  built from the transpiled circuit by appending the native r rotations of the Pauli bases on its
+  final physical qubits, so no basis circuit is transpiled on its own.
+- The measurement circuits are submitted in chunks of `--chunk-size` circuits per job with the
+  BatchPlanner.
+- The density matrix is reconstructed with NumPy for a whole batch of count sets at once: linear
+  inversion of the Pauli expectation values, optionally projected to the closest physical state (the
+  fast maximum likelihood fit of Smolin, Gambetta and Smith, PRL 108, 070502). Bootstrap resamples of
+  the counts give the error of the fidelity, and large batches can be split over a process pool.
+
+The fake backend has 5 qubits, use for example `IQMFakeApollo()` with `run_tomography` for 6 qubits.
+
+Usage:
+
+    python tomography.py --qubits 4 --backend helmi --shots 1000 --fit mle --bootstrap 100
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import _paths  # noqa: F401
+import numpy as np
+from backends import BACKENDS, get_backend
+from batching import BatchPlanner
+from transpile_cache import get_default_cache
+
+from qiskit import ClassicalRegister, QuantumCircuit
+from qiskit.circuit.library import RGate
+from qiskit.quantum_info import Statevector
+
+BASES = "XYZ"
+# Rotation taking the eigenbasis of each Pauli to the computational basis, as (theta, phi) of the r gate
+BASIS_ROTATIONS = {"X": (-np.pi / 2, np.pi / 2), "Y": (np.pi / 2, 0.0), "Z": None}
+PAULIS = np.array([
+    [[1, 0], [0, 1]],
+    [[0, 1], [1, 0]],
+    [[0, -1j], [1j, 0]],
+    [[1, 0], [0, -1]],
+])
+
+
+def measurement_settings(num_qubits: int) -> list[str]:
+    """
+    Returns the 3^n Pauli bases, where character q of a basis is the basis of qubit q.
+    Setting s has the base-3 digit q of s as the basis of qubit q.
+    """
+    return ["".join(reversed(letters)) for letters in product(BASES, repeat=num_qubits)]
+
+
+def measurement_circuits(circuit: QuantumCircuit, backend, cache=None, **transpile_options) -> list[QuantumCircuit]:
+    """
+    Returns the measurement circuits of every Pauli basis of a state circuit without measurements.
+    """
+    num_qubits = circuit.num_qubits
+    settings = measurement_settings(num_qubits)
+    cache = cache or get_default_cache()
+    if "r" not in backend.target.operation_names:
+        # Without native r gates the rotations have to be transpiled as well
+        return [
+            cache.transpile(_append_basis(circuit, setting, list(range(num_qubits)), circuit.name), backend,
+                            **transpile_options)
+            for setting in settings
+        ]
+
+    transpiled = cache.transpile(circuit, backend, **transpile_options)
+    physical = transpiled.layout.final_index_layout() if transpiled.layout else list(range(num_qubits))
+    return [_append_basis(transpiled, setting, physical, circuit.name) for setting in settings]
+
+
+def _append_basis(circuit: QuantumCircuit, setting: str, qubits: list[int], name: str) -> QuantumCircuit:
+    """
+    Returns a copy of the circuit measuring qubit `qubits[q]` in basis `setting[q]` into clbit q.
+    """
+    measured = circuit.copy(name=f"{name}-{setting}")
+    measured.add_register(ClassicalRegister(len(setting), "meas"))
+    measured.barrier()
+    for qubit, basis in zip(qubits, setting):
+        if BASIS_ROTATIONS[basis] is not None:
+            measured.append(RGate(*BASIS_ROTATIONS[basis]), [qubit])
+    measured.measure(qubits, range(len(setting)))
+    measured.metadata = {"setting": setting}
+    return measured
+
+
+def counts_to_probabilities(counts: list[dict], num_qubits: int) -> np.ndarray:
+    """
+    Returns the outcome frequencies of the measurement circuits as a (3^n, 2^n) array.
+    """
+    probabilities = np.zeros((len(counts), 2 ** num_qubits))
+    for row, circuit_counts in zip(probabilities, counts):
+        outcomes = np.array([int(key.replace(" ", ""), 2) for key in circuit_counts])
+        row[outcomes] = list(circuit_counts.values())
+        row /= row.sum()
+    return probabilities
+
+
+def run_tomography(
+    circuit: QuantumCircuit, backend, shots: int = 1000, chunk_size: int = 200, **transpile_options,
+) -> np.ndarray:
+    """
+    Runs the measurement circuits of a state circuit in chunks and returns the (3^n, 2^n) frequencies.
+    """
+    circuits = measurement_circuits(circuit, backend, **transpile_options)
+    planner = BatchPlanner(backend, max_circuits=chunk_size)
+    handles = [planner.add(measured, shots=shots) for measured in circuits]
+    planner.run()
+    return counts_to_probabilities([handle.get_counts() for handle in handles], circuit.num_qubits)
+
+
+def _pauli_codes(num_qubits: int) -> np.ndarray:
+    """
+    Returns the Pauli string estimated by each setting and outcome mask as a (3^n, 2^n) array of base-4
+    codes, where digit q is 0, 1, 2 or 3 for I, X, Y or Z on qubit q.
+    """
+    settings = np.arange(3 ** num_qubits)
+    masks = np.arange(2 ** num_qubits)
+    codes = np.zeros((len(settings), len(masks)), dtype=np.int64)
+    for q in range(num_qubits):
+        basis = (settings // 3 ** q) % 3 + 1
+        codes += np.outer(basis, (masks >> q) & 1) * 4 ** q
+    return codes
+
+
+def linear_inversion(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Returns the density matrices of a (batch, 3^n, 2^n) array of frequencies as a (batch, 2^n, 2^n) array.
+
+    Every Pauli string is estimated by the mean over the settings that measure it, and the density
+    matrix is the sum of the Pauli strings weighted by their expectation values.
+    """
+    batch, num_settings, dim = probabilities.shape
+    num_qubits = dim.bit_length() - 1
+    masks = np.arange(dim)
+    parity = np.array([bin(m).count("1") % 2 for m in range(dim)])
+    walsh = 1 - 2 * parity[masks[:, None] & masks[None, :]]
+    # expectations[b, s, m] is the expectation of the product of the Paulis of setting s on the qubits of m
+    expectations = probabilities @ walsh
+    codes = _pauli_codes(num_qubits)
+    size = 4 ** num_qubits
+    offsets = (np.arange(batch) * size)[:, None, None]
+    sums = np.bincount((codes[None] + offsets).ravel(), weights=expectations.ravel(), minlength=batch * size)
+    paulis = sums.reshape(batch, size) / np.bincount(codes.ravel(), minlength=size)
+
+    # Contract the Pauli axes of the qubits, highest qubit first, with the Pauli matrices
+    tensor = paulis.reshape((batch,) + (4,) * num_qubits)
+    for _ in range(num_qubits):
+        tensor = np.tensordot(tensor, PAULIS, axes=([1], [0]))
+    # Axes are now (batch, row_{n-1}, column_{n-1}, ..., row_0, column_0)
+    order = [0] + list(range(1, 2 * num_qubits, 2)) + list(range(2, 2 * num_qubits + 1, 2))
+    return tensor.transpose(order).reshape(batch, dim, dim) / dim
+
+
+def project_to_physical(densities: np.ndarray) -> np.ndarray:
+    """
+    Returns the closest positive semidefinite unit trace matrices of a (batch, d, d) array of Hermitian
+    matrices, by projecting their eigenvalues onto the probability simplex.
+    """
+    values, vectors = np.linalg.eigh(densities)
+    descending = values[:, ::-1]
+    excess = (np.cumsum(descending, axis=1) - 1) / np.arange(1, values.shape[1] + 1)
+    kept = np.sum(descending > excess, axis=1)
+    shift = excess[np.arange(len(values)), kept - 1]
+    values = np.maximum(values - shift[:, None], 0)
+    return (vectors * values[:, None, :]) @ vectors.conj().transpose(0, 2, 1)
+
+
+def _fit(probabilities: np.ndarray, method: str) -> np.ndarray:
+    densities = linear_inversion(probabilities)
+    if method == "mle":
+        densities = project_to_physical(densities)
+    return densities
+
+
+def reconstruct(probabilities: np.ndarray, method: str = "mle", processes: int = 1) -> np.ndarray:
+    """
+    Fits the density matrices of a (batch, 3^n, 2^n) or (3^n, 2^n) array of frequencies.
+
+    `method` is "linear" for linear inversion or "mle" for the fit projected to a physical state.
+    Batches are split over `processes` worker processes.
+    """
+    if method not in ("linear", "mle"):
+        raise ValueError(f"Unknown fit method {method}, expected linear or mle")
+    single = probabilities.ndim == 2
+    probabilities = probabilities[None] if single else probabilities
+    if processes > 1 and len(probabilities) > 1:
+        chunks = np.array_split(probabilities, min(processes, len(probabilities)))
+        with ProcessPoolExecutor(processes) as executor:
+            densities = np.concatenate(list(executor.map(_fit, chunks, [method] * len(chunks))))
+    else:
+        densities = _fit(probabilities, method)
+    return densities[0] if single else densities
+
+
+def bootstrap_probabilities(probabilities: np.ndarray, shots: int, resamples: int, seed: int = None) -> np.ndarray:
+    """
+    Returns `resamples` multinomial resamples of the frequencies as a (resamples, 3^n, 2^n) array.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(shots, probabilities, size=(resamples, len(probabilities))) / shots
+
+
+def state_fidelity(densities: np.ndarray, state: np.ndarray) -> np.ndarray:
+    """
+    Returns the fidelities of density matrices with a pure state vector.
+    """
+    return np.real(np.einsum("i,...ij,j->...", state.conj(), densities, state))
+
+
+def ghz_circuit(num_qubits: int) -> QuantumCircuit:
+    circuit = QuantumCircuit(num_qubits, name=f"ghz-{num_qubits}")
+    circuit.h(0)
+    for qubit in range(1, num_qubits):
+        circuit.cx(0, qubit)
+    return circuit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="State tomography of a GHZ state")
+    parser.add_argument("--qubits", type=int, default=3, help="Number of qubits of the GHZ state. Default 3.")
+    parser.add_argument("--backend", default="helmi", choices=BACKENDS, help="Backend to run on. Default helmi.")
+    parser.add_argument("--shots", type=int, default=1000, help="Shots per measurement circuit. Default 1000.")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Measurement circuits per job. Default 200.")
+    parser.add_argument("--fit", choices=["linear", "mle"], default="mle", help="Fit method. Default mle.")
+    parser.add_argument("--bootstrap", type=int, default=0, help="Bootstrap resamples for the fidelity error")
+    parser.add_argument("--processes", type=int, default=1, help="Processes fitting the bootstrap resamples")
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend)
+    circuit = ghz_circuit(args.qubits)
+    start = time.perf_counter()
+    probabilities = run_tomography(circuit, backend, args.shots, args.chunk_size, optimization_level=3)
+    measured = time.perf_counter()
+    density = reconstruct(probabilities, args.fit)
+    target = Statevector(circuit).data
+    print(f"Ran {len(probabilities)} measurement circuits in {measured - start:.2f} s")
+    print(f"Fidelity with the GHZ state: {state_fidelity(density, target):.4f}")
+    if args.bootstrap:
+        resampled = bootstrap_probabilities(probabilities, args.shots, args.bootstrap)
+        fidelities = state_fidelity(reconstruct(resampled, args.fit, args.processes), target)
+        print(f"Bootstrap standard deviation over {args.bootstrap} resamples: {fidelities.std():.4f}")
+    print(f"Fitted in {time.perf_counter() - measured:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Wait for jobs from an asyncio event loop.
+
+`job.result()` blocks the interpreter for the whole queue wait of the job. `AsyncJob` wraps a submitted
+job and polls its status instead, with exponential backoff between the polls: first after
+`initial_interval` seconds, then `backoff` times longer each time up to `max_interval`. The status
+requests run in the default executor of the loop, so one event loop can wait for hundreds of jobs
+without a thread per job.
+
+An `AsyncJob` can be awaited for its result, notifies the callbacks added with `add_done_callback` when
+it finishes and can be cancelled on the server with `cancel`. Waiting longer than `timeout` seconds, or
+for more than `max_polls` status requests, raises TimeoutError but leaves the job on the server.
+
+Usage:
+
+    import asyncio
+    from async_jobs import run_all_async, submit
+
+    async def main():
+        job = await submit(backend, circuit, shots=1000)
+        job.add_done_callback(lambda job: print(f"Job {job.job_id()} finished"))
+        result = await job
+
+        results = await run_all_async(backend, circuits, shots=1000)
+
+    asyncio.run(main())
+"""
+import asyncio
+import time
+
+from job_submitter import DEFAULT_MAX_IN_FLIGHT
+
+from qiskit.providers import JobStatus
+from qiskit.providers.jobstatus import JOB_FINAL_STATES
+
+
+class AsyncJob:
+    """
+    Awaitable wrapper of a submitted job, see the module documentation.
+    """
+
+    def __init__(
+        self, job, initial_interval: float = 1.0, max_interval: float = 30.0, backoff: float = 2.0,
+        timeout: float = None, max_polls: int = None,
+    ):
+        if initial_interval <= 0 or backoff < 1:
+            raise ValueError("initial_interval must be positive and backoff at least 1")
+        if max_polls is not None and max_polls < 1:
+            raise ValueError("max_polls must be at least 1")
+        self.job = job
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_polls = max_polls
+        self.polls = 0
+        self._task = None
+        self._callbacks = []
+
+    def job_id(self) -> str:
+        return self.job.job_id()
+
+    async def _status(self) -> JobStatus:
+        self.polls += 1
+        return await asyncio.get_running_loop().run_in_executor(None, self.job.status)
+
+    async def _wait(self):
+        start = time.monotonic()
+        interval = self.initial_interval
+        status = await self._status()
+        while status not in JOB_FINAL_STATES:
+            if self.max_polls is not None and self.polls >= self.max_polls:
+                raise TimeoutError(f"Job {self.job_id()} did not finish in {self.max_polls} status polls")
+            if self.timeout is not None:
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    raise TimeoutError(f"Job {self.job_id()} did not finish in {self.timeout} seconds")
+                interval = min(interval, remaining)
+            await asyncio.sleep(interval)
+            interval = min(interval * self.backoff, self.max_interval)
+            status = await self._status()
+        if status == JobStatus.CANCELLED:
+            raise RuntimeError(f"Job {self.job_id()} was cancelled")
+        # The job has finished, so fetching the result does not wait for the queue. Failed jobs raise here.
+        return await asyncio.get_running_loop().run_in_executor(None, self.job.result)
+
+    def _notify(self, task):
+        for callback in self._callbacks:
+            callback(self)
+
+    def start(self) -> asyncio.Task:
+        """
+        Starts polling in the running event loop and returns the task, which finishes with the result.
+        """
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._wait())
+            self._task.add_done_callback(self._notify)
+        return self._task
+
+    def __await__(self):
+        return self.start().__await__()
+
+    async def result(self):
+        return await self
+
+    def done(self) -> bool:
+        return self._task is not None and self._task.done()
+
+    def add_done_callback(self, callback):
+        """
+        Calls `callback(async_job)` when the job finishes, fails, times out or is cancelled, or right away
+        if it already has. Polling starts if it has not started yet.
+        """
+        if self.done():
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+            self.start()
+
+    async def cancel(self) -> bool:
+        """
+        Stops polling and cancels the job on the server. Returns whether the server cancelled the job.
+        """
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        return bool(await asyncio.get_running_loop().run_in_executor(None, self.job.cancel))
+
+
+async def submit(backend, circuits, shots: int, poll_options: dict = None, **run_options) -> AsyncJob:
+    """
+    Submits the circuits as one job without blocking the event loop and returns it as an AsyncJob.
+
+    `poll_options` are passed on to AsyncJob, extra keyword arguments to `backend.run`.
+    """
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, lambda: backend.run(circuits, shots=shots, **run_options))
+    return AsyncJob(job, **(poll_options or {}))
+
+
+async def run_all_async(
+    backend, circuits, shots: int, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, poll_options: dict = None,
+    **run_options,
+) -> list:
+    """
+    Runs every circuit as its own job, with at most `max_in_flight` jobs unfinished at any time, and
+    returns their results in the order of `circuits`.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+    slots = asyncio.Semaphore(max_in_flight)
+
+    async def run_one(circuit):
+        async with slots:
+            job = await submit(backend, circuit, shots, poll_options, **run_options)
+            try:
+                return await job
+            except asyncio.CancelledError:
+                await asyncio.shield(job.cancel())
+                raise
+
+    return await asyncio.gather(*(run_one(circuit) for circuit in circuits))
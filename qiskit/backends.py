@@ -0,0 +1,96 @@
+"""
+Resolve the backend of the examples by name.
+
+Importing `iqm.qiskit_iqm` and `qiskit_aer` takes a large part of the startup time of the examples, so
+`get_backend` imports only the provider of the backend that is asked for:
+
+    helmi       VTT Helmi through `HELMI_CORTEX_URL`
+    q50         VTT Q50 through `Q50_CORTEX_URL`
+    fake        `IQMFakeAdonis()`, the 5-qubit fake backend with a static noise model
+    emulator    a fake backend with the noise of a calibration set, see `calibrated_emulator.py`
+    aer         the noiseless Aer simulator, also called `simulator`
+
+If the URL of a quantum computer is not set, for example outside of the q_fiqci partition, the fake
+backend is used instead, or the emulator if a calibration JSON is given. Providers and backends are
+created once per process and reused by later calls. If `FIQCI_RESULT_ARCHIVE` is set, the jobs of the
+backends are recorded in that archive, see `result_archive.py`.
+
+Usage:
+
+    from backends import get_backend
+
+    backend = get_backend("helmi")
+    backend = get_backend("helmi", calibration="calibration.json")
+"""
+import os
+
+BACKENDS = ["helmi", "q50", "fake", "emulator", "aer", "simulator"]
+# Environment variable of the URL and name of the quantum computer of each IQM server backend
+QUANTUM_COMPUTERS = {
+    "helmi": ("HELMI_CORTEX_URL", None),
+    "q50": ("Q50_CORTEX_URL", "q50"),
+}
+
+_providers = {}
+_backends = {}
+
+
+def get_provider(url: str, quantum_computer: str = None):
+    """
+    Returns the IQMProvider of a server, created on first use.
+    """
+    key = (url, quantum_computer)
+    if key not in _providers:
+        from iqm.qiskit_iqm import IQMProvider
+
+        if quantum_computer:
+            _providers[key] = IQMProvider(url, quantum_computer=quantum_computer)
+        else:
+            _providers[key] = IQMProvider(url)
+    return _providers[key]
+
+
+def _create_backend(name: str, calibration: str = None):
+    if name in QUANTUM_COMPUTERS:
+        variable, quantum_computer = QUANTUM_COMPUTERS[name]
+        url = os.getenv(variable)
+        if url:
+            return get_provider(url, quantum_computer).get_backend()
+        fallback = "emulator" if calibration else "fake"
+        print(f"""Environment variable {variable} is not set.
+              Are you running on Lumi and on the q_fiqci node?.
+              Falling back to {fallback} backend.""")
+        return get_backend(fallback, calibration)
+    if name == "fake":
+        from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
+
+        return IQMFakeAdonis()
+    if name == "emulator":
+        from calibrated_emulator import get_emulator
+
+        if not calibration:
+            raise ValueError("The emulator backend needs a calibration JSON")
+        return get_emulator(filename=calibration)
+    if name in ("aer", "simulator"):
+        from qiskit_aer import AerSimulator
+
+        return AerSimulator()
+    raise ValueError(f"Unknown backend {name}, expected one of {', '.join(BACKENDS)}")
+
+
+def get_backend(name: str, calibration: str = None):
+    """
+    Returns the backend called `name`, see the module documentation.
+
+    `calibration` is a calibration JSON saved by `get_calibration_data.py`, used by the emulator and
+    as the fallback of helmi and q50.
+    """
+    key = (name, calibration)
+    if key not in _backends:
+        backend = _create_backend(name, calibration)
+        if os.getenv("FIQCI_RESULT_ARCHIVE"):
+            from result_archive import get_default_archive, script_label
+
+            get_default_archive().attach(backend, script_label())
+        _backends[key] = backend
+    return _backends[key]
@@ -0,0 +1,103 @@
+"""
+Collect circuits and run compatible ones as a single batch job.
+
+IQM backends accept a list of circuits in one `backend.run` call. A `BatchPlanner` collects the circuits a
+script wants to run, groups the ones with the same shots and run options (for example the same
+`calibration_set_id`) and submits each group as one job. Every added circuit gets a `BatchedResult`
+which gives its own counts once the batch has run.
+
+Usage:
+
+    from batching import BatchPlanner
+
+    planner = BatchPlanner(backend)
+    handles = [planner.add(circuit, shots=1000) for circuit in circuits]
+    planner.run()
+    counts = [handle.get_counts() for handle in handles]
+"""
+
+
+class BatchedResult:
+    """
+    The result of one circuit of a batch job.
+    """
+
+    def __init__(self, circuit, shots: int, run_options: dict):
+        self.circuit = circuit
+        self.shots = shots
+        self.run_options = run_options
+        self.job = None
+        self.index = None
+        self._result = None
+
+    @property
+    def done(self) -> bool:
+        return self.job is not None
+
+    def result(self):
+        """
+        Returns the result of the whole batch job.
+        """
+        if not self.done:
+            raise RuntimeError("The batch containing this circuit has not been run yet")
+        if self._result is None:
+            self._result = self.job.result()
+        return self._result
+
+    def get_counts(self) -> dict:
+        return self.result().get_counts(self.index)
+
+
+class BatchPlanner:
+    """
+    Groups circuits with equal shots and run options into one job per group.
+
+    `max_circuits` limits the number of circuits in one job.
+    """
+
+    def __init__(self, backend, max_circuits: int = 200):
+        self.backend = backend
+        self.max_circuits = max_circuits
+        self._pending = []
+
+    def add(self, circuit, shots: int, **run_options) -> BatchedResult:
+        """
+        Adds a circuit to the next batch and returns the handle of its result.
+        """
+        handle = BatchedResult(circuit, shots, run_options)
+        self._pending.append(handle)
+        return handle
+
+    def plan(self) -> list[list[BatchedResult]]:
+        """
+        Returns the pending circuits grouped into batches, keeping the order in which they were added.
+        """
+        groups = {}
+        for handle in self._pending:
+            key = (handle.shots, tuple(sorted((k, repr(v)) for k, v in handle.run_options.items())))
+            groups.setdefault(key, []).append(handle)
+
+        batches = []
+        for group in groups.values():
+            for start in range(0, len(group), self.max_circuits):
+                batches.append(group[start:start + self.max_circuits])
+        return batches
+
+    def run(self) -> list:
+        """
+        Submits every planned batch as one job and returns the jobs.
+
+        All jobs are submitted before any result is waited for.
+        """
+        jobs = []
+        for batch in self.plan():
+            first = batch[0]
+            job = self.backend.run(
+                [handle.circuit for handle in batch], shots=first.shots, **first.run_options,
+            )
+            for index, handle in enumerate(batch):
+                handle.job = job
+                handle.index = index
+            jobs.append(job)
+        self._pending = []
+        return jobs
@@ -1,10 +1,9 @@
 import argparse
-import os
 from argparse import RawTextHelpFormatter
 
-from iqm.qiskit_iqm import IQMProvider
-from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
-from qiskit_aer import Aer
+from backends import BACKENDS, get_backend
+from calibrated_layout import get_layout_scorer
+from job_submitter import run_all
 
 from qiskit import QuantumCircuit, QuantumRegister, transpile
 
@@ -48,7 +47,7 @@ def get_args():
         """,
         required=True,
         type=str,
-        choices=["helmi", "simulator"],
+        choices=BACKENDS,
     )
 
     args_parser.add_argument(
@@ -68,136 +67,70 @@ def main():
 
     args = get_args()
 
-    backend = IQMFakeAdonis()
     print("Running on backend = ", args.backend)
-
-    if args.backend == 'helmi':
-        # Set up the Helmi backend
-        HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
-        if not HELMI_CORTEX_URL:
-            print("""Environment variable HELMI_CORTEX_URL is not set.
-                  Are you running on Lumi and on the q_fiqci node?.
-                  Falling back to fake backend.""")
-            # raise ValueError("Environment variable HELMI_CORTEX_URL is not set")
-
-        else:
-            provider = IQMProvider(HELMI_CORTEX_URL)
-            backend = provider.get_backend()
-    else:
-        provider = Aer
-        backend = provider.get_backend('aer_simulator')
+    backend = get_backend(args.backend)
 
     print_header("Preparing a Bell State: |00> + |11> / sqrt(2)")
 
-    for qb in [0, 1, 3, 4]:
-
-        print_header("Control: QB" + str(qb + 1) + "  Target: QB3 -> ")
-        qreg = QuantumRegister(2, "qB")
-        qc = QuantumCircuit(qreg)
-
-        qc.h(qreg[0])
-        qc.cx(qreg[0], qreg[1])
-        qc.measure_all()
-
-        if args.verbose:
-            print(qc.draw())
-
-        shots = 1000
-
-        qubit_mapping = {
-            qreg[0]: qb,
-            qreg[1]: 2,
-        }
-
-        qc = transpile(
-            qc, backend, optimization_level=0,
-            initial_layout=qubit_mapping,
-        )
+    # Pair the outer qubits with the best calibrated center qubit, QB3 on Helmi
+    center, leaves = 2, [0, 1, 3, 4]
+    scorer = get_layout_scorer(backend)
+    if scorer is not None:
+        center, leaves = scorer.best_star(4)
+
+    shots = 1000
+    headers = []
+    circuits = []
+    for qb in leaves:
+        # Control on the outer qubit, then control on the center qubit
+        for control, target, header in [
+            (0, 1, "Control: QB" + str(qb + 1) + "  Target: QB" + str(center + 1) + " -> "),
+            (1, 0, "Control: QB" + str(center + 1) + "  Target QB" + str(qb + 1) + " -> "),
+        ]:
+            qreg = QuantumRegister(2, "qB")
+            qc = QuantumCircuit(qreg)
+
+            qc.h(qreg[control])
+            qc.cx(qreg[control], qreg[target])
+            qc.measure_all()
+
+            qubit_mapping = {
+                qreg[0]: qb,
+                qreg[1]: center,
+            }
+
+            qc = transpile(
+                qc, backend, optimization_level=0,
+                initial_layout=qubit_mapping,
+            )
+            headers.append(header)
+            circuits.append(qc)
+
+    # The circuits are independent, so all jobs are submitted at once
+    results = run_all(backend, circuits, shots=shots)
+
+    for header, qc, result in zip(headers, circuits, results):
+        print_header(header)
 
         if args.verbose:
             print(qc.draw())
 
-        job = backend.run(qc, shots=shots)
-
-        counts = job.result().get_counts()
+        counts = result.get_counts()
 
         if args.verbose and "IQM" in str(backend):
             print("Mapping")
             try:
-                print(job.result().results[0].metadata['input_qubit_map'])
+                print(result.results[0].metadata['input_qubit_map'])
             except AttributeError:
-                print(job.result().request.qubit_mapping)
-
-        t2 = ((counts.get("00", 0) + counts.get("11", 0)) / shots) * 100
-
-        counts_00 = (counts.get("00", 0) / shots) * 100
-        counts_11 = (counts.get("11", 0) / shots) * 100
-
-        if "10" in counts:
-            counts_10 = (counts["10"] / shots) * 100
-        else:
-            counts_10 = 0
-
-        if "01" in counts:
-            counts_01 = (counts["01"] / shots) * 100
-        else:
-            counts_01 = 0
-        print("Percentage counts |00> = ", round(counts_00, 2), "%")
-        print("Percentage counts |11> = ", round(counts_11, 2), "%")
-        print("Percentage counts |10> = ", round(counts_10, 2), "%")
-        print("Percentage counts |01> = ", round(counts_01, 2), "%")
-        print("Percentage of counts |00> or |11> = ", round(t2, 2), "%")
-
-        print_header("Control: QB3" + "  Target QB" + str(qb + 1) + " -> ")
-        qreg = QuantumRegister(2, "qB")
-        qc = QuantumCircuit(qreg)
-
-        qc.h(qreg[1])
-        qc.cx(qreg[1], qreg[0])
-        qc.measure_all()
-
-        if args.verbose:
-            print(qc.draw())
-
-        shots = 1000
-
-        qubit_mapping = {
-            qreg[0]: qb,
-            qreg[1]: 2,
-        }
-
-        qc = transpile(
-            qc, backend, optimization_level=0,
-            initial_layout=qubit_mapping,
-        )
+                print(result.request.qubit_mapping)
 
-        if args.verbose:
-            print(qc.draw())
-
-        job = backend.run(qc, shots=shots)
-
-        counts = job.result().get_counts()
-
-        if args.verbose and "IQM" in str(backend):
-            print("Mapping")
-            try:
-                print(job.result().results[0].metadata['input_qubit_map'])
-            except AttributeError:
-                print(job.result().request.qubit_mapping)
         t2 = ((counts.get("00", 0) + counts.get("11", 0)) / shots) * 100
 
         counts_00 = (counts.get("00", 0) / shots) * 100
         counts_11 = (counts.get("11", 0) / shots) * 100
+        counts_10 = (counts.get("10", 0) / shots) * 100
+        counts_01 = (counts.get("01", 0) / shots) * 100
 
-        if "10" in counts:
-            counts_10 = (counts["10"] / shots) * 100
-        else:
-            counts_10 = 0
-
-        if "01" in counts:
-            counts_01 = (counts["01"] / shots) * 100
-        else:
-            counts_01 = 0
         print("Percentage counts |00> = ", round(counts_00, 2), "%")
         print("Percentage counts |11> = ", round(counts_11, 2), "%")
         print("Percentage counts |10> = ", round(counts_10, 2), "%")
@@ -0,0 +1,380 @@
+"""
+Benchmark the example workloads stage by stage.
+
+Each workload (qubit flips, Bell pairs, GHZ-5, Bernstein-Vazirani and a parameterized QAOA sweep) is
+run `--repeats` times on the fake Adonis backend and on the Aer simulator, and the time of every stage
+of the pipeline is recorded:
+
+    build         creating the QuantumCircuits
+    transpile     transpiling them through the transpile cache (a cleared cache unless --warm-cache)
+    serialize     serializing the transpiled circuits (the IQM run request for IQM server backends,
+                  QPY otherwise)
+    submit        backend.run returning a job
+    wait          job.result() returning, the queue wait and execution
+    parse         reading the counts of every circuit from the result
+    postprocess   computing the figure of merit of the workload
+
+The median, 90th and 99th percentiles, mean, minimum and maximum of each stage are written to a JSON file
+together with the git commit, so that two runs can be compared with `--compare`.
+
+With `--imports` the startup time of the examples is measured instead: every target is run `--repeats`
+times in a fresh interpreter, for example `python ghz.py --help`, which imports everything the example
+imports at module level.
+
+Usage:
+
+    python benchmark.py --repeats 10 --output benchmark.json
+    python benchmark.py --workloads ghz5 sweep --backends fake --compare benchmark.json
+    python benchmark.py --imports --repeats 10 --output imports.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import _paths  # noqa: F401
+import numpy as np
+import qiskit_aer
+from backends import get_backend
+from circuit_templates import CircuitTemplate, bv_masked_circuit, qaoa_maxcut_circuit, secret_bits
+from maxcut import cut_expectations
+from metrics import classical_fidelity, ghz_distribution
+from qb_flip import calculate_success_probability, flip_circuit, single_flip_circuit
+from transpile_cache import TranspileCache, cached_transpile
+
+import qiskit
+from qiskit import QuantumCircuit, QuantumRegister, qpy
+
+STAGES = ["build", "transpile", "serialize", "submit", "wait", "parse", "postprocess"]
+PERCENTILES = [50, 90, 99]
+BV_SECRET = 0b1011
+SWEEP_GRAPH = {'nodes': [0, 1, 2, 3], 'edges': [(0, 1), (1, 2), (2, 3), (0, 3)]}
+SWEEP_POINTS = 20
+# Command line arguments of the interpreter for each startup target of --imports
+IMPORT_TARGETS = {
+    "import qiskit": ["-c", "import qiskit"],
+    "import iqm.qiskit_iqm": ["-c", "import iqm.qiskit_iqm"],
+    "import qiskit_aer": ["-c", "import qiskit_aer"],
+    "import matplotlib": ["-c", "import matplotlib.pyplot"],
+    "qb_flip.py": ["qb_flip.py", "--help"],
+    "bell_states_qiskit.py": ["bell_states_qiskit.py", "--help"],
+    "bernstein_vazirani.py": ["bernstein_vazirani.py", "--help"],
+    "ghz.py": ["ghz.py", "--help"],
+}
+
+
+class StageTimer:
+    """
+    Collects the wall clock time of named stages.
+    """
+
+    def __init__(self):
+        self.times = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+
+
+# Each workload is a pair of functions: build() returns (circuits, transpile options per circuit) and
+# postprocess(counts) computes the figure of merit from the list of counts dictionaries.
+
+def build_flip():
+    circuits, options = [], []
+    for qubit in range(5):
+        circuit, mapping = single_flip_circuit(qubit)
+        circuits.append(circuit)
+        options.append(dict(layout_method='sabre', optimization_level=3, initial_layout=mapping))
+    circuit, mapping = flip_circuit([0, 1, 2, 3, 4])
+    circuits.append(circuit)
+    options.append(dict(layout_method='sabre', optimization_level=3, initial_layout=mapping))
+    return circuits, options
+
+
+def postprocess_flip(counts):
+    shots = sum(counts[0].values())
+    desired = ['1'] * 5 + ['11111']
+    return [calculate_success_probability(c, shots, state) for c, state in zip(counts, desired)]
+
+
+def build_bell():
+    circuits, options = [], []
+    for qubit in [0, 1, 3, 4]:
+        for control, target in [(0, 1), (1, 0)]:
+            qreg = QuantumRegister(2, "qB")
+            circuit = QuantumCircuit(qreg)
+            circuit.h(qreg[control])
+            circuit.cx(qreg[control], qreg[target])
+            circuit.measure_all()
+            circuits.append(circuit)
+            options.append(dict(optimization_level=0, initial_layout={qreg[0]: qubit, qreg[1]: 2}))
+    return circuits, options
+
+
+def postprocess_bell(counts):
+    return [classical_fidelity(c, ghz_distribution(2)) for c in counts]
+
+
+def build_ghz5():
+    qreg = QuantumRegister(5, "qB")
+    circuit = QuantumCircuit(qreg)
+    circuit.h(qreg[2])
+    for qubit in [0, 1, 3, 4]:
+        circuit.cx(qreg[2], qreg[qubit])
+    circuit.measure_all()
+    return [circuit], [dict(layout_method='sabre', optimization_level=3)]
+
+
+def postprocess_ghz5(counts):
+    return [classical_fidelity(counts[0], ghz_distribution(5))]
+
+
+def build_bv():
+    circuit = bv_masked_circuit(4).assign_parameters(secret_bits(BV_SECRET, 4))
+    return [circuit], [dict(layout_method='sabre', optimization_level=3)]
+
+
+def postprocess_bv(counts):
+    return [max(counts[0], key=counts[0].get) == format(BV_SECRET, "04b")]
+
+
+def build_sweep():
+    return [qaoa_maxcut_circuit(SWEEP_GRAPH, layers=1)], [dict(optimization_level=3)]
+
+
+def postprocess_sweep(counts):
+    return cut_expectations(counts, SWEEP_GRAPH)
+
+
+WORKLOADS = {
+    "flip": (build_flip, postprocess_flip),
+    "bell": (build_bell, postprocess_bell),
+    "ghz5": (build_ghz5, postprocess_ghz5),
+    "bv": (build_bv, postprocess_bv),
+    "sweep": (build_sweep, postprocess_sweep),
+}
+
+
+def serialize(backend, circuits, shots: int) -> int:
+    """
+    Serializes the circuits as they would be sent to the backend and returns the payload size in bytes.
+    """
+    if hasattr(backend, "create_run_request"):
+        request = backend.create_run_request(circuits, shots=shots)
+        return len(request.model_dump_json())
+    buffer = io.BytesIO()
+    qpy.dump(circuits, buffer)
+    return buffer.tell()
+
+
+def run_workload(name: str, backend, shots: int, cache: TranspileCache) -> dict:
+    """
+    Runs one repeat of a workload and returns the time of each stage in seconds.
+    """
+    build, postprocess = WORKLOADS[name]
+    timer = StageTimer()
+
+    with timer.stage("build"):
+        circuits, options = build()
+
+    with timer.stage("transpile"):
+        if name == "sweep":
+            # The sweep transpiles its template once and binds every point
+            template = CircuitTemplate(circuits[0], backend, cache=cache, **options[0])
+            rng = np.random.default_rng(0)
+            transpiled = template.bind_many(rng.uniform(0, np.pi, (SWEEP_POINTS, template.num_parameters)))
+        else:
+            transpiled = [
+                cached_transpile(circuit, backend, cache=cache, **opts) for circuit, opts in zip(circuits, options)
+            ]
+
+    with timer.stage("serialize"):
+        serialize(backend, transpiled, shots)
+
+    with timer.stage("submit"):
+        job = backend.run(transpiled, shots=shots)
+
+    with timer.stage("wait"):
+        result = job.result()
+
+    with timer.stage("parse"):
+        counts = [result.get_counts(i) for i in range(len(transpiled))]
+
+    with timer.stage("postprocess"):
+        postprocess(counts)
+
+    return timer.times
+
+
+def summarize(samples: list[float]) -> dict:
+    values = np.asarray(samples)
+    summary = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+    summary.update(mean=float(values.mean()), min=float(values.min()), max=float(values.max()))
+    summary["samples"] = [float(v) for v in values]
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(workloads, backends, repeats: int, shots: int, warm_cache: bool) -> dict:
+    """
+    Runs every workload on every backend and returns the report dictionary written to JSON.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TranspileCache(cache_dir)
+        for backend_name in backends:
+            backend = get_backend(backend_name)
+            for name in workloads:
+                if warm_cache:
+                    run_workload(name, backend, shots, cache)
+                samples = {stage: [] for stage in STAGES + ["total"]}
+                for _ in range(repeats):
+                    if not warm_cache:
+                        cache.clear()
+                    times = run_workload(name, backend, shots, cache)
+                    for stage in STAGES:
+                        samples[stage].append(times[stage])
+                    samples["total"].append(sum(times.values()))
+                results.setdefault(name, {})[backend_name] = {
+                    stage: summarize(values) for stage, values in samples.items()
+                }
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "qiskit": qiskit.__version__,
+        "qiskit_aer": qiskit_aer.__version__,
+        "repeats": repeats,
+        "shots": shots,
+        "warm_cache": warm_cache,
+        "results": results,
+    }
+
+
+def run_import_benchmark(repeats: int) -> dict:
+    """
+    Times the startup of every import target in a fresh interpreter and returns the report dictionary.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    imports = {}
+    for name, arguments in IMPORT_TARGETS.items():
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *arguments], cwd=directory, stdout=subprocess.DEVNULL, check=True)
+            samples.append(time.perf_counter() - start)
+        imports[name] = summarize(samples)
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "repeats": repeats,
+        "imports": imports,
+    }
+
+
+def print_imports(report: dict, baseline: dict = None):
+    """
+    Prints the median startup time of every import target, and the ratio to the baseline median.
+    """
+    header = f"{'target':<24} {'p50 ms':>10} {'p90 ms':>10}"
+    if baseline:
+        header += f" {'base p50':>10} {'ratio':>7}"
+    print(header)
+    for name, summary in report["imports"].items():
+        line = f"{name:<24} {summary['p50'] * 1e3:>10.1f} {summary['p90'] * 1e3:>10.1f}"
+        base = (baseline or {}).get("imports", {}).get(name)
+        if base:
+            line += f" {base['p50'] * 1e3:>10.1f} {summary['p50'] / base['p50']:>7.2f}"
+        print(line)
+
+
+def print_report(report: dict, baseline: dict = None):
+    """
+    Prints the median of every stage, and the ratio to the baseline median if a baseline is given.
+    """
+    header = f"{'workload':<8} {'backend':<6} {'stage':<12} {'p50 ms':>10} {'p90 ms':>10}"
+    if baseline:
+        header += f" {'base p50':>10} {'ratio':>7}"
+    print(header)
+    for name, backends in report["results"].items():
+        for backend_name, stages in backends.items():
+            for stage, summary in stages.items():
+                line = f"{name:<8} {backend_name:<6} {stage:<12}"
+                line += f" {summary['p50'] * 1e3:>10.2f} {summary['p90'] * 1e3:>10.2f}"
+                base = (baseline or {}).get("results", {}).get(name, {}).get(backend_name, {}).get(stage)
+                if base:
+                    ratio = summary["p50"] / base["p50"] if base["p50"] else float("inf")
+                    line += f" {base['p50'] * 1e3:>10.2f} {ratio:>7.2f}"
+                print(line)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="Per-stage timings of the example workloads", formatter_class=argparse.RawTextHelpFormatter,
+        epilog="""Example usage:
+        python benchmark.py --repeats 10 --output benchmark.json
+        python benchmark.py --compare benchmark.json
+        """,
+    )
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--backends", nargs="+", choices=["fake", "aer"], default=["fake", "aer"])
+    parser.add_argument("--repeats", type=int, default=5, help="Number of timed repeats. Default is 5.")
+    parser.add_argument("--shots", type=int, default=1000, help="Shots per circuit. Default is 1000.")
+    parser.add_argument(
+        "--warm-cache", action="store_true",
+        help="Time transpile cache hits instead of clearing the cache before every repeat",
+    )
+    parser.add_argument(
+        "--imports", action="store_true", help="Time the startup and imports of the examples instead",
+    )
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare against")
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    if args.imports:
+        report = run_import_benchmark(args.repeats)
+    else:
+        report = run_benchmark(args.workloads, args.backends, args.repeats, args.shots, args.warm_cache)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Comparing commit {report['commit']} to {baseline.get('commit')}")
+    if args.imports:
+        print_imports(report, baseline)
+    else:
+        print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
 import argparse
-import os
 from argparse import RawTextHelpFormatter
 from collections import Counter
 from random import randint
 
-from iqm.qiskit_iqm import IQMProvider
-from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
-from qiskit_aer import Aer
+import _paths  # noqa: F401
+import numpy as np
+from adaptive_shots import ModeMargin, run_adaptive
+from backends import BACKENDS, get_backend
+from batching import BatchPlanner
+from circuit_templates import CircuitTemplate, bv_masked_circuit, secret_bits
+from metrics import as_distribution
+from transpile_cache import cached_transpile
 
-from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister, transpile
+from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister
 
 """
 
@@ -36,52 +40,70 @@ class BVoracle:
     """
 
     def __init__(self, backend, dim=4, num=None, verbose=False):
-        self._num = num if num else randint(0, 2**dim - 1)
+        self._num = num if num is not None else randint(0, 2**dim - 1)
         self.dim = dim
         self.backend = backend
         self.ccalls = 0
         self.qcalls = 0
         self.verbose = verbose
+        # The secret bits with the most significant bit first, as in the bit string of the secret
+        self._bits = secret_bits(self._num, dim)[::-1]
+        self._circuit = None  # The transpiled circuit is built on the first quantum call
 
     def get(self, x):
-        assert len(x) == self.dim
+        """
+        Returns s.x mod 2 for one input of `dim` bits, or for every row of a 2D array of inputs at once.
+        """
+        x = np.asarray(x)
+        assert x.shape[-1] == self.dim
         # ccalls increases every time one queries the oracle
-        self.ccalls += 1
-        s = self._to_bin_digits(self._num)
-        return sum(x[i] * s[i] for i in range(self.dim)) % 2
+        self.ccalls += 1 if x.ndim == 1 else len(x)
+        return (x @ self._bits) % 2
 
     # Assuming that when one calls the qoracle to be created
     # dim is correctly stated
     def quantum(self, shots=1):
         # qcalls increases every time one queries the oracle
         self.qcalls += 1
-        qreg = QuantumRegister(5, "QB")
-        creg = ClassicalRegister(4, "c")
-        qc = QuantumCircuit(qreg, creg)
-        qc = self._prepare_circuit(qc, qreg)
-
-        job = self.backend.run(qc, shots=shots)
+        job = self.backend.run(self.circuit(), shots=shots)
 
         return job.result().get_counts()
 
+    def quantum_many(self, shots=1, repeats=1):
+        """
+        Runs the circuit `repeats` times in a single job and returns the counts of every repeat.
+        """
+        self.qcalls += repeats
+        result = self.backend.run([self.circuit()] * repeats, shots=shots).result()
+        return [result.get_counts(i) for i in range(repeats)]
+
+    def circuit(self):
+        if self._circuit is None:
+            # The secret does not change, so the circuit is built and transpiled only once
+            qreg = QuantumRegister(self.dim + 1, "QB")
+            creg = ClassicalRegister(self.dim, "c")
+            qc = QuantumCircuit(qreg, creg)
+            self._circuit = self._prepare_circuit(qc, qreg)
+        return self._circuit
+
     def _prepare_circuit(self, qc, qreg):
         # Prepare the additional qubit
-        qc.h(qreg[4])
-        qc.z(qreg[4])
-        for i in range(4):
+        output = qreg[self.dim]
+        qc.h(output)
+        qc.z(output)
+        for i in range(self.dim):
             qc.h(i)
 
-        s = self._to_bin_digits(self._num)[::-1]
+        s = self._bits[::-1]
         print(self._num, s)
-        for q in range(4):
-            if s[q] != 0:
-                qc.cx(q, qreg[4])
+        for q in np.flatnonzero(s):
+            qc.cx(int(q), output)
 
-        for i in range(4):
+        for i in range(self.dim):
             qc.h(i)
 
-        qc.measure(range(4), range(4))
-        transpiled_circuit = transpile(
+        qc.measure(range(self.dim), range(self.dim))
+        transpiled_circuit = cached_transpile(
             qc, self.backend, layout_method='sabre', optimization_level=3,
         )
         if self.verbose:
@@ -92,19 +114,27 @@ class BVoracle:
 
         return transpiled_circuit
 
-    def _to_bin_digits(self, num, dim=4):
-        """
-        Returns binary representation of num (int) as a list of ints with optional
-        parameter dim to fill with zeroes from left up to length dim.
-        """
-        return [int(c) for c in self._to_bin_str(num, dim)]
 
-    def _to_bin_str(self, num, dim=4):
-        """
-        Returns binary representation of num (int) as a string with optional
-        parameter dim to fill with zeroes from left up to length dim.
-        """
-        return f"{num:0{dim}b}"
+def run_secrets(backend, secrets, dim, shots):
+    """
+    Runs the Bernstein-Vazirani circuit of every secret in one batch.
+
+    One parameterized circuit is transpiled and bound to each secret. Returns the success rates
+    (the fraction of shots giving the secret) and the most frequent outcomes as arrays.
+    """
+    secrets = np.asarray(secrets, dtype=np.int64)
+    template = CircuitTemplate(bv_masked_circuit(dim), backend, layout_method='sabre', optimization_level=3)
+    planner = BatchPlanner(backend)
+    handles = [planner.add(template.bind({"s": secret_bits(secret, dim)}), shots=shots) for secret in secrets]
+    planner.run()
+
+    success = np.zeros(len(secrets))
+    guessed = np.zeros(len(secrets), dtype=np.int64)
+    for i, handle in enumerate(handles):
+        outcomes, probabilities = as_distribution(handle.get_counts())
+        success[i] = probabilities[outcomes == secrets[i]].sum()
+        guessed[i] = outcomes[np.argmax(probabilities)]
+    return success, guessed
 
 
 def get_args():
@@ -121,6 +151,8 @@ def get_args():
         python bernstein_vazirani.py --backend helmi
         python bernstein_vazirani.py --backend simulator
         python bernstein_vazirani.py --backend helmi -v (prints circuits)
+        python bernstein_vazirani.py --backend helmi --adaptive (stops when the result is clear)
+        python bernstein_vazirani.py --backend helmi -o 3 (all 16 secrets in one batch)
         """,
     )
     # Parse Arguments
@@ -134,7 +166,7 @@ def get_args():
         """,
         required=True,
         type=str,
-        choices=["helmi", "simulator"],
+        choices=BACKENDS,
     )
 
     args_parser.add_argument(
@@ -154,6 +186,8 @@ def get_args():
         1 - Single Quantum run
         2 - Repeated Quantum run
             MUST specify how many repeats with --repeats option.
+        3 - Run many secrets in one batch
+            The secrets are given with --secrets, by default all 2^dim secrets.
         """,
         required=False,
         type=int,
@@ -183,6 +217,40 @@ def get_args():
         default=5,
     )
 
+    args_parser.add_argument(
+        "--dim",
+        help="""
+        Number of bits of the secret. The circuit uses dim + 1 qubits.
+        Default = 4
+        """,
+        type=int,
+        required=False,
+        default=4,
+    )
+
+    args_parser.add_argument(
+        "--secrets",
+        help="""
+        Secrets to run with option 3 in decimal form
+        E.g --secrets 1 7 12
+        """,
+        type=int,
+        nargs="+",
+        required=False,
+        default=None,
+    )
+
+    args_parser.add_argument(
+        "--adaptive",
+        help="""
+        Run in rounds of increasing shots and stop once the most frequent
+        outcome leads the second one with 99%% confidence. The usual shot
+        counts (10000 or 1000) are then the maximum.
+        """,
+        required=False,
+        action="store_true",
+    )
+
     return args_parser.parse_args()
 
 
@@ -210,59 +278,66 @@ def most_frequent(lst):
     return most_freq_item, freqs[most_freq_item]
 
 
-def secret_count(lst, secret):
+def secret_count(lst, secret, dim=4):
     """
     Returns the number of times the secret number appears in the list.
     """
-    return lst.get(f"{secret:0{4}b}", 0)
+    return lst.get(f"{secret:0{dim}b}", 0)
 
 
 def main():
     args = get_args()
-    backend = IQMFakeAdonis()
-    if args.backend == 'helmi':
-        # Set up the Helmi backend
-        HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
-        if not HELMI_CORTEX_URL:
-            print("""Environment variable HELMI_CORTEX_URL is not set.
-                  Are you running on Lumi and on the q_fiqci node?.
-                  Falling back to fake backend.""")
-            # raise ValueError("Environment variable HELMI_CORTEX_URL is not set")
-
-        else:
-            provider = IQMProvider(HELMI_CORTEX_URL)
-            backend = provider.get_backend()
-    else:
-        provider = Aer
-        backend = provider.get_backend('aer_simulator')
+    backend = get_backend(args.backend)
 
-    if args.number is not None and args.number > 15:
+    dim = args.dim
+    max_number = 2**dim - 1
+    if args.number is not None and args.number > max_number:
         raise ValueError(
-            "ERROR! Guess must be a 4 bit string number or lower. Less than or equal to 15.",
+            f"ERROR! Guess must be a {dim} bit string number or lower. Less than or equal to {max_number}.",
         )
 
     print("Running on backend = ", args.backend)
 
+    if args.option == 3:
+        secrets = args.secrets if args.secrets is not None else list(range(2**dim))
+        print_header(f"{len(secrets)} secrets in one batch")
+        success, guessed = run_secrets(backend, secrets, dim, shots=1000)
+        print("Secret     Binary     Success     Result")
+        for secret, rate, guess in zip(secrets, success, guessed):
+            print(f"{secret:<10} {secret:0{dim}b}{'':<{max(11 - dim, 1)}}{rate * 100:6.2f}%     {guess}")
+        found = np.sum(guessed == np.asarray(secrets))
+        print(f"Mean success: {success.mean() * 100:.2f}%, found {found} of {len(secrets)} secrets")
+        return
+
     print_header("initialization")
     NUM = args.number
     if NUM is None:
-        NUM = randint(0, 15)
+        NUM = randint(0, max_number)
         print("The hidden oracle number was chosen randomly and will not be disclosed.")
     else:
         print(f"""The hidden oracle number is s = {
             NUM
         }. In general it is not dislosed to the testing party.""")
 
-    bv = BVoracle(num=NUM, backend=backend, verbose=args.verbose)
+    bv = BVoracle(num=NUM, backend=backend, dim=dim, verbose=args.verbose)
     print("The oracle is now initialized with given secret oracle index.")
 
+    def run(max_shots):
+        """
+        Returns the counts and the number of shots run, stopping early in adaptive mode.
+        """
+        if not args.adaptive:
+            return bv.quantum(shots=max_shots), max_shots
+        result = run_adaptive(lambda shots: bv.quantum(shots=shots), ModeMargin(confidence=0.99), max_shots)
+        return result.counts, result.shots
+
     if args.option == 1:
-        guess = bv.quantum(shots=10000)
+        guess, shots = run(10000)
         s, amt = most_frequent(guess)
         if bv._num != int(s, 2):
-            success_rate = secret_count(guess, bv._num)
+            success_rate = round((secret_count(guess, bv._num, dim) / shots) * 100, 2)
         else:
-            success_rate = round((amt / 1000) * 100, 2)
+            success_rate = round((amt / shots) * 100, 2)
         print(s, amt)
 
         print_header("Single run")
@@ -273,7 +348,7 @@ def main():
 
         print(f"""Guessed outcome is s = {int(s, 2)} (binary number {s}) found in {
             amt
-        } shots out of 1 repeats.""")
+        } shots out of {shots} shots.""")
         print(f"Quantum oracle was called {bv.qcalls} time(s).")
         print("\n")
 
@@ -282,20 +357,27 @@ def main():
         result = []
         binary = []
         qcalls = []
+        shots_used = []
         print_header("Repeated run")
-        for i in range(args.repeats):
-            guess = bv.quantum(shots=1000)
+        if args.adaptive:
+            runs = [(*run(1000), bv.qcalls) for _ in range(args.repeats)]
+        else:
+            # The repeats are independent, so they are submitted together as one job
+            guesses = bv.quantum_many(shots=1000, repeats=args.repeats)
+            runs = [(guess, 1000, i + 1) for i, guess in enumerate(guesses)]
+        for guess, shots, calls in runs:
             s, amt = most_frequent(guess)
             if bv._num != int(s, 2):
-                success_rate = secret_count(guess, bv._num)
+                success_rate = round((secret_count(guess, bv._num, dim) / shots) * 100, 2)
             else:
-                success_rate = round((amt / 1000) * 100, 2)
+                success_rate = round((amt / shots) * 100, 2)
             success.append(success_rate)
             result.append(int(s, 2))
             binary.append(s)
-            qcalls.append(bv.qcalls)
+            qcalls.append(calls)
+            shots_used.append(shots)
 
-        print("Run  Success      Result     Binary     Secret     qcalls")
+        print("Run  Success      Result     Binary     Secret     qcalls     Shots")
         for i in range(args.repeats):
             print(
                 str(i + 1)
@@ -309,7 +391,8 @@ def main():
                 + str(bv._num)
                 + "         "
                 + str(qcalls[i])
-                + "",
+                + "         "
+                + str(shots_used[i]),
             )
 
 
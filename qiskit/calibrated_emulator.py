@@ -0,0 +1,319 @@
+"""
+Local emulation of an IQM quantum computer with the noise of a real calibration set.
+
+`IQMFakeAdonis()` has a fixed noise model which does not follow the device. `get_emulator` builds the
+error profile of a fake backend from a calibration set instead, fetched with `get_calibration_data` or
+loaded from a JSON file saved by it, and returns a `CalibratedFakeBackend`:
+
+- The readout, gate and T1/T2 values found in the calibration set replace those of the base fake backend.
+  Qubits and couplers missing from the calibration set keep the values of the base backend.
+- The compiled Aer noise model is cached on disk keyed by the calibration set id, or by the hash of the
+  payload if it has none, in `~/.cache/fiqci-examples/noise-models` or the directory in the
+  `FIQCI_NOISE_MODEL_CACHE` environment variable.
+- One `AerSimulator` is kept for the backend and runs the shots on several threads. The number of threads
+  is taken from `SLURM_CPUS_PER_TASK` if it is set, otherwise all cores are used.
+
+Usage:
+
+    from calibrated_emulator import get_emulator
+
+    backend = get_emulator(filename="calibration.json")
+    backend = get_emulator(client=IQMProvider(HELMI_CORTEX_URL).get_backend().client)
+    counts = backend.run(transpile(circuit, backend), shots=10000).result().get_counts()
+
+    python calibrated_emulator.py --calibration calibration.json
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import pickle
+from dataclasses import replace
+
+import _paths  # noqa: F401
+from calibration_client import find_calibration_set_id
+from calibration_metrics import errors_from_metrics, flatten_metrics
+from iqm.iqm_client import QuantumArchitectureSpecification
+from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
+from iqm.qiskit_iqm.fake_backends.iqm_fake_backend import IQMFakeBackend
+from iqm.qiskit_iqm.iqm_backend import IQM_TO_QISKIT_GATE_NAME
+from qiskit_aer import AerSimulator
+
+from qiskit import QuantumCircuit
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "fiqci-examples", "noise-models",
+)
+# Bump when the conversion from calibration data changes, so old cached noise models are not used
+CACHE_VERSION = 1
+
+_emulators = {}
+
+
+def _to_ns(value: float) -> float:
+    """
+    Returns a coherence time in ns. The unit is not part of every payload, so it is guessed from the
+    magnitude: values below 1 are seconds and values below 1000 microseconds.
+    """
+    if value < 1:
+        return value * 1e9
+    if value < 1000:
+        return value * 1e3
+    return value
+
+
+def coherence_times(metrics) -> tuple[dict, dict]:
+    """
+    Returns the T1 and T2 times in ns of the qubits of a metrics payload. T2 echo times are preferred
+    over Ramsey times when both are present.
+    """
+    t1s, t2s, t2_ramsey = {}, {}, {}
+    for _, component, quantity, value in flatten_metrics(metrics):
+        quantity = quantity.lower()
+        if not component.upper().startswith("QB") or "__" in component or value <= 0:
+            continue
+        if "uncertainty" in quantity or "std" in quantity:
+            continue
+        if "t1" in quantity:
+            t1s[component] = _to_ns(value)
+        elif "t2" in quantity:
+            (t2_ramsey if "ramsey" in quantity or "star" in quantity else t2s)[component] = _to_ns(value)
+    return t1s, {**t2_ramsey, **t2s}
+
+
+def _relaxation_infidelity(t1: float, t2: float, duration: float) -> float:
+    """
+    Returns the average infidelity of a thermal relaxation channel acting for `duration`.
+    """
+    return (3 - math.exp(-duration / t1) - 2 * math.exp(-duration / t2)) / 6
+
+
+def _depolarizing_parameter(error: float, relaxation: float, num_qubits: int) -> float:
+    """
+    Returns the depolarizing parameter which, following a relaxation channel of average infidelity
+    `relaxation`, gives a gate of average infidelity `error` to first order.
+    """
+    dim = 2**num_qubits
+    return min(max(error - relaxation, 0.0) * dim / (dim - 1), 1.0)
+
+
+def error_profile_from_metrics(metrics, base_profile, name: str = None):
+    """
+    Returns a copy of the `IQMErrorProfile` `base_profile` with the values found in a metrics payload.
+
+    The calibration reports average gate infidelities, while the fake backend composes a thermal
+    relaxation channel with a depolarizing channel. The relaxation part of the infidelity is therefore
+    subtracted before the error is converted to a depolarizing parameter.
+    """
+    errors = errors_from_metrics(metrics)
+    measured_t1s, measured_t2s = coherence_times(metrics)
+    t1s = {qubit: measured_t1s.get(qubit, t1) for qubit, t1 in base_profile.t1s.items()}
+    # Thermal relaxation requires T2 <= 2 T1
+    t2s = {qubit: min(measured_t2s.get(qubit, t2), 2 * t1s[qubit]) for qubit, t2 in base_profile.t2s.items()}
+
+    single_qubit = {}
+    for gate, parameters in base_profile.single_qubit_gate_depolarizing_error_parameters.items():
+        duration = base_profile.single_qubit_gate_durations[gate]
+        single_qubit[gate] = {
+            qubit: _depolarizing_parameter(
+                errors["single_qubit"][qubit], _relaxation_infidelity(t1s[qubit], t2s[qubit], duration), 1,
+            ) if qubit in errors["single_qubit"] else parameter
+            for qubit, parameter in parameters.items()
+        }
+
+    two_qubit = {}
+    for gate, parameters in base_profile.two_qubit_gate_depolarizing_error_parameters.items():
+        duration = base_profile.two_qubit_gate_durations[gate]
+        two_qubit[gate] = {}
+        for pair, parameter in parameters.items():
+            error = errors["two_qubit"].get(tuple(pair), errors["two_qubit"].get(tuple(reversed(pair))))
+            if error is not None:
+                # Process infidelities add up, and the average infidelity of two qubits is 4/5 of it
+                relaxation = 1.2 * sum(_relaxation_infidelity(t1s[q], t2s[q], duration) for q in pair)
+                parameter = _depolarizing_parameter(error, relaxation, 2)
+            two_qubit[gate][pair] = parameter
+
+    readout = {
+        qubit: {"0": errors["readout"][qubit], "1": errors["readout"][qubit]} if qubit in errors["readout"] else values
+        for qubit, values in base_profile.readout_errors.items()
+    }
+    return replace(
+        base_profile, t1s=t1s, t2s=t2s, single_qubit_gate_depolarizing_error_parameters=single_qubit,
+        two_qubit_gate_depolarizing_error_parameters=two_qubit, readout_errors=readout,
+        name=name or base_profile.name,
+    )
+
+
+def _default_threads() -> int:
+    """
+    Returns the number of Aer threads, the cores of the SLURM allocation or 0 for all cores.
+    """
+    return int(os.getenv("SLURM_CPUS_PER_TASK", "0"))
+
+
+def architecture_specification(backend: IQMFakeBackend) -> QuantumArchitectureSpecification:
+    """
+    Returns the static quantum architecture of a fake backend, which its constructor takes, from the public
+    dynamic architecture and error profile. The couplers are oriented as in the two-qubit error parameters,
+    which the constructor checks against them.
+    """
+    architecture = backend.architecture
+    couplings = {
+        tuple(pair) for rates in backend.error_profile.two_qubit_gate_depolarizing_error_parameters.values()
+        for pair in rates
+    }
+    connectivity = []
+    for gate in architecture.gates.values():
+        for locus in gate.loci:
+            pair = tuple(reversed(locus)) if tuple(reversed(locus)) in couplings else tuple(locus)
+            if len(pair) == 2 and list(pair) not in connectivity:
+                connectivity.append(list(pair))
+    return QuantumArchitectureSpecification(
+        name=backend.name,
+        operations={name: [list(locus) for locus in gate.loci] for name, gate in architecture.gates.items()},
+        qubits=list(architecture.components),
+        qubit_connectivity=connectivity,
+    )
+
+
+class CalibratedFakeBackend(IQMFakeBackend):
+    """
+    An IQM fake backend which can reuse a precomputed noise model and runs its circuits on one
+    multi-threaded `AerSimulator`.
+    """
+
+    def __init__(
+        self, architecture, error_profile, name: str = "IQMCalibratedFakeBackend", noise_model=None,
+        calibration_set_id: str = None, max_parallel_threads: int = None, **kwargs,
+    ):
+        # Read by `_create_noise_model`, which the constructor of IQMFakeBackend calls
+        self._precomputed_noise_model = noise_model
+        super().__init__(architecture, error_profile, name=name, **kwargs)
+        self.calibration_set_id = calibration_set_id
+        if max_parallel_threads is None:
+            max_parallel_threads = _default_threads()
+        # Parallelize over the shots of each circuit, the examples run few circuits with many shots
+        self.simulator = AerSimulator(
+            noise_model=self.noise_model, max_parallel_threads=max_parallel_threads, max_parallel_shots=0,
+            max_parallel_experiments=1,
+        )
+
+    @classmethod
+    def from_backend(cls, backend: IQMFakeBackend, error_profile, **kwargs) -> "CalibratedFakeBackend":
+        """
+        Returns a backend with the quantum architecture of the fake backend `backend`.
+        """
+        return cls(architecture_specification(backend), error_profile, **kwargs)
+
+    def _create_noise_model(self, architecture, error_profile):
+        if self._precomputed_noise_model is not None:
+            return self._precomputed_noise_model
+        return super()._create_noise_model(architecture, error_profile)
+
+    def run(self, run_input, **options):
+        """
+        Runs the circuits on the noisy simulator of the backend. The options, for example `shots`, `memory`
+        or `seed_simulator`, are passed on to the `AerSimulator` on top of the options of the backend.
+
+        Architectures with a MOVE gate are run by `IQMFakeBackend.run`, which checks the MOVE sequences but
+        takes only the `shots` option. Other IQM gates without a Qiskit name, such as `cc_prx`, are decomposed.
+        """
+        if "move" in self.noise_model.basis_gates:
+            return super().run(run_input, **options)
+        circuits = [run_input] if isinstance(run_input, QuantumCircuit) else list(run_input)
+        if len(circuits) == 0:
+            raise ValueError("Empty list of circuits submitted for execution.")
+        iqm_gates = [gate for gate in self.noise_model.basis_gates if gate not in IQM_TO_QISKIT_GATE_NAME.values()]
+        circuits = [
+            circuit.decompose(gates_to_decompose=iqm_gates) if iqm_gates and set(iqm_gates) & set(circuit.count_ops())
+            else circuit
+            for circuit in circuits
+        ]
+        return self.simulator.run(circuits, **{**dict(self.options.items()), **options})
+
+
+def _cache_key(metrics, base) -> str:
+    calibration_set_id = find_calibration_set_id(metrics)
+    if calibration_set_id is None:
+        payload = json.dumps(metrics, sort_keys=True, default=str).encode()
+        calibration_set_id = hashlib.sha256(payload).hexdigest()[:32]
+    return f"{base.name}-{calibration_set_id}-v{CACHE_VERSION}"
+
+
+def _load_cached(path: str):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+
+def _store_cached(path: str, error_profile, noise_model):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump((error_profile, noise_model), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def get_emulator(
+    metrics=None, calibration_set_id=None, filename: str = None, client=None, base=None, cache_dir: str = None,
+    max_parallel_threads: int = None,
+) -> CalibratedFakeBackend:
+    """
+    Returns a fake backend with the noise of a calibration set.
+
+    The calibration set is `metrics` if given, else loaded from the JSON file `filename`, else fetched
+    with `get_calibration_data(client, calibration_set_id)`. `base` is the fake backend whose
+    architecture and missing values are used, `IQMFakeAdonis()` by default for Helmi.
+    """
+    if metrics is None:
+        if filename:
+            with open(filename) as f:
+                metrics = json.load(f)
+        elif client is not None:
+            from get_calibration_data import get_calibration_data
+            metrics = get_calibration_data(client, calibration_set_id)
+        else:
+            raise ValueError("One of metrics, filename or client is needed")
+    base = base or IQMFakeAdonis()
+    key = _cache_key(metrics, base)
+    if key not in _emulators:
+        cache_dir = cache_dir or os.getenv("FIQCI_NOISE_MODEL_CACHE", DEFAULT_CACHE_DIR)
+        path = os.path.join(cache_dir, f"{key}.pkl")
+        cached = _load_cached(path)
+        if cached is None:
+            error_profile = error_profile_from_metrics(metrics, base.error_profile, name=key)
+            backend = CalibratedFakeBackend.from_backend(
+                base, error_profile, calibration_set_id=find_calibration_set_id(metrics),
+                max_parallel_threads=max_parallel_threads,
+            )
+            _store_cached(path, error_profile, backend.noise_model)
+        else:
+            error_profile, noise_model = cached
+            backend = CalibratedFakeBackend.from_backend(
+                base, error_profile, noise_model=noise_model,
+                calibration_set_id=find_calibration_set_id(metrics), max_parallel_threads=max_parallel_threads,
+            )
+        _emulators[key] = backend
+    return _emulators[key]
+
+
+if __name__ == "__main__":
+    args_parser = argparse.ArgumentParser(description="Build and cache the noise model of a calibration set")
+    args_parser.add_argument("--calibration", help="Calibration JSON saved by get_calibration_data.py")
+    args_parser.add_argument("--calibration-set-id", help="Calibration set to fetch, the latest by default")
+    args = args_parser.parse_args()
+
+    client = None
+    if not args.calibration:
+        from iqm.qiskit_iqm import IQMProvider
+
+        HELMI_CORTEX_URL = os.getenv("HELMI_CORTEX_URL")
+        if not HELMI_CORTEX_URL:
+            raise ValueError("Environment variable HELMI_CORTEX_URL is not set, use --calibration")
+        client = IQMProvider(HELMI_CORTEX_URL).get_backend().client
+
+    emulator = get_emulator(calibration_set_id=args.calibration_set_id, filename=args.calibration, client=client)
+    print(emulator.error_profile)
@@ -0,0 +1,140 @@
+"""
+Calibration-aware qubit selection and readout mitigation for Qiskit backends.
+
+`get_layout_scorer` builds a `LayoutScorer` (see `scripts/layout_scoring.py`) from the current
+calibration data of an IQM backend, or from the error profile of a fake IQM backend. Simulators
+without a coupling map have no preferred qubits, so `None` is returned for them and the examples
+fall back to their fixed qubits.
+
+`get_readout_mitigator` builds a `ReadoutMitigator` (see `scripts/readout_mitigation.py`) for all qubits
+of the backend from the same data. For a transpiled circuit, `mitigator.subset(measured_qubits(circuit))`
+gives the mitigator of its measured bits.
+
+Usage:
+
+    from calibrated_layout import get_layout_scorer, get_readout_mitigator, measured_qubits
+
+    scorer = get_layout_scorer(backend)
+    if scorer is not None:
+        center, leaves = scorer.best_star(4)
+
+    mitigator = get_readout_mitigator(backend).subset(measured_qubits(circuit))
+    indices, probabilities = mitigator.mitigate(counts)
+"""
+
+import _paths  # noqa: F401
+from calibration_metrics import errors_from_metrics
+from layout_scoring import LayoutScorer
+from readout_mitigation import ReadoutMitigator, cached_mitigator
+
+_errors = {}
+_scorers = {}
+_mitigators = {}
+
+
+def _profile_errors(error_profile) -> dict:
+    """
+    Returns the errors of a fake backend error profile in the format of `errors_from_metrics`.
+    """
+    single_qubit = {}
+    for errors in error_profile.single_qubit_gate_depolarizing_error_parameters.values():
+        for qubit, error in errors.items():
+            single_qubit[qubit] = max(single_qubit.get(qubit, 0.0), error)
+    two_qubit = {}
+    for errors in error_profile.two_qubit_gate_depolarizing_error_parameters.values():
+        for pair, error in errors.items():
+            two_qubit[tuple(pair)] = max(two_qubit.get(tuple(pair), 0.0), error)
+    readout = {
+        qubit: (errors.get("0", 0.0), errors.get("1", 0.0)) for qubit, errors in error_profile.readout_errors.items()
+    }
+    return {"readout": readout, "single_qubit": single_qubit, "two_qubit": two_qubit}
+
+
+def _backend_errors(backend, calibration_set_id=None):
+    """
+    Returns the errors of the backend qubits keyed by qubit name and the calibration set id they come from,
+    or (None, None) if the calibration data cannot be fetched.
+    """
+    key = (id(backend), calibration_set_id)
+    if key not in _errors:
+        if hasattr(backend, "error_profile"):
+            _errors[key] = _profile_errors(backend.error_profile), None
+        else:
+            # Imported on first use, the HTTP client is not needed for fake backends and simulators
+            from calibration_client import find_calibration_set_id
+            from get_calibration_data import get_calibration_data
+
+            try:
+                metrics = get_calibration_data(backend.client, calibration_set_id)
+            except (OSError, ValueError) as e:
+                print(f"Could not fetch calibration data: {e}")
+                return None, None
+            _errors[key] = errors_from_metrics(metrics), calibration_set_id or find_calibration_set_id(metrics)
+    return _errors[key]
+
+
+def _qubit_names(backend) -> list[str]:
+    return [backend.index_to_qubit_name(i) for i in range(backend.num_qubits)]
+
+
+def get_layout_scorer(backend, calibration_set_id=None):
+    """
+    Returns a LayoutScorer for the backend, or None if the backend has no coupling map or the
+    calibration data cannot be fetched.
+
+    The calibration data of a real backend is fetched with `get_calibration_data`, which caches it on
+    disk, and the scorer is built once per backend and calibration set.
+    """
+    if getattr(backend, "coupling_map", None) is None:
+        return None
+    key = (id(backend), calibration_set_id)
+    if key not in _scorers:
+        errors, _ = _backend_errors(backend, calibration_set_id)
+        if errors is None:
+            print("Using the default qubits")
+            return None
+        num_qubits = backend.num_qubits
+        readout = {
+            name: sum(error) / 2 if isinstance(error, tuple) else error for name, error in errors["readout"].items()
+        }
+        _scorers[key] = LayoutScorer.from_errors(
+            num_qubits, backend.coupling_map.get_edges(), dict(errors, readout=readout), _qubit_names(backend),
+        )
+    return _scorers[key]
+
+
+def get_readout_mitigator(backend, calibration_set_id=None):
+    """
+    Returns a ReadoutMitigator for all qubits of the backend, in the order of the qubit indices, or None
+    for simulators without readout errors and if the calibration data cannot be fetched.
+
+    Mitigators of real backends are cached on disk by calibration set id.
+    """
+    if getattr(backend, "coupling_map", None) is None:
+        return None
+    key = (id(backend), calibration_set_id)
+    if key not in _mitigators:
+        errors, resolved_id = _backend_errors(backend, calibration_set_id)
+        if errors is None:
+            return None
+        names = _qubit_names(backend)
+
+        def build():
+            return ReadoutMitigator.from_errors(
+                {i: errors["readout"].get(name, 0.0) for i, name in enumerate(names)}, resolved_id,
+            )
+
+        _mitigators[key] = cached_mitigator(resolved_id, build)
+    return _mitigators[key]
+
+
+def measured_qubits(circuit) -> list[int]:
+    """
+    Returns the physical qubit measured into each classical bit of a transpiled circuit.
+    """
+    qubits = [0] * circuit.num_clbits
+    for instruction in circuit.data:
+        if instruction.operation.name == "measure":
+            clbit = circuit.find_bit(instruction.clbits[0]).index
+            qubits[clbit] = circuit.find_bit(instruction.qubits[0]).index
+    return qubits
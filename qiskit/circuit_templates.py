@@ -0,0 +1,143 @@
+"""
+Transpile once, bind many.
+
+Iterative algorithms such as QAOA run the same circuit structure hundreds of times with different angles.
+Rebuilding and transpiling the circuit for every evaluation costs far more than running it on the simulator.
+A `CircuitTemplate` transpiles a circuit with free `Parameter`s once against the backend (through the
+on-disk transpile cache) and then only binds the parameter values for each evaluation.
+
+Usage:
+
+    from circuit_templates import CircuitTemplate, qaoa_maxcut_circuit
+
+    template = CircuitTemplate(qaoa_maxcut_circuit(graph, layers=1), backend)
+    circuit = template.bind({"gamma": [1.0], "beta": [2.0]})
+    counts = backend.run(circuit, shots=1000).result().get_counts()
+"""
+from collections.abc import Mapping
+
+import numpy as np
+from transpile_cache import cached_transpile
+
+from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister
+from qiskit.circuit import ParameterVector
+
+
+class CircuitTemplate:
+    """
+    A parameterized circuit transpiled once for `backend`.
+
+    Values can be bound by position (in the order of `parameter_names`), by parameter name or, for
+    parameter vectors, by vector name with a sequence of values.
+    """
+
+    def __init__(self, circuit: QuantumCircuit, backend, **transpile_options):
+        self.circuit = circuit
+        self.backend = backend
+        self.parameter_names = [p.name for p in circuit.parameters]
+        self.transpiled = cached_transpile(circuit, backend, **transpile_options)
+        # The transpiler may drop parameters whose gates cancel, only bind the ones left
+        self._by_name = {p.name: p for p in self.transpiled.parameters}
+
+    @property
+    def num_parameters(self) -> int:
+        return len(self.parameter_names)
+
+    def _value_map(self, values) -> dict:
+        """
+        Returns a {parameter name: value} mapping for any of the accepted value formats.
+        """
+        if not isinstance(values, Mapping):
+            values = np.asarray(values, dtype=float).ravel()
+            if len(values) != self.num_parameters:
+                raise ValueError(f"Expected {self.num_parameters} parameter values, got {len(values)}")
+            return dict(zip(self.parameter_names, values))
+
+        value_map = {}
+        for key, value in values.items():
+            name = getattr(key, "name", key)
+            if np.ndim(value) == 0:
+                value_map[name] = value
+            else:
+                value_map.update({f"{name}[{i}]": v for i, v in enumerate(value)})
+        missing = set(self.parameter_names) - set(value_map)
+        if missing:
+            raise ValueError(f"Missing values for parameters {sorted(missing)}")
+        return value_map
+
+    def bind(self, values) -> QuantumCircuit:
+        """
+        Returns the transpiled circuit with the parameter values assigned.
+        """
+        value_map = self._value_map(values)
+        bound = self.transpiled.assign_parameters(
+            {p: float(value_map[name]) for name, p in self._by_name.items()},
+        )
+        bound.name = self.circuit.name
+        return bound
+
+    def bind_many(self, values_list) -> list[QuantumCircuit]:
+        """
+        Returns one bound circuit for each set of values, for example each row of a 2D array.
+        """
+        return [self.bind(values) for values in values_list]
+
+
+def qaoa_maxcut_circuit(graph: dict, layers: int) -> QuantumCircuit:
+    """
+    Returns the MaxCut QAOA ansatz of the course material with parameter vectors `gamma` and `beta`.
+
+    `graph` is a dictionary with 'nodes' and 'edges' as in the QAOA exercise.
+    """
+    gammas = ParameterVector("gamma", layers)
+    betas = ParameterVector("beta", layers)
+    num_qubits = len(graph['nodes'])
+    qc = QuantumCircuit(num_qubits, num_qubits)
+
+    qc.h(range(num_qubits))
+    for i in range(layers):
+        for a, b in graph['edges']:
+            qc.cx(a, b)
+            qc.rz(0.5 * gammas[i], b)
+            qc.cx(a, b)
+        qc.rx(betas[i], range(num_qubits))
+
+    qc.measure(range(num_qubits), range(num_qubits))
+    return qc
+
+
+def bv_masked_circuit(dim: int) -> QuantumCircuit:
+    """
+    Returns a Bernstein-Vazirani circuit where the oracle bits are the parameters `s[0]`, ..., `s[dim-1]`.
+
+    The oracle applies CX(i, output) when s[i] = 1. The CX is written as H CP(pi * s[i]) H on the output
+    qubit, which is the identity for s[i] = 0 and a CX for s[i] = 1, so one transpiled circuit serves every
+    secret. `s[i]` is the i-th bit counting from the least significant bit.
+    """
+    s = ParameterVector("s", dim)
+    qreg = QuantumRegister(dim + 1, "QB")
+    creg = ClassicalRegister(dim, "c")
+    qc = QuantumCircuit(qreg, creg)
+
+    qc.h(qreg[dim])
+    qc.z(qreg[dim])
+    for i in range(dim):
+        qc.h(i)
+
+    qc.h(qreg[dim])
+    for i in range(dim):
+        qc.cp(np.pi * s[i], i, qreg[dim])
+    qc.h(qreg[dim])
+
+    for i in range(dim):
+        qc.h(i)
+
+    qc.measure(range(dim), range(dim))
+    return qc
+
+
+def secret_bits(secret: int, dim: int) -> np.ndarray:
+    """
+    Returns the bits of `secret` as the values of the `s` parameters of `bv_masked_circuit`.
+    """
+    return (secret >> np.arange(dim)) & 1
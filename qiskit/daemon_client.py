@@ -0,0 +1,130 @@
+"""
+Client of the submission daemon, see `submission_daemon.py`.
+
+`DaemonClient.run` sends circuits to the daemon and returns their counts. Run as a script, it sends the
+circuits of every Python file, which defines them in a module level list called `circuits`, or QPY file
+it is given, one job per file. The Python files are run with `__name__` set to `"__daemon__"`, so code
+under `if __name__ == "__main__":` is not run.
+
+Usage:
+
+    from daemon_client import DaemonClient
+
+    counts = DaemonClient().run(circuits, backend="helmi", shots=1000)
+
+    python daemon_client.py my_circuits.py more_circuits.qpy --backend helmi --shots 1000
+    python daemon_client.py --ping
+"""
+import argparse
+import io
+import json
+import runpy
+import socket
+
+from submission_daemon import default_socket_path, recv_message, send_message
+
+from qiskit import QuantumCircuit, qpy
+
+DEFAULT_TRANSPILE_OPTIONS = {"layout_method": "sabre", "optimization_level": 3}
+
+
+class DaemonClient:
+    """
+    Sends requests to the daemon listening on `socket_path`, one connection per request.
+    """
+
+    def __init__(self, socket_path: str = None, timeout: float = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+
+    def request(self, header: dict, payload: bytes = b"") -> dict:
+        """
+        Sends one request and returns the reply, raising RuntimeError if the daemon reports an error.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            send_message(sock, header, payload)
+            reply, _ = recv_message(sock)
+        if not reply.get("ok"):
+            raise RuntimeError(f"The daemon could not run the request: {reply.get('error')}")
+        return reply
+
+    def ping(self) -> dict:
+        return self.request({"op": "ping"})
+
+    def shutdown(self):
+        self.request({"op": "shutdown"})
+
+    def run(
+        self, circuits, backend: str = "helmi", shots: int = 1000, transpile_options=DEFAULT_TRANSPILE_OPTIONS,
+        calibration: str = None,
+    ) -> list[dict]:
+        """
+        Runs the circuits as one job on the daemon and returns their counts.
+
+        The daemon transpiles the circuits with `transpile_options`, pass None for circuits which are
+        already transpiled for the backend.
+        """
+        reply = self.run_request(circuits, backend, shots, transpile_options, calibration)
+        return reply["counts"]
+
+    def run_request(
+        self, circuits, backend: str = "helmi", shots: int = 1000, transpile_options=DEFAULT_TRANSPILE_OPTIONS,
+        calibration: str = None,
+    ) -> dict:
+        """
+        Like `run`, but returns the whole reply with the job id and the timings of the daemon.
+        """
+        if isinstance(circuits, QuantumCircuit):
+            circuits = [circuits]
+        buffer = io.BytesIO()
+        qpy.dump(list(circuits), buffer)
+        header = {
+            "op": "run", "backend": backend, "shots": shots, "transpile": transpile_options,
+            "calibration": calibration,
+        }
+        return self.request(header, buffer.getvalue())
+
+
+def load_circuits(path: str) -> list[QuantumCircuit]:
+    """
+    Returns the circuits of a QPY file or the `circuits` list of a Python file.
+    """
+    if path.endswith(".qpy"):
+        with open(path, "rb") as f:
+            return qpy.load(f)
+    circuits = runpy.run_path(path, run_name="__daemon__").get("circuits")
+    if circuits is None:
+        raise ValueError(f"{path} does not define a list called circuits")
+    return [circuits] if isinstance(circuits, QuantumCircuit) else list(circuits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send circuits to the submission daemon")
+    parser.add_argument("files", nargs="*", help="Python files defining `circuits` or QPY files, one job each")
+    parser.add_argument("--backend", default="helmi", help="Backend of the daemon to run on. Default helmi.")
+    parser.add_argument("--shots", type=int, default=1000, help="Shots per circuit. Default 1000.")
+    parser.add_argument("--calibration", help="Calibration JSON for the emulator backend")
+    parser.add_argument("--no-transpile", action="store_true", help="The circuits are already transpiled")
+    parser.add_argument("--socket", help="Path of the Unix socket, $FIQCI_DAEMON_SOCKET by default")
+    parser.add_argument("--ping", action="store_true", help="Check that the daemon is running")
+    parser.add_argument("--shutdown", action="store_true", help="Stop the daemon")
+    args = parser.parse_args()
+
+    client = DaemonClient(args.socket)
+    if args.ping:
+        print(json.dumps(client.ping()))
+    transpile_options = None if args.no_transpile else DEFAULT_TRANSPILE_OPTIONS
+    for path in args.files:
+        circuits = load_circuits(path)
+        reply = client.run_request(circuits, args.backend, args.shots, transpile_options, args.calibration)
+        print(f"{path}: job {reply['job_id']}")
+        for circuit, counts in zip(circuits, reply["counts"]):
+            print(f"{circuit.name}: {counts}")
+    if args.shutdown:
+        client.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 import os
 
-from iqm.qiskit_iqm import IQMProvider
-from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
+from backends import get_backend
 
 from qiskit import QuantumCircuit, QuantumRegister, transpile
 
@@ -18,17 +17,8 @@ circuit.measure_all()
 # print(circuit.draw())
 
 # Set up the Helmi backend
-backend = IQMFakeAdonis()
-HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
-if not HELMI_CORTEX_URL:
-    print("""Environment variable HELMI_CORTEX_URL is not set.
-          Are you running on Lumi and on the q_fiqci node?.
-          Falling back to fake backend.""")
-    # raise ValueError("Environment variable HELMI_CORTEX_URL is not set")
-
-else:
-    provider = IQMProvider(HELMI_CORTEX_URL)
-    backend = provider.get_backend()
+backend = get_backend("helmi")
+if os.getenv('HELMI_CORTEX_URL'):
     circuit = transpile(
         circuit, backend, layout_method='sabre', optimization_level=3,
     )
@@ -1,13 +1,14 @@
 import argparse
-import os
 from argparse import RawTextHelpFormatter
 
-import numpy as np
-from iqm.qiskit_iqm import IQMProvider
-from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
-from qiskit_aer import Aer
+import _paths  # noqa: F401
+from adaptive_shots import FidelityInterval, run_adaptive
+from backends import BACKENDS, get_backend
+from calibrated_layout import get_layout_scorer, get_readout_mitigator, measured_qubits
+from metrics import classical_fidelity, ghz_distribution, total_variation_distance
+from transpile_cache import cached_transpile
 
-from qiskit import QuantumCircuit, QuantumRegister, transpile
+from qiskit import QuantumCircuit, QuantumRegister
 
 """
 
@@ -49,6 +50,8 @@ def get_args():
         epilog="""Example usage:
         python ghz.py --backend simulator
         python ghz.py --backend simulator --verbose (prints circuits)
+        python ghz.py --backend helmi --adaptive (stops when the fidelity is known to +-0.01)
+        python ghz.py --backend helmi --calibration calibration.json (emulates Helmi without HELMI_CORTEX_URL)
         """,
     )
     # Parse Arguments
@@ -62,7 +65,7 @@ def get_args():
         """,
         required=True,
         type=str,
-        choices=["helmi", "simulator"],
+        choices=BACKENDS,
     )
 
     args_parser.add_argument(
@@ -75,37 +78,74 @@ def get_args():
         action="store_true",
     )
 
+    args_parser.add_argument(
+        "--adaptive",
+        help="""
+        Run in rounds of increasing shots and stop once the 95%% confidence
+        interval of the fidelity is within +-0.01. 10000 shots is then the maximum.
+        """,
+        required=False,
+        action="store_true",
+    )
+
+    args_parser.add_argument(
+        "--calibration",
+        help="""
+        Calibration JSON saved by get_calibration_data.py. Without HELMI_CORTEX_URL
+        Helmi is emulated with the noise of this calibration set instead of the fake backend.
+        """,
+        required=False,
+        type=str,
+    )
+
     return args_parser.parse_args()
 
 
 def main():
     args = get_args()
-    backend = IQMFakeAdonis()
-    if args.backend == 'helmi':
-        # Set up the Helmi backend
-        HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
-        if not HELMI_CORTEX_URL:
-            print("""Environment variable HELMI_CORTEX_URL is not set.
-                  Are you running on Lumi and on the q_fiqci node?.
-                  Falling back to fake backend.""")
-            # raise ValueError("Environment variable HELMI_CORTEX_URL is not set")
-
-        else:
-            provider = IQMProvider(HELMI_CORTEX_URL)
-            backend = provider.get_backend()
-    else:
-        provider = Aer
-        backend = provider.get_backend('aer_simulator')
+    # Helmi falls back to the fake backend, or the emulator with --calibration, without HELMI_CORTEX_URL
+    backend = get_backend(args.backend, calibration=args.calibration)
 
     shots = 10000
 
+    def run(circuit, target):
+        """
+        Returns the counts and the last job, running in rounds of increasing shots in adaptive mode.
+        """
+        if not args.adaptive:
+            job = backend.run(circuit, shots=shots)
+            return job.result().get_counts(), job
+        jobs = []
+
+        def sample(round_shots):
+            jobs.append(backend.run(circuit, shots=round_shots))
+            return jobs[-1].result().get_counts()
+
+        result = run_adaptive(sample, FidelityInterval(target, half_width=0.01), max_shots=shots)
+        print(f"({result.shots} shots)", end=" ")
+        return result.counts, jobs[-1]
+
+    # Use the star with the lowest calibrated errors, QB3 and its neighbours on Helmi
+    center, leaves = 2, [0, 1, 3, 4]
+    scorer = get_layout_scorer(backend)
+    if scorer is not None:
+        center, leaves = scorer.best_star(4)
+
+    # Readout mitigation from the calibrated readout errors, not available on the noiseless simulator
+    mitigator = get_readout_mitigator(backend)
+
+    def mitigated_fidelity(circuit, counts, target):
+        if mitigator is None:
+            return None
+        return classical_fidelity(mitigator.subset(measured_qubits(circuit)).mitigate(counts), target)
+
     bell_vd = []
-    id_dist = [0.5, 0, 0, 0.5]
+    target = ghz_distribution(2)  # |00> + |11> / sqrt(2)
 
     print_header("Preparing a Bell State")
     count = 0
-    for qb in [0, 1, 3, 4]:
-        print("QB" + str(qb + 1) + " and QB3 -> ", end=" ")
+    for qb in leaves:
+        print("QB" + str(qb + 1) + " and QB" + str(center + 1) + " -> ", end=" ")
         qreg = QuantumRegister(2, "qB")
         circuit = QuantumCircuit(qreg)
 
@@ -120,15 +160,14 @@ def main():
 
         mapping = {
             qreg[0]: qb,  # map first virtual qubit to qubit in list
-            qreg[1]: 2,
-        }   # map second virtual qubit to QB3
+            qreg[1]: center,
+        }   # map second virtual qubit to the center qubit
 
         # Run job on the circuit
-        circuit = transpile(
+        circuit = cached_transpile(
             circuit, backend, optimization_level=0, initial_layout=mapping,
         )
-        job = backend.run(circuit, shots=shots)
-        counts = job.result().get_counts()
+        counts, job = run(circuit, target)
 
         if args.verbose:
             print(f"Counts: {counts}")
@@ -138,28 +177,22 @@ def main():
                 except AttributeError:
                     print(job.result().request.qubit_mapping)
 
-        values = counts.values()
-        values_list = list(values)
-
-        vd = 0
-        fid1 = 0
-        for i in range(len(counts)):
-            vd += np.abs(values_list[i] / shots - id_dist[i])
-            vd = 0.5 * vd
-            fid1 += np.sqrt((values_list[i] / shots) * id_dist[i])
+        vd = total_variation_distance(counts, target)
+        fid1 = classical_fidelity(counts, target)
 
         bell_vd.append(vd)
 
         print("Fidelity = ", round(fid1, 3))
+        mitigated = mitigated_fidelity(circuit, counts, target)
+        if mitigated is not None:
+            print("Readout mitigated fidelity = ", round(mitigated, 3))
         print("Distance from target ([0,1]) = ", round(bell_vd[count], 3))
 
         count += 1
 
     print_header("Preparing a GHZ-5 State")
 
-    id_dist = [0 for i in range(32)]
-    id_dist[0] = 0.5
-    id_dist[31] = 0.5
+    target = ghz_distribution(5)
 
     qreg = QuantumRegister(5, "qB")
     circuit = QuantumCircuit(qreg)
@@ -174,11 +207,14 @@ def main():
         print(" ")
         print(circuit.draw())
 
-    circuit = transpile(
-        circuit, backend, layout_method="sabre", optimization_level=3,
+    # The GHZ circuit is a star around qB_2, which is placed on the center qubit
+    initial_layout = None
+    if scorer is not None:
+        initial_layout = [leaves[0], leaves[1], center, leaves[2], leaves[3]]
+    circuit = cached_transpile(
+        circuit, backend, layout_method="sabre", optimization_level=3, initial_layout=initial_layout,
     )
-    job = backend.run(circuit, shots=shots)
-    counts = job.result().get_counts()
+    counts, job = run(circuit, target)
 
     if args.verbose:
         print(f"Counts: {counts}")
@@ -188,17 +224,13 @@ def main():
             except AttributeError:
                 print(job.result().request.qubit_mapping)
 
-    values = counts.values()
-    values_list = list(values)
-
-    vd = 0
-    fid2 = 0
-    for i in range(len(counts)):
-        vd += np.abs(values_list[i] / shots - id_dist[i])
-        vd = 0.5 * vd
-        fid2 += np.sqrt((values_list[i] / shots) * id_dist[i])
+    vd = total_variation_distance(counts, target)
+    fid2 = classical_fidelity(counts, target)
 
     print("GHZ-5 -> Fidelity = ", round(fid2, 3))
+    mitigated = mitigated_fidelity(circuit, counts, target)
+    if mitigated is not None:
+        print("GHZ-5 -> Readout mitigated fidelity = ", round(mitigated, 3))
     print("GHZ-5 -> Distance from target ([0,1]) = ", round(vd, 3))
 
     print(" ")
@@ -0,0 +1,59 @@
+"""
+Submit independent circuits concurrently.
+
+Calling `backend.run(circuit)` and then `job.result()` for one circuit at a time pays the queue round-trip
+for every circuit in turn. `run_concurrently` submits the jobs up front from a pool of worker threads,
+each worker waiting for the result of its own job, and yields the results as they complete.
+`max_in_flight` limits how many jobs are queued on the backend at the same time, so the examples
+can respect the queue policy of Helmi.
+
+Usage:
+
+    from job_submitter import run_all
+
+    results = run_all(backend, circuits, shots=1000)
+    counts = [result.get_counts() for result in results]
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("FIQCI_MAX_IN_FLIGHT", "4"))
+
+
+def _run_one(backend, circuit, shots, run_options):
+    job = backend.run(circuit, shots=shots, **run_options)
+    return job, job.result()
+
+
+def run_concurrently(backend, circuits, shots: int, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, **run_options):
+    """
+    Submits every circuit as its own job and yields (index, job, result) tuples in order of completion.
+
+    At most `max_in_flight` jobs are submitted and not yet finished at any time. Extra keyword arguments
+    are passed on to `backend.run`.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        futures = {
+            executor.submit(_run_one, backend, circuit, shots, run_options): index
+            for index, circuit in enumerate(circuits)
+        }
+        try:
+            for future in as_completed(futures):
+                job, result = future.result()
+                yield futures[future], job, result
+        finally:
+            # Do not start the remaining jobs if the caller stops early or a job fails
+            for future in futures:
+                future.cancel()
+
+
+def run_all(backend, circuits, shots: int, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, **run_options) -> list:
+    """
+    Runs the circuits concurrently and returns their results in the order of `circuits`.
+    """
+    results = [None] * len(circuits)
+    for index, _, result in run_concurrently(backend, circuits, shots, max_in_flight, **run_options):
+        results[index] = result
+    return results
@@ -2,14 +2,13 @@
 A more advanced example to flip qubits with either Helmi or the simulator.
 """
 import argparse
-import os
 from argparse import RawTextHelpFormatter
 
-from iqm.qiskit_iqm import IQMProvider
-from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
-from qiskit_aer import Aer
+from backends import BACKENDS, get_backend
+from batching import BatchPlanner
+from transpile_cache import cached_transpile
 
-from qiskit import QuantumCircuit, QuantumRegister, transpile
+from qiskit import QuantumCircuit, QuantumRegister
 
 
 def get_args():
@@ -17,8 +16,8 @@ def get_args():
         description="Qubit flipping options", formatter_class=RawTextHelpFormatter,
     )
     parser.add_argument(
-        "--backend", choices=['helmi', 'simulator'],
-        help="Backend to use: 'helmi' or 'simulator'", required=True,
+        "--backend", choices=BACKENDS,
+        help="Backend to use, see backends.py", required=True,
     )
     parser.add_argument(
         "--qubits", type=int, nargs='+',
@@ -75,23 +74,7 @@ def flip_qubits(qubits: list[int], backend_str: str, shots: int, verbose: bool):
     Function to run the flip circuit
     """
 
-    backend = IQMFakeAdonis()
-
-    if backend_str == 'helmi':
-        # Set up the Helmi backend
-        HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
-        if not HELMI_CORTEX_URL:
-            print("""Environment variable HELMI_CORTEX_URL is not set.
-                  Are you running on Lumi and on the q_fiqci node?
-                  Falling back to a simulator.""")
-            # raise ValueError("Environment variable HELMI_CORTEX_URL is not set")
-
-        else:
-            provider = IQMProvider(HELMI_CORTEX_URL)
-            backend = provider.get_backend()
-    else:
-        provider = Aer
-        backend = provider.get_backend('aer_simulator')
+    backend = get_backend(backend_str)
 
     circuit_mapping_pairs = []  # circuit, mapping tuples
     if qubits is None:  # Flip all qubits
@@ -104,24 +87,30 @@ def flip_qubits(qubits: list[int], backend_str: str, shots: int, verbose: bool):
             circuit, mapping = single_flip_circuit(qb)
             circuit_mapping_pairs.append((circuit, mapping))
 
+    # All circuits are submitted together as one batch job
+    planner = BatchPlanner(backend)
+    handles = []
+    for circuit, mapping in circuit_mapping_pairs:
+        circuit = cached_transpile(
+            circuit, backend, layout_method='sabre',
+            optimization_level=3, initial_layout=mapping,
+        )
+        handles.append(planner.add(circuit, shots=shots))
+    planner.run()
+
     # Calculate success probability
-    for i, (circuit, mapping) in enumerate(circuit_mapping_pairs):
+    for i, ((circuit, mapping), handle) in enumerate(zip(circuit_mapping_pairs, handles)):
         if verbose:
             print(f"Circuit {i+1}:\n")
             print(circuit)
 
-        circuit = transpile(
-            circuit, backend, layout_method='sabre',
-            optimization_level=3, initial_layout=mapping,
-        )
-        job = backend.run(circuit, shots=shots)
-        counts = job.result().get_counts()
+        counts = handle.get_counts()
         if verbose and "IQM" in str(backend):
             print("Mapping")
             try:
-                print(job.result().results[0].metadata['input_qubit_map'])
+                print(handle.result().results[handle.index].metadata['input_qubit_map'])
             except AttributeError:
-                print(job.result().request.qubit_mapping)
+                print(handle.result().request.qubit_mapping)
 
         if qubits is None:
             success_probability = calculate_success_probability(
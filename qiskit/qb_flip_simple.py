@@ -1,10 +1,11 @@
 """
 Simple qubit flipping example
 """
-import os
 
-from iqm.qiskit_iqm import IQMProvider
-from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
+import _paths  # noqa: F401
+from backends import get_backend
+from job_submitter import run_all
+from readout_mitigation import ReadoutMitigator
 
 from qiskit import QuantumCircuit, QuantumRegister, transpile
 
@@ -46,29 +47,38 @@ def calculate_success_probability(counts: dict, shots: int, desired_state: str)
 
 def main():
 
-    backend = IQMFakeAdonis()
-    HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
-    if not HELMI_CORTEX_URL:
-        print("""Environment variable HELMI_CORTEX_URL is not set.
-              Are you running on Lumi and on the q_fiqci node?.
-              Falling back to fake backend.""")
-        # raise ValueError("Environment variable HELMI_CORTEX_URL is not set")
-
-    else:
-        provider = IQMProvider(HELMI_CORTEX_URL)
-        backend = provider.get_backend()
+    backend = get_backend("helmi")
 
     shots = 1000
 
-    print("\nFlip one qubit at a time\n")
+    circuits = []
     for qb in range(5):
         circuit, mapping = single_flip_circuit(qb)
-        circuit = transpile(
+        circuits.append(transpile(
             circuit, backend, layout_method='sabre',
             optimization_level=3, initial_layout=mapping,
-        )
-        job = backend.run(circuit, shots=shots)
-        counts = job.result().get_counts()
+        ))
+
+    circuit, mapping = flip_circuit([0, 1, 2, 3, 4])
+    circuits.append(transpile(
+        circuit, backend, layout_method='sabre',
+        optimization_level=3, initial_layout=mapping,
+    ))
+
+    # All qubits left in |0>, together with the all flipped circuit this measures the readout errors
+    qreg = QuantumRegister(5, "qb")
+    circuit = QuantumCircuit(qreg)
+    circuit.measure_all()
+    circuits.append(transpile(
+        circuit, backend, optimization_level=0, initial_layout={qreg[i]: i for i in range(5)},
+    ))
+
+    # The circuits are independent, so all jobs are submitted at once
+    results = run_all(backend, circuits, shots=shots)
+
+    print("\nFlip one qubit at a time\n")
+    for qb in range(5):
+        counts = results[qb].get_counts()
         success_probability = calculate_success_probability(counts, shots, '1')
         print(
             f"""QB{
@@ -77,18 +87,18 @@ def main():
         )
 
     print("\nFlip all qubits at once\n")
-    circuit, mapping = flip_circuit([0, 1, 2, 3, 4])
-    circuit = transpile(
-        circuit, backend, layout_method='sabre',
-        optimization_level=3, initial_layout=mapping,
-    )
-    job = backend.run(circuit, shots=shots)
-    counts = job.result().get_counts()
+    counts = results[5].get_counts()
     success_probability = calculate_success_probability(counts, shots, '11111')
     print(
         f"Counts: {counts}, \nSuccess probability: {success_probability * 100:.2f}%",
     )
 
+    # The tensored readout assignment matrices, these include the error of the X gates
+    mitigator = ReadoutMitigator.from_preparations(results[6].get_counts(), results[5].get_counts(), 5)
+    print("\nReadout errors from the |00000> and |11111> circuits\n")
+    for qb, matrix in enumerate(mitigator.matrices):
+        print(f"QB{qb + 1} -> P(1|0) = {matrix[1, 0] * 100:.2f}%, P(0|1) = {matrix[0, 1] * 100:.2f}%")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,315 @@
+"""
+Local archive of finished jobs for fast retrieval of past runs.
+
+Every archived job is indexed in a SQLite database with its job id, backend, calibration_set_id, shots,
+label and timestamps, and every circuit of the job with its name, qubit mapping and the physical qubits it
+used. The counts and the transpiled circuits (as QPY) are stored as zlib compressed blobs named by their
+SHA-256, so a circuit which is run many times is stored once:
+
+    <root>/index.sqlite
+    <root>/blobs/<sha256>.z
+
+Queries such as "all GHZ runs on calibration set X" only read the index, without calling
+`backend.retrieve_job` on the server.
+
+`attach` wraps `backend.run`, so every job of the backend is archived when its result is first fetched.
+`backends.get_backend` attaches the archive in `$FIQCI_RESULT_ARCHIVE` to every backend if the variable
+is set, and labels the jobs with the name of the script that ran them.
+
+Usage:
+
+    FIQCI_RESULT_ARCHIVE=~/helmi-results python ghz.py --backend helmi
+
+    from result_archive import ResultArchive
+
+    archive = ResultArchive("~/helmi-results")
+    for job in archive.query(label="ghz.py", calibration_set_id="<calibration set id>"):
+        print(job["job_id"], archive.counts(job["job_id"]))
+
+    python result_archive.py ~/helmi-results --label ghz.py
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+from qiskit import QuantumCircuit, qpy
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    backend TEXT,
+    label TEXT,
+    calibration_set_id TEXT,
+    shots INTEGER,
+    num_circuits INTEGER,
+    submitted REAL,
+    completed REAL,
+    timestamps TEXT
+);
+CREATE TABLE IF NOT EXISTS circuits (
+    job_id TEXT,
+    position INTEGER,
+    name TEXT,
+    num_qubits INTEGER,
+    depth INTEGER,
+    physical_qubits TEXT,
+    qubit_mapping TEXT,
+    circuit_blob TEXT,
+    counts_blob TEXT,
+    PRIMARY KEY (job_id, position)
+);
+CREATE INDEX IF NOT EXISTS jobs_calibration ON jobs (calibration_set_id, completed);
+CREATE INDEX IF NOT EXISTS jobs_label ON jobs (label, completed);
+CREATE INDEX IF NOT EXISTS jobs_backend ON jobs (backend, completed);
+CREATE INDEX IF NOT EXISTS circuits_name ON circuits (name);
+"""
+
+_archives = {}
+
+
+def _physical_qubits(circuit) -> list[int]:
+    """
+    Returns the physical qubits which the operations of a transpiled circuit act on.
+    """
+    used = {circuit.find_bit(qubit).index for instruction in circuit.data for qubit in instruction.qubits}
+    return sorted(used)
+
+
+def _qubit_mapping(circuit, result, position: int, backend) -> list:
+    """
+    Returns [logical, physical] qubit pairs from the run request of IQM jobs, otherwise from the layout
+    of the transpiled circuit and the qubit names of the backend.
+    """
+    request = getattr(result, "request", None)
+    if request is not None and getattr(request, "qubit_mapping", None):
+        return [[m.logical_name, m.physical_name] for m in request.qubit_mapping]
+    if circuit.layout is None:
+        return []
+    name = getattr(backend, "index_to_qubit_name", None)
+    return [
+        [virtual, name(physical) if name else physical]
+        for virtual, physical in enumerate(circuit.layout.final_index_layout())
+    ]
+
+
+def _calibration_set_id(result, backend):
+    for experiment in getattr(result, "results", []):
+        if getattr(experiment, "calibration_set_id", None):
+            return str(experiment.calibration_set_id)
+    return getattr(backend, "calibration_set_id", None)
+
+
+class ResultArchive:
+    """
+    SQLite index and blob store of finished jobs under `root`, see the module documentation.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.expanduser(root)
+        self._blob_dir = os.path.join(self.root, "blobs")
+        os.makedirs(self._blob_dir, exist_ok=True)
+        # Jobs finish in the worker threads of job_submitter, so one connection is shared under a lock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.root, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def _put_blob(self, data: bytes) -> str:
+        key = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self._blob_dir, f"{key}.z")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(data))
+            os.replace(tmp_path, path)
+        return key
+
+    def _get_blob(self, key: str) -> bytes:
+        with open(os.path.join(self._blob_dir, f"{key}.z"), "rb") as f:
+            return zlib.decompress(f.read())
+
+    def record(
+        self, job, circuits, result=None, backend=None, shots: int = None, label: str = None,
+        submitted: float = None,
+    ) -> str:
+        """
+        Archives a finished job and the transpiled circuits it ran. Returns the job id.
+        """
+        result = result if result is not None else job.result()
+        if isinstance(circuits, QuantumCircuit):
+            circuits = [circuits]
+        job_id = str(job.job_id())
+        completed = time.time()
+        timestamps = getattr(result, "timestamps", None)
+        rows = []
+        for position, circuit in enumerate(circuits):
+            buffer = io.BytesIO()
+            qpy.dump(circuit, buffer)
+            counts = json.dumps(result.get_counts(position), sort_keys=True).encode()
+            rows.append((
+                job_id, position, circuit.name, circuit.num_qubits, circuit.depth(),
+                json.dumps(_physical_qubits(circuit)),
+                json.dumps(_qubit_mapping(circuit, result, position, backend)),
+                self._put_blob(buffer.getvalue()), self._put_blob(counts),
+            ))
+        backend_name = getattr(backend, "name", None) or getattr(result, "backend_name", None)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id, backend_name, label, _calibration_set_id(result, backend), shots, len(circuits),
+                    submitted, completed, json.dumps(timestamps, default=str) if timestamps else None,
+                ),
+            )
+            self._db.execute("DELETE FROM circuits WHERE job_id = ?", (job_id,))
+            self._db.executemany("INSERT INTO circuits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return job_id
+
+    def attach(self, backend, label: str = None):
+        """
+        Wraps `backend.run` so that every job is archived when its result is first fetched.
+        Returns the backend.
+        """
+        if getattr(backend, "_result_archive", None) is self:
+            return backend
+        run = backend.run
+
+        def archived_run(run_input, **options):
+            submitted = time.time()
+            job = run(run_input, **options)
+            circuits = [run_input] if isinstance(run_input, QuantumCircuit) else list(run_input)
+            shots = options.get("shots", getattr(getattr(backend, "options", None), "shots", None))
+            job_result = job.result
+            recorded = []
+
+            def archived_result(*args, **kwargs):
+                result = job_result(*args, **kwargs)
+                if not recorded:
+                    recorded.append(True)
+                    try:
+                        self.record(job, circuits, result, backend, shots, label, submitted)
+                    except (sqlite3.Error, OSError) as e:
+                        print(f"Could not archive job {job.job_id()}: {e}")
+                return result
+
+            job.result = archived_result
+            return job
+
+        backend.run = archived_run
+        backend._result_archive = self
+        return backend
+
+    def query(
+        self, label: str = None, calibration_set_id: str = None, backend: str = None, circuit_name: str = None,
+        since: float = None, until: float = None, limit: int = None,
+    ) -> list[dict]:
+        """
+        Returns the jobs matching all given filters, newest first. `since` and `until` are Unix times.
+        """
+        conditions, values = [], []
+        for column, value in (("label", label), ("calibration_set_id", calibration_set_id), ("backend", backend)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                values.append(value)
+        if circuit_name is not None:
+            conditions.append("job_id IN (SELECT job_id FROM circuits WHERE name = ?)")
+            values.append(circuit_name)
+        if since is not None:
+            conditions.append("completed >= ?")
+            values.append(since)
+        if until is not None:
+            conditions.append("completed < ?")
+            values.append(until)
+        sql = "SELECT * FROM jobs"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY completed DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, values)]
+
+    def circuits(self, job_id: str) -> list[dict]:
+        """
+        Returns the index rows of the circuits of a job, with the qubit lists decoded.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM circuits WHERE job_id = ? ORDER BY position", (job_id,))
+            rows = [dict(row) for row in rows]
+        for row in rows:
+            row["physical_qubits"] = json.loads(row["physical_qubits"])
+            row["qubit_mapping"] = json.loads(row["qubit_mapping"])
+        return rows
+
+    def counts(self, job_id: str) -> list[dict]:
+        """
+        Returns the counts of every circuit of a job.
+        """
+        return [json.loads(self._get_blob(row["counts_blob"])) for row in self.circuits(job_id)]
+
+    def transpiled_circuits(self, job_id: str) -> list[QuantumCircuit]:
+        """
+        Returns the transpiled circuits of a job.
+        """
+        return [qpy.load(io.BytesIO(self._get_blob(row["circuit_blob"])))[0] for row in self.circuits(job_id)]
+
+    def close(self):
+        self._db.close()
+
+
+def get_default_archive():
+    """
+    Returns the archive in `$FIQCI_RESULT_ARCHIVE`, or None if the variable is not set.
+    """
+    root = os.getenv("FIQCI_RESULT_ARCHIVE")
+    if not root:
+        return None
+    if root not in _archives:
+        _archives[root] = ResultArchive(root)
+    return _archives[root]
+
+
+def script_label() -> str:
+    """
+    Returns the name of the running script, the label of the jobs archived by `backends.get_backend`.
+    """
+    return os.path.basename(sys.argv[0]) or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the jobs of a result archive")
+    parser.add_argument("root", help="Directory of the archive")
+    parser.add_argument("--label", help="Script that ran the jobs, for example ghz.py")
+    parser.add_argument("--calibration-set-id")
+    parser.add_argument("--backend")
+    parser.add_argument("--circuit-name")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--counts", action="store_true", help="Print the counts of every job")
+    args = parser.parse_args()
+
+    archive = ResultArchive(args.root)
+    start = time.perf_counter()
+    jobs = archive.query(args.label, args.calibration_set_id, args.backend, args.circuit_name, limit=args.limit)
+    elapsed = time.perf_counter() - start
+    for job in jobs:
+        completed = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["completed"]))
+        print(
+            f"{completed}  {job['job_id']}  {job['label']}  {job['backend']}  "
+            f"{job['num_circuits']} circuits x {job['shots']} shots  calibration {job['calibration_set_id']}"
+        )
+        if args.counts:
+            for counts in archive.counts(job["job_id"]):
+                print(f"    {counts}")
+    print(f"{len(jobs)} jobs in {elapsed * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
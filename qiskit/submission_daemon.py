@@ -0,0 +1,277 @@
+"""
+Long-lived submission daemon for many small jobs.
+
+Starting `python -u script.py` for every SLURM job pays the module imports, the authentication of the
+provider, the construction of the backend and the transpilation again for every job. The daemon does
+this once: it keeps the backends of `backends.get_backend` and the transpiled circuits in memory and
+accepts circuit jobs from `daemon_client.py` over a local Unix socket.
+
+Every request is one job. The circuits are sent as QPY, transpiled through the transpile cache unless
+the client sends them already transpiled, run as one batch on the backend and the counts are returned.
+Requests of several clients are served concurrently, with at most `max_in_flight` jobs on the backend.
+
+The socket is `$FIQCI_DAEMON_SOCKET`, or `fiqci-daemon-<user>.sock` in the temporary directory, and only
+the owner can connect to it. The daemon exits after `--idle-timeout` seconds without requests, so it does
+not hold on to a SLURM allocation.
+
+Protocol: every message is a JSON header and a binary payload, each prefixed by its length as an 8-byte
+big-endian integer. Requests have an `op` of `ping`, `run` or `shutdown`, replies have `ok` and either
+the result or an `error`.
+
+Usage:
+
+    python submission_daemon.py --idle-timeout 3600 --preload helmi &
+    python daemon_client.py my_circuits.py --backend helmi --shots 1000
+"""
+import argparse
+import getpass
+import io
+import json
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from backends import get_backend
+from job_submitter import DEFAULT_MAX_IN_FLIGHT
+from transpile_cache import get_default_cache
+
+from qiskit import qpy
+
+_LENGTH = struct.Struct("!Q")
+DEFAULT_MAX_TRANSPILED = 256
+
+
+def default_socket_path() -> str:
+    return os.getenv(
+        "FIQCI_DAEMON_SOCKET", os.path.join(tempfile.gettempdir(), f"fiqci-daemon-{getpass.getuser()}.sock"),
+    )
+
+
+def _recv_exactly(sock, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(min(size - len(data), 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed before the message was complete")
+        data += chunk
+    return bytes(data)
+
+
+def send_message(sock, header: dict, payload: bytes = b""):
+    """
+    Sends a JSON header and a binary payload, each prefixed with its length.
+    """
+    encoded = json.dumps(header).encode()
+    sock.sendall(_LENGTH.pack(len(encoded)) + encoded + _LENGTH.pack(len(payload)) + payload)
+
+
+def recv_message(sock) -> tuple[dict, bytes]:
+    """
+    Receives a message sent by `send_message` and returns the header and the payload.
+    """
+    header = json.loads(_recv_exactly(sock, _LENGTH.unpack(_recv_exactly(sock, _LENGTH.size))[0]))
+    payload = _recv_exactly(sock, _LENGTH.unpack(_recv_exactly(sock, _LENGTH.size))[0])
+    return header, payload
+
+
+class SubmissionDaemon:
+    """
+    Runs the requests of the clients, see the module documentation.
+
+    At most `max_transpiled` transpiled circuits are kept in memory, the least recently used are dropped
+    first and are read back from the transpile cache when they are needed again.
+    """
+
+    def __init__(
+        self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, cache=None, max_transpiled: int = DEFAULT_MAX_TRANSPILED,
+    ):
+        self.cache = cache or get_default_cache()
+        self.started = time.time()
+        self.last_request = time.time()
+        self.active = 0
+        self.jobs = 0
+        self.stopping = False
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.max_transpiled = max_transpiled
+        # Guards only the lookups and inserts of the two dictionaries, circuits are transpiled under the
+        # lock of their key so that requests for other circuits are not blocked
+        self._transpile_lock = threading.Lock()
+        self._transpiled = OrderedDict()
+        self._key_locks = {}
+
+    def _lookup(self, key: str):
+        with self._transpile_lock:
+            transpiled = self._transpiled.get(key)
+            if transpiled is not None:
+                self._transpiled.move_to_end(key)
+            return transpiled
+
+    def transpile(self, circuit, backend, options: dict):
+        """
+        Returns the transpiled circuit from memory, or from the transpile cache on first use.
+        """
+        key = self.cache.key(circuit, backend, **options)
+        transpiled = self._lookup(key)
+        if transpiled is None:
+            with self._transpile_lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+            with key_lock:
+                # Another request may have transpiled it while this one waited for the key
+                transpiled = self._lookup(key)
+                if transpiled is None:
+                    try:
+                        transpiled = self.cache.transpile(circuit, backend, **options)
+                        with self._transpile_lock:
+                            self._transpiled[key] = transpiled
+                            while len(self._transpiled) > self.max_transpiled:
+                                self._transpiled.popitem(last=False)
+                    finally:
+                        with self._transpile_lock:
+                            self._key_locks.pop(key, None)
+        transpiled = transpiled.copy()
+        transpiled.name = circuit.name
+        transpiled.metadata = circuit.metadata
+        return transpiled
+
+    def run(self, header: dict, payload: bytes) -> dict:
+        """
+        Runs the circuits of a `run` request as one job and returns their counts.
+        """
+        timings = {}
+        start = time.perf_counter()
+        circuits = qpy.load(io.BytesIO(payload))
+        backend = get_backend(header.get("backend", "helmi"), header.get("calibration"))
+        options = header.get("transpile")
+        if options is not None:
+            circuits = [self.transpile(circuit, backend, options) for circuit in circuits]
+        timings["prepare"] = time.perf_counter() - start
+
+        with self._slots:
+            start = time.perf_counter()
+            job = backend.run(circuits, shots=header.get("shots", 1000))
+            result = job.result()
+            timings["run"] = time.perf_counter() - start
+        with self._lock:
+            self.jobs += 1
+        return {
+            "job_id": job.job_id(),
+            "counts": [result.get_counts(i) for i in range(len(circuits))],
+            "timings": timings,
+        }
+
+    def handle(self, header: dict, payload: bytes) -> dict:
+        """
+        Returns the reply to one request. Errors are reported to the client instead of stopping the daemon.
+        """
+        op = header.get("op")
+        try:
+            if op == "ping":
+                return {"ok": True, "pid": os.getpid(), "uptime": time.time() - self.started, "jobs": self.jobs}
+            if op == "shutdown":
+                self.stopping = True
+                return {"ok": True}
+            if op == "run":
+                return {"ok": True, **self.run(header, payload)}
+            raise ValueError(f"Unknown operation {op}")
+        except Exception as e:  # the client gets the error of its own request
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        daemon = self.server.daemon
+        with daemon._lock:
+            daemon.active += 1
+        try:
+            header, payload = recv_message(self.request)
+            send_message(self.request, daemon.handle(header, payload))
+        except ConnectionError:
+            pass
+        finally:
+            with daemon._lock:
+                daemon.active -= 1
+                daemon.last_request = time.time()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # server_close waits for the jobs that are still running
+    block_on_close = True
+
+
+def _remove_stale_socket(path: str):
+    """
+    Removes the socket file of a daemon that is no longer running, and fails if one is still running.
+    """
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.remove(path)
+    else:
+        raise RuntimeError(f"A daemon is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def serve(
+    socket_path: str = None, idle_timeout: float = 3600, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    preload: list[str] = (), max_transpiled: int = DEFAULT_MAX_TRANSPILED,
+):
+    """
+    Serves requests on the Unix socket until a shutdown request or `idle_timeout` seconds without requests.
+
+    The backends named in `preload` are created before the first request.
+    """
+    socket_path = socket_path or default_socket_path()
+    _remove_stale_socket(socket_path)
+    daemon = SubmissionDaemon(max_in_flight, max_transpiled=max_transpiled)
+    for name in preload:
+        get_backend(name)
+    # Only the owner may connect, the socket can submit jobs with the owner's credentials
+    umask = os.umask(0o177)
+    try:
+        server = _Server(socket_path, _Handler)
+    finally:
+        os.umask(umask)
+    server.daemon = daemon
+    server.timeout = 1.0
+    print(f"Listening on {socket_path}", flush=True)
+    try:
+        while not daemon.stopping:
+            server.handle_request()
+            if daemon.active == 0 and time.time() - daemon.last_request > idle_timeout:
+                print(f"No requests for {idle_timeout:.0f} seconds, stopping", flush=True)
+                break
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+    print(f"Ran {daemon.jobs} jobs", flush=True)
+
+
+if __name__ == "__main__":
+    args_parser = argparse.ArgumentParser(description="Serve circuit jobs over a local Unix socket")
+    args_parser.add_argument("--socket", help="Path of the Unix socket, $FIQCI_DAEMON_SOCKET by default")
+    args_parser.add_argument(
+        "--idle-timeout", type=float, default=3600, help="Seconds without requests before stopping. Default 3600.",
+    )
+    args_parser.add_argument(
+        "--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+        help=f"Jobs running on the backend at the same time. Default {DEFAULT_MAX_IN_FLIGHT}.",
+    )
+    args_parser.add_argument(
+        "--preload", nargs="*", default=["helmi"], help="Backends to create at startup. Default helmi.",
+    )
+    args_parser.add_argument(
+        "--max-transpiled", type=int, default=DEFAULT_MAX_TRANSPILED,
+        help=f"Transpiled circuits kept in memory. Default {DEFAULT_MAX_TRANSPILED}.",
+    )
+    args = args_parser.parse_args()
+    serve(args.socket, args.idle_timeout, args.max_in_flight, args.preload, args.max_transpiled)
@@ -0,0 +1,328 @@
+"""
+Persistent on-disk cache for transpiled circuits.
+
+Transpiling with `layout_method='sabre'` and `optimization_level=3` is by far the slowest classical step
+of the examples, and the same circuits are transpiled again on every run. This module stores the
+transpiled circuit as QPY, keyed by a hash of
+
+- the structure of the input circuit (gates, parameters, qubit and clbit indices, registers),
+- the backend target (name, number of qubits, coupling map and native operations),
+- the initial layout and the remaining transpile options.
+
+Entries are evicted in least recently used order once the cache grows over `max_entries`. If the
+coupling map or the native operations of a backend change, every entry stored for that backend is dropped.
+Several processes can share the cache directory, for example the tasks of a job array: the index is
+merged with the one on disk under a file lock before it is written.
+
+The cache lives in `~/.cache/fiqci-examples/transpile` by default. Set the `FIQCI_TRANSPILE_CACHE`
+environment variable to use another directory, for example a directory in your LUMI project scratch.
+
+Usage:
+
+    from transpile_cache import cached_transpile
+
+    circuit = cached_transpile(circuit, backend, layout_method='sabre', optimization_level=3)
+"""
+import fcntl
+import hashlib
+import io
+import json
+import numbers
+import os
+import threading
+import time
+
+import numpy as np
+
+from qiskit import qpy, transpile
+from qiskit.circuit import ParameterExpression
+from qiskit.transpiler import Layout
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "fiqci-examples", "transpile",
+)
+DEFAULT_MAX_ENTRIES = 512
+
+
+def _hash(obj) -> str:
+    """
+    Returns a stable sha256 hex digest of a json serializable object.
+    """
+    data = json.dumps(obj, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _param_repr(param):
+    """
+    Returns a representation of an instruction parameter which does not depend on object identity.
+    """
+    if isinstance(param, ParameterExpression):
+        return f"expr:{param}"
+    if isinstance(param, np.ndarray):
+        # str() rounds and abbreviates large arrays, such as the matrix of a UnitaryGate
+        return f"array:{param.dtype.str}:{param.shape}:{hashlib.sha256(param.tobytes()).hexdigest()}"
+    if isinstance(param, (float, complex)):
+        return repr(param)
+    return str(param)
+
+
+def circuit_fingerprint(circuit) -> str:
+    """
+    Returns a canonical hash of the structure of a circuit.
+
+    The circuit name is not part of the fingerprint since Qiskit generates a unique name for every
+    unnamed circuit. Parameters are hashed by name so that the same template built twice gives the same key.
+    """
+    instructions = []
+    for instruction in circuit.data:
+        operation = instruction.operation
+        instructions.append([
+            operation.name,
+            [_param_repr(p) for p in operation.params],
+            [circuit.find_bit(q).index for q in instruction.qubits],
+            [circuit.find_bit(c).index for c in instruction.clbits],
+        ])
+    return _hash({
+        "qregs": [(r.name, r.size) for r in circuit.qregs],
+        "cregs": [(r.name, r.size) for r in circuit.cregs],
+        "global_phase": _param_repr(circuit.global_phase),
+        "data": instructions,
+    })
+
+
+def backend_name(backend) -> str:
+    """
+    Returns the name of a BackendV1 or BackendV2 instance.
+    """
+    name = backend.name
+    return name() if callable(name) else str(name)
+
+
+def backend_fingerprint(backend) -> str:
+    """
+    Returns a hash of the parts of the backend target which affect transpilation.
+    """
+    coupling_map = backend.coupling_map
+    edges = sorted(tuple(edge) for edge in coupling_map.get_edges()) if coupling_map else None
+    return _hash({
+        "name": backend_name(backend),
+        "num_qubits": backend.num_qubits,
+        "coupling_map": edges,
+        "operation_names": sorted(backend.operation_names),
+    })
+
+
+def _layout_repr(circuit, initial_layout):
+    """
+    Returns the initial layout as a list of (virtual index, physical qubit) pairs.
+    """
+    if initial_layout is None:
+        return None
+    if isinstance(initial_layout, Layout):
+        initial_layout = initial_layout.get_virtual_bits()
+    if isinstance(initial_layout, dict):
+        # Qiskit accepts both {virtual qubit: physical} and {physical: virtual qubit}
+        pairs = [(q, p) if isinstance(p, numbers.Integral) else (p, q) for q, p in initial_layout.items()]
+        return sorted((circuit.find_bit(q).index, int(p)) for q, p in pairs)
+    return [(i, int(p)) if isinstance(p, numbers.Integral) else (i, p) for i, p in enumerate(initial_layout)]
+
+
+class TranspileCache:
+    """
+    Least recently used cache of transpiled circuits stored as QPY files in `cache_dir`.
+
+    The index file `index.json` records for each key the backend it belongs to and the last access time.
+    The index is only accessed under a lock, so threads can share the cache. Circuits are transpiled
+    outside of the lock. Before the index is written it is merged with the index on disk under an
+    exclusive `flock` of `index.lock`, so the entries of other processes are kept and evicted as well.
+    """
+
+    def __init__(self, cache_dir: str = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir or os.getenv("FIQCI_TRANSPILE_CACHE", DEFAULT_CACHE_DIR)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(self.cache_dir, "index.json")
+        self._lock_path = os.path.join(self.cache_dir, "index.lock")
+        # Keys this process removed since the index was last written, so the merge does not bring them back
+        self._removed = set()
+        self._index = self._load_index()
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("entries", {})
+        index.setdefault("backends", {})
+        return index
+
+    def _merge(self, disk: dict):
+        """
+        Merges the index on disk into the index of this process. The later access time of an entry wins.
+        """
+        entries = self._index["entries"]
+        for name, fingerprint in disk["backends"].items():
+            if self._index["backends"].get(name) not in (None, fingerprint):
+                # Stored by a process which saw another version of the backend
+                self._removed.update(k for k, v in disk["entries"].items() if v["backend"] == name)
+            else:
+                self._index["backends"][name] = fingerprint
+        for key, entry in disk["entries"].items():
+            if key in self._removed and key not in entries:
+                continue
+            if key not in entries or entry["last_used"] > entries[key]["last_used"]:
+                entries[key] = entry
+
+    def _evict(self):
+        entries = self._index["entries"]
+        if len(entries) > self.max_entries:
+            by_age = sorted(entries, key=lambda k: entries[k]["last_used"])
+            for old_key in by_age[:len(entries) - self.max_entries]:
+                self._remove(old_key)
+
+    def _save_index(self):
+        with open(self._lock_path, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._merge(self._load_index())
+            self._evict()
+            tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self._index_path)
+            self._removed.clear()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.qpy")
+
+    def _remove(self, key: str):
+        self._index["entries"].pop(key, None)
+        self._removed.add(key)
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _check_backend(self, backend):
+        """
+        Drops every entry of the backend if its coupling map or native gate set changed since last use.
+        """
+        name = backend_name(backend)
+        fingerprint = backend_fingerprint(backend)
+        if self._index["backends"].get(name) not in (None, fingerprint):
+            stale = [k for k, v in self._index["entries"].items() if v["backend"] == name]
+            for key in stale:
+                self._remove(key)
+        self._index["backends"][name] = fingerprint
+        return name, fingerprint
+
+    def key(self, circuit, backend, **options) -> str:
+        """
+        Returns the cache key of transpiling `circuit` for `backend` with the given transpile options.
+        """
+        initial_layout = options.pop("initial_layout", None)
+        return _hash({
+            "circuit": circuit_fingerprint(circuit),
+            "backend": backend_fingerprint(backend),
+            "layout": _layout_repr(circuit, initial_layout),
+            "options": options,
+        })
+
+    def get(self, key: str):
+        """
+        Returns the cached transpiled circuit for `key` or None.
+        """
+        if key not in self._index["entries"]:
+            # Another process may have stored it since the index was read
+            self._merge(self._load_index())
+            if key not in self._index["entries"]:
+                return None
+        try:
+            with open(self._entry_path(key), "rb") as f:
+                circuit = qpy.load(f)[0]
+        except (OSError, qpy.QpyError):
+            self._remove(key)
+            return None
+        self._index["entries"][key]["last_used"] = time.time()
+        return circuit
+
+    def put(self, key: str, circuit, backend_label: str):
+        """
+        Stores a transpiled circuit and evicts the least recently used entries over `max_entries`.
+        """
+        buffer = io.BytesIO()
+        qpy.dump(circuit, buffer)
+        tmp_path = f"{self._entry_path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, self._entry_path(key))
+        self._index["entries"][key] = {"backend": backend_label, "last_used": time.time()}
+        self._removed.discard(key)
+        self._evict()
+
+    def transpile(self, circuit, backend, **options):
+        """
+        Drop-in replacement for `qiskit.transpile` for a single circuit which reuses cached results.
+        """
+        key = self.key(circuit, backend, **options)
+        with self._lock:
+            name, _ = self._check_backend(backend)
+            transpiled = self.get(key)
+        if transpiled is None:
+            transpiled = transpile(circuit, backend, **options)
+            with self._lock:
+                self.misses += 1
+                self.put(key, transpiled, name)
+                self._save_index()
+        else:
+            # QPY creates new Parameter objects, give the caller back its own so it can bind them
+            parameters = {p.name: p for p in circuit.parameters}
+            transpiled.assign_parameters(
+                {p: parameters[p.name] for p in transpiled.parameters if p.name in parameters}, inplace=True,
+            )
+            with self._lock:
+                self.hits += 1
+                self._save_index()
+        # Names and metadata are not part of the key, keep the ones of the input circuit
+        transpiled.name = circuit.name
+        transpiled.metadata = circuit.metadata
+        return transpiled
+
+    def clear(self):
+        """
+        Removes every cached circuit.
+        """
+        with self._lock:
+            self._merge(self._load_index())
+            for key in list(self._index["entries"]):
+                self._remove(key)
+            self._index["backends"] = {}
+            self._save_index()
+
+
+_default_cache = None
+
+
+def get_default_cache() -> TranspileCache:
+    """
+    Returns the process wide cache, creating it on first use.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TranspileCache()
+    return _default_cache
+
+
+def cached_transpile(circuits, backend, cache: TranspileCache = None, **options):
+    """
+    Transpiles a circuit or a list of circuits using the on-disk cache.
+
+    Accepts the same keyword arguments as `qiskit.transpile`.
+    """
+    cache = cache or get_default_cache()
+    if isinstance(circuits, (list, tuple)):
+        return [cache.transpile(circuit, backend, **options) for circuit in circuits]
+    return cache.transpile(circuits, backend, **options)
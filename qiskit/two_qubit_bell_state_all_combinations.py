@@ -6,33 +6,23 @@ Generate all 8 possible Bell States on the 5-qubit star layout.
 Draw an image comparing error rates between all states.
 """
 import collections
-import os
 import time
 from datetime import datetime
 from itertools import product
 
-import matplotlib.pyplot as plt
 import numpy as np
-from iqm.qiskit_iqm import IQMProvider
-from iqm.qiskit_iqm.fake_backends import IQMFakeAdonis
-from qiskit_aer import AerSimulator
+from backends import get_backend
+from calibrated_layout import get_layout_scorer
+from job_submitter import run_concurrently
+from transpile_cache import cached_transpile
 
-from qiskit import QuantumCircuit, QuantumRegister, transpile
+from qiskit import QuantumCircuit, QuantumRegister
 
 SIMULATE = False
 SHOTS = 1000
 
 state2index = {'00': (0, 0), '10': (1, 0), '11': (1, 1), '01': (0, 1)}
 
-
-center_qubit = [2]
-leaf_qubits = [0, 1, 3, 4]
-qubit_combinations = list(product(center_qubit, leaf_qubits)) + \
-    list(product(leaf_qubits, center_qubit))
-
-fig, axs = plt.subplots(4, 2, figsize=(10, 10))
-
-
 n_qubits = 2
 qreg = QuantumRegister(n_qubits, "qB")
 circuit = QuantumCircuit(qreg)
@@ -43,45 +33,53 @@ circuit.cx(qreg[0], qreg[1])
 circuit.measure_all()
 print(circuit)
 
-backend = IQMFakeAdonis()
+backend = get_backend("aer" if SIMULATE else "helmi")
 
-if SIMULATE:
-    backend = AerSimulator()
-else:
-    HELMI_CORTEX_URL = os.getenv('HELMI_CORTEX_URL')
-    if not HELMI_CORTEX_URL:
-        print("""Environment variable HELMI_CORTEX_URL is not set.
-              Are you running on Lumi and on the q_fiqci node?.
-              Falling back to fake backend.""")
-        # raise ValueError("Environment variable HELMI_CORTEX_URL is not set")
-
-    else:
-        provider = IQMProvider(HELMI_CORTEX_URL)
-        backend = provider.get_backend()
+# The star with the lowest calibrated errors, QB3 and its neighbours on Helmi
+center_qubit = [2]
+leaf_qubits = [0, 1, 3, 4]
+scorer = get_layout_scorer(backend)
+if scorer is not None:
+    center, leaves = scorer.best_star(4)
+    center_qubit, leaf_qubits = [center], leaves
+qubit_combinations = list(product(center_qubit, leaf_qubits)) + \
+    list(product(leaf_qubits, center_qubit))
 
 print(qubit_combinations)
-for idx, (qubit_a, qubit_b) in enumerate(qubit_combinations):
-
-    start_time = time.time()
+tr_circuits = []
+for qubit_a, qubit_b in qubit_combinations:
     qubit_mapping = {  # The qubit mapping can be added optionally
         qreg[0]: qubit_a,
         qreg[1]: qubit_b,
     }
-    tr_circuit = transpile(
+    tr_circuits.append(cached_transpile(
         circuit, backend, optimization_level=0, initial_layout=qubit_mapping,
-    )
-    job = backend.run(tr_circuit, shots=SHOTS)
-    counts = job.result().get_counts()
-    end_time = time.time() - start_time
+    ))
+
+# All 8 jobs are submitted at once and the results are printed as they complete. The jobs wait in the
+# queue together, so the time of each job is its time to completion since all of them were submitted.
+matrices = {}
+start_time = time.time()
+for idx, _, result in run_concurrently(backend, tr_circuits, shots=SHOTS):
+    qubit_a, qubit_b = qubit_combinations[idx]
+    counts = result.get_counts()
+    time_to_completion = time.time() - start_time
 
     ordered_counts = collections.OrderedDict(sorted(counts.items()))
-    print(f"QB{qubit_a+1}-QB{qubit_b+1} ({end_time:.4f} seconds)")
+    print(f"QB{qubit_a+1}-QB{qubit_b+1} (time to completion {time_to_completion:.4f} seconds)")
     print(ordered_counts)
 
     matrix = np.zeros((2, 2))
     for key in ordered_counts.keys():
         matrix[state2index[key]] = ordered_counts[key]
+    matrices[idx] = matrix
 
+# matplotlib is only imported for the plot, it takes a large part of the startup time
+import matplotlib.pyplot as plt  # noqa: E402
+
+fig, axs = plt.subplots(4, 2, figsize=(10, 10))
+for idx, matrix in matrices.items():
+    qubit_a, qubit_b = qubit_combinations[idx]
     im = axs[idx % 4, idx//4].imshow(matrix)
     axs[idx % 4, idx//4].set_title(f"QB{qubit_a}-QB{qubit_b}")
     for (j, i), label in np.ndenumerate(matrix):
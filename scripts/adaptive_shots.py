@@ -0,0 +1,133 @@
+"""
+Shot-adaptive execution.
+
+Instead of always running a fixed number of shots, `run_adaptive` runs a circuit in rounds of growing
+size, merges the counts and stops as soon as a stopping rule is satisfied or `max_shots` is reached.
+The stopping rules bound the quantity of interest with a confidence interval:
+
+- `ModeMargin`: the most frequent outcome leads the second most frequent one, as wanted for
+  Bernstein-Vazirani where the secret dominates after a few hundred shots.
+- `FidelityInterval`: the classical fidelity to a target distribution is known to within `half_width`,
+  estimated with a vectorized multinomial bootstrap, as wanted for GHZ states.
+
+`run_adaptive` only needs a function which runs a number of shots and returns a counts dictionary,
+so it works with Qiskit and Cirq alike.
+
+Usage:
+
+    from adaptive_shots import FidelityInterval, ModeMargin, run_adaptive
+
+    def sample(shots):
+        return backend.run(circuit, shots=shots).result().get_counts()
+
+    result = run_adaptive(sample, ModeMargin(confidence=0.99), max_shots=10000)
+    print(result.counts, result.shots, result.bound)
+"""
+from collections import Counter
+from dataclasses import dataclass
+from statistics import NormalDist
+
+import numpy as np
+from metrics import align
+
+
+@dataclass
+class Bound:
+    """
+    An estimate with its confidence interval and whether the stopping rule is satisfied.
+    """
+    estimate: float
+    lower: float
+    upper: float
+    done: bool
+
+
+@dataclass
+class AdaptiveResult:
+    counts: dict
+    shots: int
+    rounds: int
+    bound: Bound
+
+
+class ModeMargin:
+    """
+    Stops when the probability of the most frequent outcome exceeds that of the runner-up by more than
+    `margin` with the given confidence.
+
+    The estimate is p1 - p2 with the multinomial variance (p1 + p2 - (p1 - p2)^2) / n.
+    """
+
+    def __init__(self, confidence: float = 0.99, margin: float = 0.0, min_shots: int = 100):
+        self.z = NormalDist().inv_cdf(confidence)
+        self.margin = margin
+        self.min_shots = min_shots
+
+    def __call__(self, counts: dict) -> Bound:
+        values = np.sort(np.fromiter(counts.values(), dtype=float, count=len(counts)))[::-1]
+        shots = values.sum()
+        p1 = values[0] / shots
+        p2 = values[1] / shots if len(values) > 1 else 0.0
+        difference = p1 - p2
+        error = self.z * np.sqrt(max(p1 + p2 - difference**2, 0.0) / shots)
+        # With no observed runner-up the variance is zero, the rule of three bounds p2 instead
+        error = max(error, 3 / shots)
+        lower = difference - error
+        return Bound(difference, lower, difference + error, shots >= self.min_shots and lower > self.margin)
+
+
+class FidelityInterval:
+    """
+    Stops when the bootstrap confidence interval of the classical fidelity to `target` is at most
+    2 * `half_width` wide.
+    """
+
+    def __init__(
+        self, target, half_width: float = 0.01, confidence: float = 0.95, resamples: int = 500,
+        min_shots: int = 100, seed: int = None,
+    ):
+        self.target = target
+        self.half_width = half_width
+        self.alpha = 1 - confidence
+        self.resamples = resamples
+        self.min_shots = min_shots
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, counts: dict) -> Bound:
+        _, measured, target = align(counts, self.target)
+        shots = int(sum(counts.values()))
+        estimate = float(np.sum(np.sqrt(measured * target)) ** 2)
+        # Resample all bootstrap replicates at once, one row per replicate
+        replicates = self.rng.multinomial(shots, measured, size=self.resamples) / shots
+        fidelities = np.sum(np.sqrt(replicates * target), axis=1) ** 2
+        lower, upper = np.quantile(fidelities, [self.alpha / 2, 1 - self.alpha / 2])
+        done = shots >= self.min_shots and (upper - lower) / 2 <= self.half_width
+        return Bound(estimate, float(lower), float(upper), bool(done))
+
+
+def run_adaptive(
+    sample, rule, max_shots: int, initial_shots: int = 100, growth: float = 2.0, verbose: bool = False,
+) -> AdaptiveResult:
+    """
+    Calls `sample(shots)` in rounds until `rule(counts)` is done or `max_shots` shots have been run.
+
+    The first round runs `initial_shots` shots and every following round `growth` times more than the
+    previous one, so the number of rounds grows only logarithmically with the shots needed.
+    """
+    counts = Counter()
+    shots = rounds = 0
+    next_shots = initial_shots
+    bound = None
+    while shots < max_shots:
+        round_shots = int(min(next_shots, max_shots - shots))
+        counts.update(sample(round_shots))
+        shots += round_shots
+        rounds += 1
+        bound = rule(counts)
+        if verbose:
+            interval = f"[{bound.lower:.4f}, {bound.upper:.4f}]"
+            print(f"Round {rounds}: {shots} shots, estimate {bound.estimate:.4f} {interval}")
+        if bound.done:
+            break
+        next_shots = round_shots * growth
+    return AdaptiveResult(dict(counts), shots, rounds, bound)
@@ -11,11 +11,12 @@
 #SBATCH --mem-per-cpu=1G      # Memory per CPU
 
 module use /appl/local/quantum/modulefiles
-module load helmi_qiskit  # Load the module to use qiskit on Helmi
-
-# module load helmi_cirq    # Load the module to use cirq on Helmi
+# Load the module to use qiskit on Helmi, or the one in FIQCI_MODULE, for example helmi_cirq for cirq
+module load ${FIQCI_MODULE:-helmi_qiskit}
 
 # Save the job ID to a file for later reference
 echo $SLURM_JOB_ID >> job_id.txt
 
-python -u $1
+# The script and its arguments are passed as separate arguments, for example
+# > sbatch batch_script.sh qb_flip.py --backend helmi
+python -u "$@"
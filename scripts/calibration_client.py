@@ -0,0 +1,216 @@
+"""
+Client for the calibration metrics endpoints with a local cache.
+
+Calibration sets never change once their UUID exists. `CalibrationClient` keeps one pooled
+`requests.Session` for all requests and stores every calibration set it downloads on disk:
+
+- Payloads are stored content-addressed under `blobs/<sha256>.json`, and `ids/<calibration_set_id>`
+  points to the blob of a calibration set. Historical calibration sets are served from disk without
+  contacting the server.
+- `latest` is revalidated with `If-None-Match` / `If-Modified-Since` using the `ETag` and `Last-Modified`
+  headers of the previous response. A `304 Not Modified` answer is served from disk.
+
+The store lives in `~/.cache/fiqci-examples/calibration/<quantum computer>` by default. Set the
+`FIQCI_CALIBRATION_CACHE` environment variable to use another directory.
+
+Usage:
+
+    from calibration_client import CalibrationClient
+
+    calibration = CalibrationClient.from_iqm_client(backend.client)
+    latest = calibration.get()
+    old = calibration.get("<calibration set id>")
+"""
+import hashlib
+import json
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "fiqci-examples", "calibration",
+)
+
+
+def find_calibration_set_id(data: dict):
+    """
+    Returns the calibration set id of a metrics payload, or None if it does not contain one.
+    """
+    for key in ("calibration_set_id", "calibrationSetId", "calibration_set"):
+        if isinstance(data, dict) and data.get(key):
+            return str(data[key])
+    return None
+
+
+class CalibrationClient:
+    """
+    Fetches calibration metrics from `{root_url}/api/devices/{quantum_computer}/calibration/metrics/`.
+
+    `headers` is a dictionary of extra request headers or a callable returning one, which is called
+    for every request so that expiring bearer tokens are refreshed.
+    `latest_max_age` is the number of seconds a cached `latest` answer is used without revalidation.
+    """
+
+    def __init__(
+        self, root_url: str, quantum_computer: str, headers=None, cache_dir: str = None,
+        latest_max_age: float = 0, timeout: float = 30, pool_maxsize: int = 4,
+    ):
+        self.root_url = root_url.rstrip("/")
+        self.quantum_computer = quantum_computer
+        self.headers = headers
+        self.latest_max_age = latest_max_age
+        self.timeout = timeout
+        base_dir = cache_dir or os.getenv("FIQCI_CALIBRATION_CACHE", DEFAULT_CACHE_DIR)
+        self.cache_dir = os.path.join(base_dir, quantum_computer)
+        for sub_dir in ("blobs", "ids"):
+            os.makedirs(os.path.join(self.cache_dir, sub_dir), exist_ok=True)
+
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def from_iqm_client(cls, client, **kwargs) -> "CalibrationClient":
+        """
+        Creates a client using the server URL, quantum computer and authentication of an `IQMClient`.
+        """
+        server_client = client._iqm_server_client
+
+        def headers():
+            return {
+                "User-Agent": server_client._signature,
+                "Authorization": server_client._auth_header_callback(),
+            }
+
+        return cls(server_client.root_url, server_client.quantum_computer, headers=headers, **kwargs)
+
+    def metrics_url(self, calibration_set_id=None) -> str:
+        return (
+            f"{self.root_url}/api/devices/{self.quantum_computer}/calibration/metrics/"
+            f"{calibration_set_id or 'latest'}"
+        )
+
+    def _headers(self) -> dict:
+        headers = self.headers() if callable(self.headers) else self.headers
+        return dict(headers or {})
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "blobs", f"{digest}.json")
+
+    def _id_path(self, calibration_set_id: str) -> str:
+        return os.path.join(self.cache_dir, "ids", str(calibration_set_id))
+
+    def _latest_path(self) -> str:
+        return os.path.join(self.cache_dir, "latest.json")
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _store(self, content: bytes, calibration_set_id=None) -> str:
+        """
+        Stores a payload by its content hash and links the calibration set id to it.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        if not os.path.exists(self._blob_path(digest)):
+            self._write(self._blob_path(digest), content)
+        if calibration_set_id:
+            self._write(self._id_path(calibration_set_id), digest.encode())
+        return digest
+
+    def _load_blob(self, digest: str) -> dict:
+        with open(self._blob_path(digest), "rb") as f:
+            return json.loads(f.read())
+
+    def cached(self, calibration_set_id: str):
+        """
+        Returns a stored calibration set or None if it has not been downloaded yet.
+        """
+        try:
+            with open(self._id_path(calibration_set_id)) as f:
+                return self._load_blob(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def cached_ids(self) -> list[str]:
+        """
+        Returns the ids of all calibration sets in the local store.
+        """
+        return sorted(os.listdir(os.path.join(self.cache_dir, "ids")))
+
+    def _fetch(self, url: str, extra_headers: dict = None) -> requests.Response:
+        headers = self._headers()
+        headers.update(extra_headers or {})
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code != 304:
+            response.raise_for_status()  # will raise an HTTPError if the response was not ok
+        return response
+
+    def get(self, calibration_set_id=None) -> dict:
+        """
+        Returns the calibration metrics of the given calibration set, or of the latest one if no id is given.
+        """
+        if calibration_set_id:
+            data = self.cached(calibration_set_id)
+            if data is not None:
+                return data
+            response = self._fetch(self.metrics_url(calibration_set_id))
+            self._store(response.content, calibration_set_id)
+            return response.json()
+        return self.latest()
+
+    def latest(self) -> dict:
+        """
+        Returns the latest calibration metrics, revalidating the cached copy with the server.
+        """
+        try:
+            with open(self._latest_path()) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+
+        if state and time.time() - state.get("checked", 0) < self.latest_max_age:
+            try:
+                return self._load_blob(state["digest"])
+            except OSError:
+                state = {}
+
+        conditional = {}
+        if state.get("etag"):
+            conditional["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            conditional["If-Modified-Since"] = state["last_modified"]
+
+        response = self._fetch(self.metrics_url(), conditional)
+        if response.status_code == 304:
+            try:
+                data = self._load_blob(state["digest"])
+            except (KeyError, OSError):
+                # The cached copy is gone, ask again without validators
+                response = self._fetch(self.metrics_url())
+                if response.status_code == 304:
+                    raise RuntimeError(
+                        f"{self.metrics_url()} answered 304 Not Modified to a request without validators "
+                        f"and there is no cached copy in {self.cache_dir}"
+                    )
+        if response.status_code != 304:
+            data = response.json()
+            state = {
+                "digest": self._store(response.content, find_calibration_set_id(data)),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+        state["checked"] = time.time()
+        self._write(self._latest_path(), json.dumps(state).encode())
+        return data
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,101 @@
+"""
+Checks `CalibrationClient` against a local stand-in of the calibration metrics endpoint.
+
+The stand-in is an `http.server` on localhost that serves one calibration set with an `ETag`, answers
+`If-None-Match` with `304 Not Modified` and counts the requests it gets. The store is a temporary
+directory, so the check does not need a token or network access and leaves nothing behind.
+
+Usage:
+
+    python calibration_client_check.py
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from calibration_client import CalibrationClient
+
+QUANTUM_COMPUTER = "standin"
+CALIBRATION_SET_ID = "26c5e70f-bea0-43af-bd37-6212ec7d04cb"
+PAYLOAD = json.dumps({
+    "calibration_set_id": CALIBRATION_SET_ID,
+    "metrics": {"QB1.fidelity_1qb_gates_averaged": 0.999},
+}).encode()
+ETAG = '"standin-1"'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves PAYLOAD as the latest and as its own calibration set. With `server.always_not_modified` set it
+    answers 304 to every request, as a misbehaving proxy would.
+    """
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        prefix = f"/api/devices/{QUANTUM_COMPUTER}/calibration/metrics/"
+        if not self.path.startswith(prefix) or self.path[len(prefix):] not in ("latest", CALIBRATION_SET_ID):
+            self.send_error(404)
+            return
+        if self.server.always_not_modified or self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise AssertionError(message)
+    print(f"ok: {message}")
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.requests = []
+    server.always_not_modified = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cache_dir = tempfile.mkdtemp(prefix="calibration-check-")
+    root_url = f"http://127.0.0.1:{server.server_address[1]}"
+    expected = json.loads(PAYLOAD)
+    try:
+        client = CalibrationClient(root_url, QUANTUM_COMPUTER, cache_dir=cache_dir)
+
+        check(client.get() == expected, "latest is downloaded on first use")
+        check(client.get() == expected and len(server.requests) == 2, "a 304 answer is served from disk")
+        check(client.get(CALIBRATION_SET_ID) == expected and len(server.requests) == 2,
+              "a downloaded calibration set is served without a request")
+
+        shutil.rmtree(os.path.join(client.cache_dir, "blobs"))
+        os.makedirs(os.path.join(client.cache_dir, "blobs"))
+        check(client.get() == expected and len(server.requests) == 4,
+              "a 304 answer without a cached copy is fetched again without validators")
+
+        shutil.rmtree(os.path.join(client.cache_dir, "blobs"))
+        os.makedirs(os.path.join(client.cache_dir, "blobs"))
+        server.always_not_modified = True
+        try:
+            client.get()
+        except RuntimeError as e:
+            check("304" in str(e), "a second 304 without a cached copy raises a RuntimeError")
+        else:
+            raise AssertionError("a second 304 without a cached copy did not raise")
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Columnar history of calibration metrics for trend queries.
+
+Every calibration set returned by `get_calibration_data` (or `CalibrationClient`) is flattened into one
+row per metric with the columns
+
+    device, date, timestamp, calibration_set_id, metric, component, quantity, value
+
+where `metric` is the full path of the value in the payload, `component` the qubit or qubit pair it
+belongs to (for example `QB3` or `QB1__QB3`) and `quantity` the rest of the path (for example `t1_time`).
+The rows are written as Parquet files partitioned by device and date:
+
+    <root>/data/device=q50/date=2025-01-31/<calibration_set_id>.parquet
+
+`index.json` maps each calibration_set_id to its file, so a single set is read without scanning the
+store. Queries use `pyarrow.dataset`, which prunes partitions by device and date and reads only the
+requested columns. Requires `pyarrow`.
+
+Usage:
+
+    from calibration_history import CalibrationHistory
+
+    history = CalibrationHistory("calibration_history")
+    history.ingest(get_calibration_data(backend.client), device="q50")
+    t1 = history.metric_history("q50", "t1", component="QB3", days=90)
+    worst_cz = history.daily_aggregate("q50", "cz_gate_fidelity", "min")
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from calibration_metrics import TIMESTAMP_KEYS, flatten_metrics
+
+SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("calibration_set_id", pa.string()),
+    ("metric", pa.string()),
+    ("component", pa.string()),
+    ("quantity", pa.string()),
+    ("value", pa.float64()),
+])
+PARTITION_SCHEMA = pa.schema([("device", pa.string()), ("date", pa.string())])
+DATASET_SCHEMA = pa.unify_schemas([SCHEMA, PARTITION_SCHEMA])
+
+
+def _parse_timestamp(value) -> datetime:
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class CalibrationHistory:
+    """
+    Parquet store of flattened calibration sets under `root`.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.data_dir = os.path.join(root, "data")
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._index_path = os.path.join(root, "index.json")
+        try:
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def __contains__(self, calibration_set_id) -> bool:
+        return str(calibration_set_id) in self._index
+
+    def _save_index(self):
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def ingest(self, data: dict, device: str, calibration_set_id: str = None, timestamp=None) -> bool:
+        """
+        Adds one calibration set to the store. Returns False if it was already stored.
+
+        The calibration set id and timestamp are read from the payload unless they are given.
+        """
+        calibration_set_id = str(calibration_set_id or data.get("calibration_set_id") or "")
+        if not calibration_set_id:
+            raise ValueError("The payload has no calibration_set_id, pass it explicitly")
+        if calibration_set_id in self._index:
+            return False
+
+        if timestamp is None:
+            timestamp = next((data[k] for k in TIMESTAMP_KEYS if data.get(k)), None)
+        when = _parse_timestamp(timestamp) if timestamp is not None else datetime.now(timezone.utc)
+
+        rows = flatten_metrics(data)
+        metric, component, quantity, value = zip(*rows) if rows else ((), (), (), ())
+        table = pa.table({
+            "timestamp": pa.array([when] * len(rows), type=SCHEMA.field("timestamp").type),
+            "calibration_set_id": pa.array([calibration_set_id] * len(rows), type=pa.string()),
+            "metric": pa.array(metric, type=pa.string()),
+            "component": pa.array(component, type=pa.string()),
+            "quantity": pa.array(quantity, type=pa.string()),
+            "value": pa.array(value, type=pa.float64()),
+        }, schema=SCHEMA)
+
+        directory = os.path.join(self.data_dir, f"device={device}", f"date={when.date().isoformat()}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{calibration_set_id}.parquet")
+        pq.write_table(table, path)
+
+        self._index[calibration_set_id] = {
+            "device": device,
+            "date": when.date().isoformat(),
+            "timestamp": when.isoformat(),
+            "path": os.path.relpath(path, self.root),
+        }
+        self._save_index()
+        return True
+
+    def ingest_cached(self, calibration_client) -> int:
+        """
+        Adds every calibration set in the local store of a `CalibrationClient`. Returns the number added.
+        """
+        added = 0
+        for calibration_set_id in calibration_client.cached_ids():
+            if calibration_set_id not in self._index:
+                data = calibration_client.cached(calibration_set_id)
+                added += self.ingest(data, calibration_client.quantum_computer, calibration_set_id)
+        return added
+
+    def calibration_sets(self, device: str = None) -> list[dict]:
+        """
+        Returns the index entries, optionally of one device, ordered by time.
+        """
+        entries = [
+            dict(calibration_set_id=k, **v) for k, v in self._index.items() if device in (None, v["device"])
+        ]
+        return sorted(entries, key=lambda e: e["timestamp"])
+
+    def get(self, calibration_set_id: str, columns: list[str] = None) -> pa.Table:
+        """
+        Returns the rows of one calibration set, reading only its own file.
+        """
+        entry = self._index[str(calibration_set_id)]
+        return pq.read_table(os.path.join(self.root, entry["path"]), columns=columns)
+
+    def dataset(self) -> ds.Dataset:
+        return ds.dataset(
+            self.data_dir, format="parquet", schema=DATASET_SCHEMA,
+            partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+        )
+
+    def query(
+        self, columns: list[str] = None, device: str = None, quantity: str = None, component: str = None,
+        start=None, end=None, contains: bool = True,
+    ) -> pa.Table:
+        """
+        Returns the requested columns of the rows matching all given filters.
+
+        `quantity` matches as a case insensitive substring unless `contains` is False.
+        `start` and `end` are dates or datetimes, they also prune the date partitions.
+        """
+        conditions = []
+        if device is not None:
+            conditions.append(ds.field("device") == device)
+        if component is not None:
+            conditions.append(ds.field("component") == component)
+        if quantity is not None and not contains:
+            conditions.append(ds.field("quantity") == quantity)
+        if start is not None:
+            start = start if isinstance(start, datetime) else datetime.combine(start, datetime.min.time())
+            start = start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+            conditions.append(ds.field("date") >= start.date().isoformat())
+            conditions.append(ds.field("timestamp") >= pa.scalar(start, SCHEMA.field("timestamp").type))
+        if end is not None:
+            end = end if isinstance(end, datetime) else datetime.combine(end, datetime.max.time())
+            end = end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+            conditions.append(ds.field("date") <= end.date().isoformat())
+            conditions.append(ds.field("timestamp") <= pa.scalar(end, SCHEMA.field("timestamp").type))
+
+        needed = list(columns) if columns else None
+        if needed is not None and quantity is not None and contains and "quantity" not in needed:
+            needed.append("quantity")
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        if not self._index:
+            # An empty table with the partition columns as well, so that grouping by date works
+            empty = DATASET_SCHEMA.empty_table()
+            return empty.select(columns) if columns else empty
+        table = self.dataset().to_table(columns=needed, filter=expression)
+
+        if quantity is not None and contains:
+            mask = pc.match_substring(pc.utf8_lower(table["quantity"]), quantity.lower())
+            table = table.filter(mask)
+            if columns is not None and "quantity" not in columns:
+                table = table.drop_columns(["quantity"])
+        return table
+
+    def metric_history(self, device: str, quantity: str, component: str = None, days: int = None) -> pa.Table:
+        """
+        Returns timestamp, component and value of a quantity ordered by time, for example the T1 of
+        QB3 over the last 90 days with `metric_history("q50", "t1", "QB3", days=90)`.
+        """
+        start = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+        table = self.query(
+            ["timestamp", "calibration_set_id", "component", "quantity", "value"],
+            device=device, quantity=quantity, component=component, start=start,
+        )
+        return table.sort_by("timestamp")
+
+    def daily_aggregate(self, device: str, quantity: str, aggregation: str = "min", days: int = None) -> pa.Table:
+        """
+        Returns one row per day with the `aggregation` ('min', 'max', 'mean', ...) of a quantity over
+        all components, for example the worst CZ fidelity per day.
+        """
+        start = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+        table = self.query(["date", "value"], device=device, quantity=quantity, start=start)
+        result = table.group_by("date").aggregate([("value", aggregation)])
+        return result.sort_by("date")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add the calibration sets downloaded with get_calibration_data to the history store",
+    )
+    parser.add_argument("--store", required=True, help="Directory of the history store")
+    parser.add_argument("--device", required=True, help="Quantum computer, for example q50")
+    parser.add_argument("--cache", default=None, help="Calibration cache directory, see calibration_client.py")
+    args = parser.parse_args()
+
+    # Only the local store of the client is read, no requests are made
+    from calibration_client import CalibrationClient
+    client = CalibrationClient("http://localhost", args.device, cache_dir=args.cache)
+    added = CalibrationHistory(args.store).ingest_cached(client)
+    print(f"Added {added} calibration sets to {args.store}")
+
+
+if __name__ == "__main__":
+    main()
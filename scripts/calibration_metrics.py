@@ -0,0 +1,98 @@
+"""
+Helpers for reading the calibration metrics payload of `get_calibration_data`.
+
+`flatten_metrics` turns the nested payload into (metric, component, quantity, value) rows, and
+`errors_from_metrics` picks the readout, single-qubit gate and two-qubit gate errors out of those rows.
+The payload layout differs between server versions, so the quantities are recognized by their names:
+a value whose name contains `fidelity` is converted to the error `1 - fidelity`.
+"""
+import re
+
+_COMPONENT = re.compile(r"^(QB\d+|COMP(?:_R)?\d*|TC-\d+-\d+)$", re.IGNORECASE)
+TIMESTAMP_KEYS = ("timestamp", "created_timestamp", "end_timestamp", "created_at")
+
+
+def _split_metric(path: list[str]) -> tuple[str, str]:
+    """
+    Splits the tokens of a metric path into the component (qubits) and the measured quantity.
+    """
+    tokens = [t for part in path for t in re.split(r"[.]", part) if t]
+    components = [t for t in tokens if _COMPONENT.match(t)]
+    # Pair names such as QB1__QB3 or QB1-QB3 are kept as one component
+    for token in tokens:
+        qubits = re.findall(r"QB\d+", token, re.IGNORECASE)
+        if len(qubits) > 1 and not components:
+            components = ["__".join(qubits)]
+            tokens = [t for t in tokens if t != token]
+    quantity = ".".join(t for t in tokens if t not in components)
+    return "__".join(components), quantity
+
+
+def flatten_metrics(data) -> list[tuple[str, str, str, float]]:
+    """
+    Returns (metric, component, quantity, value) for every numeric value in a metrics payload.
+
+    Dictionaries with a `value` key (and for example a `unit` or `uncertainty`) count as one metric.
+    """
+    rows = []
+
+    def walk(node, path):
+        if isinstance(node, dict):
+            if "value" in node and not isinstance(node["value"], (dict, list)):
+                walk(node["value"], path)
+                return
+            for key, child in node.items():
+                if key in TIMESTAMP_KEYS or key == "calibration_set_id":
+                    continue
+                walk(child, path + [str(key)])
+        elif isinstance(node, list):
+            for i, child in enumerate(node):
+                # Lists of records are keyed by their name if they have one
+                name = child.get("name") or child.get("component") if isinstance(child, dict) else None
+                walk(child, path + [str(name if name else i)])
+        elif isinstance(node, (int, float)) and not isinstance(node, bool):
+            component, quantity = _split_metric(path)
+            rows.append((".".join(path), component, quantity, float(node)))
+
+    walk(data, [])
+    return rows
+
+
+def _error(quantity: str, value: float):
+    """
+    Returns the error of a value named `quantity`, or None if it is neither a fidelity nor an error.
+    """
+    if "uncertainty" in quantity or "std" in quantity:
+        return None
+    if "fidelity" in quantity:
+        return 1 - value
+    if "error" in quantity:
+        return value
+    return None
+
+
+def errors_from_metrics(data) -> dict:
+    """
+    Returns the readout, single-qubit gate and two-qubit gate errors of a metrics payload as
+
+        {"readout": {"QB1": e, ...}, "single_qubit": {"QB1": e, ...}, "two_qubit": {("QB1", "QB3"): e, ...}}
+
+    If a component has several matching values, for example the errors of |0> and |1>, they are averaged.
+    """
+    collected = {"readout": {}, "single_qubit": {}, "two_qubit": {}}
+    for _, component, quantity, value in flatten_metrics(data):
+        quantity = quantity.lower()
+        error = _error(quantity, value)
+        if error is None or not component:
+            continue
+        qubits = component.split("__")
+        if len(qubits) == 2 and ("cz" in quantity or "two_qubit" in quantity or "2q" in quantity):
+            collected["two_qubit"].setdefault(tuple(qubits), []).append(error)
+        elif len(qubits) == 1 and ("readout" in quantity or "measure" in quantity):
+            collected["readout"].setdefault(qubits[0], []).append(error)
+        elif len(qubits) == 1 and any(k in quantity for k in ("prx", "single_qubit", "1q", "rb", "gate")):
+            collected["single_qubit"].setdefault(qubits[0], []).append(error)
+    return {
+        kind: {component: sum(errors) / len(errors) for component, errors in values.items()}
+        for kind, values in collected.items()
+    }
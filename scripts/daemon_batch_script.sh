@@ -0,0 +1,33 @@
+#!/bin/bash -l
+
+# Sends the circuits of one or more scripts to the submission daemon, one job per script.
+# Launch this script from the qiskit directory as
+# > sbatch ../scripts/daemon_batch_script.sh my_circuits.py more_circuits.py --shots 1000
+# Each script defines its circuits in a module level list called `circuits`.
+# If no daemon is running on the node, one is started for the duration of this job.
+
+#SBATCH --job-name=helmijob   # Job name
+#SBATCH --output=helmijob.o%j # Name of stdout output file
+#SBATCH --error=helmijob.e%j  # Name of stderr error file
+#SBATCH --partition=q_fiqci   # Partition (queue) name
+#SBATCH --ntasks=1            # One task (process)
+#SBATCH --cpus-per-task=1     # Number of cores (threads)
+#SBATCH --time=00:15:00       # Run time (hh:mm:ss)
+#SBATCH --account=project_xxx # Project for billing
+#SBATCH --mem-per-cpu=1G      # Memory per CPU
+
+module use /appl/local/quantum/modulefiles
+module load helmi_qiskit  # Load the module to use qiskit on Helmi
+
+# Save the job ID to a file for later reference
+echo $SLURM_JOB_ID >> job_id.txt
+
+if ! python daemon_client.py --ping > /dev/null 2>&1; then
+    python -u submission_daemon.py --preload helmi --idle-timeout 60 >> daemon.log 2>&1 &
+    for i in $(seq 60); do
+        python daemon_client.py --ping > /dev/null 2>&1 && break
+        sleep 1
+    done
+fi
+
+python -u daemon_client.py "$@"
@@ -0,0 +1,22 @@
+#!/bin/bash -l
+
+# Runs the submission daemon of the Qiskit examples on the q_fiqci node.
+# Launch this script from the qiskit directory as
+# > sbatch ../scripts/daemon_job.sh
+# and send circuits to it with daemon_batch_script.sh or daemon_client.py.
+
+#SBATCH --job-name=helmidaemon   # Job name
+#SBATCH --output=helmidaemon.o%j # Name of stdout output file
+#SBATCH --error=helmidaemon.e%j  # Name of stderr error file
+#SBATCH --partition=q_fiqci      # Partition (queue) name
+#SBATCH --ntasks=1               # One task (process)
+#SBATCH --cpus-per-task=1        # Number of cores (threads)
+#SBATCH --time=04:00:00          # Run time (hh:mm:ss)
+#SBATCH --account=project_xxx    # Project for billing
+#SBATCH --mem-per-cpu=2G         # Memory per CPU
+
+module use /appl/local/quantum/modulefiles
+module load helmi_qiskit  # Load the module to use qiskit on Helmi
+
+# The daemon stops after an hour without jobs and gives back the allocation
+python -u submission_daemon.py --preload helmi --idle-timeout ${FIQCI_DAEMON_IDLE_TIMEOUT:-3600}
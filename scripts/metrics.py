@@ -0,0 +1,158 @@
+"""
+Distance measures between measured and ideal output distributions.
+
+Counts from Qiskit (`job.result().get_counts()`) and Cirq (`result.histogram(key=..., fold_func=...)` or
+`result.histogram(key=...)`) are converted into sparse probability vectors: a sorted array of outcome
+indices (the bitstring read as a binary integer) and an array of probabilities. All measures are then
+computed in one vectorized pass over the union of the observed outcomes, so a 20+ qubit GHZ state
+never needs a 2^n sized loop or array, and missing or unordered keys are handled correctly.
+
+Keys are interpreted with `int(key, 2)` after removing spaces, so the target distribution must use the
+same bit order as the counts. For GHZ and other symmetric targets the bit order does not matter.
+Up to 63 measured bits are supported.
+
+Usage:
+
+    from metrics import classical_fidelity, ghz_distribution, total_variation_distance
+
+    target = ghz_distribution(5)
+    print(classical_fidelity(counts, target), total_variation_distance(counts, target))
+"""
+from collections.abc import Mapping
+
+import numpy as np
+
+
+def _key_to_int(key) -> int:
+    if isinstance(key, str):
+        return int(key.replace(" ", ""), 2)
+    return int(key)
+
+
+def as_distribution(data) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns a sparse probability vector (indices, probabilities) sorted by index.
+
+    `data` can be a dictionary of counts or probabilities keyed by bitstring or integer, a tuple of
+    (indices, weights) arrays or a dense 1D array of weights indexed by outcome.
+    The weights are normalized to sum to one.
+    """
+    if isinstance(data, Mapping):
+        indices = np.fromiter((_key_to_int(k) for k in data.keys()), dtype=np.int64, count=len(data))
+        weights = np.fromiter(data.values(), dtype=float, count=len(data))
+    elif isinstance(data, tuple):
+        indices = np.asarray(data[0], dtype=np.int64)
+        weights = np.asarray(data[1], dtype=float)
+    else:
+        dense = np.asarray(data, dtype=float)
+        indices = np.flatnonzero(dense)
+        weights = dense[indices]
+
+    order = np.argsort(indices, kind="stable")
+    indices, weights = indices[order], weights[order]
+    # Merge duplicated outcomes, e.g. keys which only differ by register spacing
+    unique, start = np.unique(indices, return_index=True)
+    if len(unique) != len(indices):
+        weights = np.add.reduceat(weights, start)
+        indices = unique
+
+    total = weights.sum()
+    if total <= 0:
+        raise ValueError("The distribution has no weight")
+    return indices, weights / total
+
+
+def to_dense(data, num_qubits: int) -> np.ndarray:
+    """
+    Returns the probability vector of length 2**num_qubits indexed by outcome.
+    """
+    indices, probs = as_distribution(data)
+    dense = np.zeros(2**num_qubits)
+    dense[indices] = probs
+    return dense
+
+
+def ghz_distribution(num_qubits: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the ideal measurement distribution of an n qubit GHZ state, (|0...0> + |1...1>) / sqrt(2).
+    """
+    return np.array([0, 2**num_qubits - 1], dtype=np.int64), np.array([0.5, 0.5])
+
+
+def align(p, q) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns the union of the outcomes of p and q together with both probability vectors on that union.
+    """
+    p_idx, p_val = as_distribution(p)
+    q_idx, q_val = as_distribution(q)
+    support = np.union1d(p_idx, q_idx)
+    p_aligned = np.zeros(len(support))
+    q_aligned = np.zeros(len(support))
+    p_aligned[np.searchsorted(support, p_idx)] = p_val
+    q_aligned[np.searchsorted(support, q_idx)] = q_val
+    return support, p_aligned, q_aligned
+
+
+def _bhattacharyya(p_aligned, q_aligned) -> float:
+    return float(np.sum(np.sqrt(p_aligned * q_aligned)))
+
+
+def _kl(p_aligned, q_aligned, epsilon) -> float:
+    if epsilon:
+        p_aligned = (p_aligned + epsilon) / (1 + epsilon * len(p_aligned))
+        q_aligned = (q_aligned + epsilon) / (1 + epsilon * len(q_aligned))
+    mask = p_aligned > 0
+    if np.any(q_aligned[mask] == 0):
+        return float("inf")
+    return float(np.sum(p_aligned[mask] * np.log(p_aligned[mask] / q_aligned[mask])))
+
+
+def classical_fidelity(p, q) -> float:
+    """
+    Returns the classical fidelity (sum_i sqrt(p_i q_i))^2 of two distributions.
+    It is 1 if and only if the distributions are identical.
+    """
+    _, p_aligned, q_aligned = align(p, q)
+    return _bhattacharyya(p_aligned, q_aligned) ** 2
+
+
+def total_variation_distance(p, q) -> float:
+    """
+    Returns the total variation (statistical or Kolmogorov) distance 1/2 sum_i |p_i - q_i|.
+    """
+    _, p_aligned, q_aligned = align(p, q)
+    return float(0.5 * np.sum(np.abs(p_aligned - q_aligned)))
+
+
+def hellinger_distance(p, q) -> float:
+    """
+    Returns the Hellinger distance sqrt(1 - sum_i sqrt(p_i q_i)), which is in [0, 1].
+    """
+    _, p_aligned, q_aligned = align(p, q)
+    return float(np.sqrt(max(0.0, 1 - _bhattacharyya(p_aligned, q_aligned))))
+
+
+def kl_divergence(p, q, epsilon: float = 0.0) -> float:
+    """
+    Returns the Kullback-Leibler divergence D(p || q) in nats.
+
+    The divergence is infinite if q is zero for an outcome seen in p. A small `epsilon` adds that weight
+    to every outcome in the union of both supports before normalizing, which keeps the result finite.
+    """
+    _, p_aligned, q_aligned = align(p, q)
+    return _kl(p_aligned, q_aligned, epsilon)
+
+
+def distribution_metrics(counts, target, epsilon: float = 0.0) -> dict:
+    """
+    Returns the fidelity, total variation distance, Hellinger distance and KL divergence D(target || counts)
+    between the measured counts and the target distribution, aligning the two only once.
+    """
+    _, p_aligned, q_aligned = align(counts, target)
+    bc = _bhattacharyya(p_aligned, q_aligned)
+    return {
+        "fidelity": bc**2,
+        "tvd": float(0.5 * np.sum(np.abs(p_aligned - q_aligned))),
+        "hellinger": float(np.sqrt(max(0.0, 1 - bc))),
+        "kl": _kl(q_aligned, p_aligned, epsilon),
+    }
@@ -0,0 +1,220 @@
+"""
+Compact measurement counts for large qubit numbers.
+
+A `PackedCounts` stores the distinct measured bitstrings as rows of packed uint64 words together with an
+array of counts, instead of a `dict[str, int]` with one Python string per outcome. A 50 qubit job with
+100k shots then needs one 8 byte word per distinct outcome.
+
+Bit `i` of an outcome is the measurement result of qubit (or classical bit) `i`. It is stored in word
+`i // 64` at bit position `i % 64`. For up to 63 bits the words are therefore the outcome indices used
+by `metrics.py`, where Qiskit bitstrings are read with `int(key, 2)`.
+
+Strings are only created when explicitly asked for with `to_dict`.
+
+Usage with Cirq:
+
+    result = sampler.run(circuit, repetitions=shots)
+    counts = PackedCounts.from_measurements(result.measurements['M'])
+
+Usage with Qiskit:
+
+    job = backend.run(circuit, shots=shots, memory=True)
+    counts = PackedCounts.from_memory(job.result().get_memory())
+"""
+from collections.abc import Mapping
+
+import numpy as np
+
+WORD_BITS = 64
+
+
+def _num_words(num_bits: int) -> int:
+    return max(1, -(-num_bits // WORD_BITS))
+
+
+def pack_bits(bits: np.ndarray) -> np.ndarray:
+    """
+    Packs a (shots, num_bits) array of 0/1 values into a (shots, num_words) uint64 array.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    shots, num_bits = bits.shape
+    padded_bits = _num_words(num_bits) * WORD_BITS
+    if padded_bits != num_bits:
+        bits = np.concatenate([bits, np.zeros((shots, padded_bits - num_bits), dtype=np.uint8)], axis=1)
+    packed = np.packbits(bits, axis=1, bitorder="little")
+    return np.ascontiguousarray(packed).view("<u8").astype(np.uint64, copy=False)
+
+
+def unpack_bits(words: np.ndarray, num_bits: int) -> np.ndarray:
+    """
+    Inverse of `pack_bits`, returns a (rows, num_bits) uint8 array.
+    """
+    as_bytes = np.ascontiguousarray(words.astype("<u8", copy=False)).view(np.uint8)
+    return np.unpackbits(as_bytes, axis=1, count=num_bits, bitorder="little")
+
+
+class PackedCounts:
+    """
+    Histogram of measured bitstrings stored as packed uint64 words and counts.
+
+    `words` has shape (outcomes, num_words) and its rows are unique, `counts` has shape (outcomes,).
+    """
+
+    def __init__(self, words: np.ndarray, counts: np.ndarray, num_bits: int):
+        self.words = words
+        self.counts = counts
+        self.num_bits = num_bits
+
+    @classmethod
+    def from_packed(cls, words: np.ndarray, num_bits: int, counts: np.ndarray = None) -> "PackedCounts":
+        """
+        Builds the histogram from packed rows, one per shot (or one per outcome if `counts` is given).
+        """
+        # An empty histogram has no rows to infer the number of words from
+        words = np.asarray(words, dtype=np.uint64).reshape(len(words), max(1, -(-num_bits // 64)))
+        unique, inverse = np.unique(words, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        weights = np.ones(len(words), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        return cls(unique, np.bincount(inverse, weights=weights, minlength=len(unique)).astype(np.int64), num_bits)
+
+    @classmethod
+    def from_measurements(cls, bits: np.ndarray) -> "PackedCounts":
+        """
+        Builds the histogram from a (shots, num_bits) measurement array such as
+        `result.measurements[key]` of a Cirq result. Column `i` becomes bit `i`.
+        """
+        bits = np.asarray(bits)
+        return cls.from_packed(pack_bits(bits), bits.shape[1])
+
+    @classmethod
+    def from_memory(cls, memory: list[str]) -> "PackedCounts":
+        """
+        Builds the histogram from Qiskit memory, the per-shot bitstrings of `result.get_memory()`.
+
+        The strings are decoded as one byte array, the rightmost character of each string is bit 0.
+        Spaces separating classical registers are dropped.
+        """
+        raw = np.asarray(memory, dtype=bytes)
+        width = raw.dtype.itemsize
+        chars = raw.view(np.uint8).reshape(len(raw), width)
+        chars = chars[:, chars[0] != ord(" ")]
+        bits = (chars[:, ::-1] - ord("0")).astype(np.uint8)
+        return cls.from_measurements(bits)
+
+    @classmethod
+    def from_counts(cls, counts: Mapping, style: str = "qiskit") -> "PackedCounts":
+        """
+        Builds the histogram from a counts dictionary.
+
+        With `style='qiskit'` the rightmost character of a key is bit 0, with `style='cirq'` the leftmost
+        one is, as produced by the `fold_func` of the Cirq examples. Integer keys are used as they are.
+        """
+        keys = list(counts.keys())
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+        if keys and isinstance(keys[0], str):
+            keys = [k.replace(" ", "") for k in keys]
+            num_bits = len(keys[0])
+            chars = np.asarray(keys, dtype=bytes).view(np.uint8).reshape(len(keys), num_bits)
+            bits = chars - ord("0")
+            if style == "qiskit":
+                bits = bits[:, ::-1]
+            elif style != "cirq":
+                raise ValueError(f"Unknown style {style}")
+            return cls.from_packed(pack_bits(bits), num_bits, values)
+
+        ints = np.asarray(keys, dtype=np.uint64)
+        num_bits = max(1, int(ints.max()).bit_length()) if len(ints) else 1
+        return cls.from_packed(ints.reshape(-1, 1), num_bits, values)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __repr__(self) -> str:
+        return f"PackedCounts(num_bits={self.num_bits}, outcomes={len(self)}, shots={self.shots})"
+
+    @property
+    def shots(self) -> int:
+        return int(self.counts.sum())
+
+    def bits(self) -> np.ndarray:
+        """
+        Returns the distinct outcomes as a (outcomes, num_bits) uint8 array.
+        """
+        return unpack_bits(self.words, self.num_bits)
+
+    def indices(self) -> np.ndarray:
+        """
+        Returns the outcomes as integers. Only available for up to 63 bits.
+        """
+        if self.num_bits > 63:
+            raise ValueError("Integer indices are only available for up to 63 bits")
+        return self.words[:, 0].astype(np.int64)
+
+    def probabilities(self) -> np.ndarray:
+        return self.counts / self.counts.sum()
+
+    def to_distribution(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the (indices, probabilities) sparse vector accepted by `metrics.py`.
+        """
+        return self.indices(), self.probabilities()
+
+    def get(self, bits, default: int = 0) -> int:
+        """
+        Returns the count of one outcome given as a sequence of bits (bit 0 first) or an integer.
+        """
+        if np.ndim(bits) == 0:
+            bits = (int(bits) >> np.arange(self.num_bits)) & 1
+        row = pack_bits(np.asarray(bits).reshape(1, -1))[0]
+        match = np.flatnonzero(np.all(self.words == row, axis=1))
+        return int(self.counts[match[0]]) if len(match) else default
+
+    def most_frequent(self) -> tuple[np.ndarray, int]:
+        """
+        Returns the bits and the count of the most frequent outcome.
+        """
+        i = int(np.argmax(self.counts))
+        return unpack_bits(self.words[i:i + 1], self.num_bits)[0], int(self.counts[i])
+
+    def marginal(self, bits: list[int]) -> "PackedCounts":
+        """
+        Returns the counts of the given bits only, bit `bits[j]` becomes bit `j` of the result.
+        """
+        selected = self.bits()[:, list(bits)]
+        return PackedCounts.from_packed(pack_bits(selected), len(bits), self.counts)
+
+    def reorder(self, permutation: list[int]) -> "PackedCounts":
+        """
+        Returns the counts with bit `permutation[j]` moved to position `j`.
+        """
+        if sorted(permutation) != list(range(self.num_bits)):
+            raise ValueError("The permutation must contain every bit exactly once")
+        return self.marginal(permutation)
+
+    def merge(self, other: "PackedCounts") -> "PackedCounts":
+        """
+        Returns the sum of two histograms over the same bits. An empty histogram, whose number of bits
+        is not known from its keys, can be merged with any other.
+        """
+        if len(other) == 0:
+            return self
+        if len(self) == 0:
+            return other
+        if other.num_bits != self.num_bits:
+            raise ValueError("Cannot merge counts over a different number of bits")
+        return PackedCounts.from_packed(
+            np.concatenate([self.words, other.words]), self.num_bits,
+            np.concatenate([self.counts, other.counts]),
+        )
+
+    def to_dict(self, style: str = "qiskit") -> dict[str, int]:
+        """
+        Returns the counts as a dictionary keyed by bitstrings, see `from_counts` for `style`.
+        """
+        bits = self.bits()
+        if style == "qiskit":
+            bits = bits[:, ::-1]
+        elif style != "cirq":
+            raise ValueError(f"Unknown style {style}")
+        chars = np.ascontiguousarray(bits + ord("0")).view(f"S{self.num_bits}").ravel()
+        return {key.decode(): int(count) for key, count in zip(chars, self.counts)}
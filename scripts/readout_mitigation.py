@@ -0,0 +1,192 @@
+"""
+Tensored readout-error mitigation on sparse counts.
+
+The readout of qubit i is described by a 2x2 assignment matrix A_i[measured, prepared], built either
+from the readout errors of a calibration set or from the counts of |0...0> and |1...1> preparation
+circuits such as the ones of `qb_flip_simple.py`. The measured distribution is p_raw = (A_n-1 x ... x A_0) p,
+so the tensor product of the inverses A_i^-1 applied to the exact p_raw recovers p.
+
+Up to `DENSE_MAX_QUBITS` qubits `ReadoutMitigator` applies the inverses qubit by qubit to the full 2^n
+vector, which is exact. For more qubits it applies them to the sparse vector of observed outcomes (see
+`metrics.as_distribution`) without ever building the 2^n matrix or vector. Each step pairs every outcome
+with the outcome that differs in one bit, so the cost is O(outcomes x qubits), and the values a step
+gives to unobserved outcomes are dropped. This is an approximation unless every outcome was observed:
+
+- The dropped values are first order in the readout errors and mostly negative, so the values of the
+  observed outcomes usually sum to a little more than one.
+- The observed outcomes miss what the dropped values would have contributed in the later steps, which
+  is second order in the readout errors.
+
+The quasi-probabilities are finally normalized and mapped to the nearest probability distribution
+(Smolin, Gambetta and Smith, PRL 108, 070502).
+
+Mitigators of real devices are cached on disk keyed by calibration_set_id, in
+`~/.cache/fiqci-examples/mitigation` or the directory in the `FIQCI_MITIGATION_CACHE` environment variable.
+
+Usage:
+
+    from readout_mitigation import ReadoutMitigator
+
+    mitigator = ReadoutMitigator.from_errors({0: 0.02, 1: (0.01, 0.03)})
+    indices, probabilities = mitigator.mitigate(counts)
+"""
+import os
+
+import numpy as np
+from metrics import as_distribution
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "fiqci-examples", "mitigation",
+)
+# Largest number of qubits mitigated exactly on the full 2^n vector
+DENSE_MAX_QUBITS = 12
+
+
+def assignment_matrix(p01: float, p10: float) -> np.ndarray:
+    """
+    Returns A[measured, prepared] for the probabilities p01 of reading 1 from |0> and p10 of reading 0 from |1>.
+    """
+    return np.array([[1 - p01, p10], [p01, 1 - p10]])
+
+
+def nearest_probability(values: np.ndarray) -> np.ndarray:
+    """
+    Returns the probability vector closest in the 2-norm to quasi-probabilities summing to one.
+    """
+    order = np.argsort(values)
+    sorted_values = values[order].astype(float)
+    result = np.zeros_like(sorted_values)
+    accumulated = 0.0
+    n = len(sorted_values)
+    for i in range(n):
+        # Spread the negative weight collected so far over the remaining outcomes
+        if sorted_values[i] + accumulated / (n - i) >= 0:
+            result[i:] = sorted_values[i:] + accumulated / (n - i)
+            break
+        accumulated += sorted_values[i]
+    probabilities = np.empty_like(result)
+    probabilities[order] = result
+    return probabilities
+
+
+class ReadoutMitigator:
+    """
+    Tensored readout mitigation. `matrices[i]` is the assignment matrix of bit i of the outcome index,
+    which is the rightmost character of a Qiskit bitstring.
+    """
+
+    def __init__(self, matrices, calibration_set_id: str = None):
+        self.matrices = np.asarray(matrices, dtype=float).reshape(-1, 2, 2)
+        self.inverses = np.linalg.inv(self.matrices)
+        self.calibration_set_id = calibration_set_id
+
+    @property
+    def num_qubits(self) -> int:
+        return len(self.matrices)
+
+    @classmethod
+    def from_errors(cls, errors, calibration_set_id: str = None) -> "ReadoutMitigator":
+        """
+        Creates a mitigator from readout errors, a list or a {bit: error} dictionary where each error is
+        either one symmetric error or a pair (p01, p10).
+        """
+        if not isinstance(errors, dict):
+            errors = dict(enumerate(errors))
+        matrices = []
+        for bit in range(max(errors) + 1):
+            error = errors.get(bit, 0.0)
+            p01, p10 = (error, error) if np.ndim(error) == 0 else error
+            matrices.append(assignment_matrix(p01, p10))
+        return cls(matrices, calibration_set_id)
+
+    @classmethod
+    def from_preparations(cls, zero_counts, one_counts, num_qubits: int) -> "ReadoutMitigator":
+        """
+        Creates a mitigator from the counts of circuits preparing every qubit in |0> and in |1>.
+        """
+        p01, p10 = [], []
+        for counts, errors, wrong in ((zero_counts, p01, 1), (one_counts, p10, 0)):
+            indices, probabilities = as_distribution(counts)
+            for bit in range(num_qubits):
+                errors.append(probabilities[((indices >> bit) & 1) == wrong].sum())
+        return cls([assignment_matrix(a, b) for a, b in zip(p01, p10)])
+
+    def subset(self, bits: list[int]) -> "ReadoutMitigator":
+        """
+        Returns the mitigator of a measurement whose bit i is read from bit `bits[i]` of this mitigator,
+        for example the physical qubits measured by a circuit.
+        """
+        return ReadoutMitigator(self.matrices[list(bits)], self.calibration_set_id)
+
+    def apply(self, counts, dense: bool = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the quasi-probabilities (indices, values) after applying the inverse assignment matrices.
+        The values can be negative.
+
+        With `dense` (the default up to `DENSE_MAX_QUBITS` qubits) these are the exact values of all 2^n
+        outcomes, which sum to one. Otherwise they are the approximate values of the observed outcomes,
+        whose sum differs from one by the weight given to unobserved outcomes, see the module documentation.
+        """
+        if dense is None:
+            dense = self.num_qubits <= DENSE_MAX_QUBITS
+        if dense:
+            return self._apply_dense(counts)
+        indices, values = as_distribution(counts)
+        for bit, inverse in enumerate(self.inverses):
+            measured = (indices >> bit) & 1
+            partner = indices ^ (1 << bit)
+            position = np.searchsorted(indices, partner)
+            found = position < len(indices)
+            found[found] = indices[position[found]] == partner[found]
+            partner_values = np.zeros_like(values)
+            partner_values[found] = values[position[found]]
+            values = inverse[measured, measured] * values + inverse[measured, 1 - measured] * partner_values
+        return indices, values
+
+    def _apply_dense(self, counts) -> tuple[np.ndarray, np.ndarray]:
+        num_qubits = self.num_qubits
+        indices, values = as_distribution(counts)
+        # Axis 0 of the tensor is the highest bit of the outcome index
+        tensor = np.zeros(2 ** num_qubits)
+        tensor[indices] = values
+        tensor = tensor.reshape((2,) * num_qubits)
+        for bit, inverse in enumerate(self.inverses):
+            axis = num_qubits - 1 - bit
+            tensor = np.moveaxis(np.tensordot(inverse, tensor, axes=([1], [axis])), 0, axis)
+        return np.arange(2 ** num_qubits), tensor.ravel()
+
+    def mitigate(self, counts, dense: bool = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the mitigated probability distribution (indices, probabilities), see `apply`.
+        """
+        indices, values = self.apply(counts, dense)
+        return indices, nearest_probability(values / values.sum())
+
+    def save(self, path: str):
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, matrices=self.matrices, calibration_set_id=str(self.calibration_set_id or ""))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ReadoutMitigator":
+        with np.load(path) as data:
+            return cls(data["matrices"], str(data["calibration_set_id"]) or None)
+
+
+def cached_mitigator(calibration_set_id, build, cache_dir: str = None) -> ReadoutMitigator:
+    """
+    Returns the mitigator of a calibration set from the disk cache, or calls `build()` and stores it.
+    """
+    if not calibration_set_id:
+        return build()
+    cache_dir = cache_dir or os.getenv("FIQCI_MITIGATION_CACHE", DEFAULT_CACHE_DIR)
+    path = os.path.join(cache_dir, f"{calibration_set_id}.npz")
+    try:
+        return ReadoutMitigator.load(path)
+    except (OSError, ValueError, KeyError):
+        pass
+    mitigator = build()
+    mitigator.calibration_set_id = str(calibration_set_id)
+    os.makedirs(cache_dir, exist_ok=True)
+    mitigator.save(path)
+    return mitigator
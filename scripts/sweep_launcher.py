@@ -0,0 +1,271 @@
+"""
+Fan a parameter sweep out over a SLURM job array.
+
+A large sweep run as one process does all the classical pre- and post-processing of every point on one
+core. `sweep_launcher.py` splits the grid of parameter values into shards of consecutive points and
+submits them as a job array with `batch_script.sh`, so the shards are processed on as many cores as
+the array has tasks while their quantum jobs still go through the queue one at a time.
+
+The sweep is described by a target function and its parameters:
+
+- The target is `file.py:function`. The function is called as `function(points, names)` with the
+  points of one shard as a (points, parameters) float array and returns one result per point, for
+  example an expectation value or a fixed-size vector of probabilities.
+- A parameter is `name=start:stop:length` for evenly spaced values like `cirq.Linspace`, or
+  `name=v1,v2,...` for a list of values. The grid is the product of the parameters, with the last
+  parameter changing fastest.
+
+`submit` writes the sweep to `<directory>/sweep.json` and submits the array and a merge job which runs
+once every shard has finished. `--module` sets the environment module the jobs load, for example
+helmi_cirq for cirq targets. Every shard writes its indices and results to a compressed
+`shard-NNNNN.npz`, and `merge` combines them into `<directory>/sweep.npz` where `results` has the
+shape of the grid.
+
+Usage:
+
+    python sweep_launcher.py submit sweep_dir my_sweep.py:evaluate theta=0:1:200 gamma=0:3.14:20 \
+        --shards 20 --max-parallel 4
+    python sweep_launcher.py run sweep_dir --shard 3   # what every array task runs
+    python sweep_launcher.py merge sweep_dir
+"""
+import argparse
+import importlib.util
+import json
+import os
+import shlex
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch_script.sh")
+
+
+def parse_parameter(text: str) -> dict:
+    """
+    Parses `name=start:stop:length` or `name=v1,v2,...`.
+    """
+    name, _, values = text.partition("=")
+    if not name or not values:
+        raise ValueError(f"Expected name=start:stop:length or name=v1,v2,... instead of {text}")
+    if ":" in values:
+        start, stop, length = values.split(":")
+        return {"name": name, "start": float(start), "stop": float(stop), "length": int(length)}
+    return {"name": name, "values": [float(v) for v in values.split(",")]}
+
+
+class SweepSpace:
+    """
+    The grid of values of the parameters of a sweep, numbered in row-major order.
+    """
+
+    def __init__(self, parameters: list[dict]):
+        self.names = [p["name"] for p in parameters]
+        self.axes = [
+            np.asarray(p["values"], dtype=float) if "values" in p else np.linspace(p["start"], p["stop"], p["length"])
+            for p in parameters
+        ]
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return tuple(len(axis) for axis in self.axes)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    def points(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Returns the parameter values of the points with the given indices as a (points, parameters) array.
+        """
+        coordinates = np.unravel_index(indices, self.shape)
+        return np.stack([axis[c] for axis, c in zip(self.axes, coordinates)], axis=1)
+
+    def shard(self, num_shards: int, shard: int) -> np.ndarray:
+        """
+        Returns the indices of the points of a shard. The shard sizes differ by at most one point.
+        """
+        bounds = np.linspace(0, self.size, num_shards + 1).astype(int)
+        return np.arange(bounds[shard], bounds[shard + 1])
+
+
+def load_sweep(directory: str) -> dict:
+    with open(os.path.join(directory, "sweep.json")) as f:
+        return json.load(f)
+
+
+def load_target(target: str):
+    """
+    Returns the function of a `file.py:function` target.
+    """
+    path, _, name = target.rpartition(":")
+    module_name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    # Let the target import its sibling modules
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    spec.loader.exec_module(module)
+    return getattr(module, name)
+
+
+def shard_path(directory: str, shard: int) -> str:
+    return os.path.join(directory, f"shard-{shard:05d}.npz")
+
+
+def run_shard(directory: str, shard: int) -> str:
+    """
+    Evaluates the points of one shard and writes their results. Returns the path of the shard file.
+    """
+    sweep = load_sweep(directory)
+    if not 0 <= shard < sweep["num_shards"]:
+        raise ValueError(f"Shard {shard} is not in 0..{sweep['num_shards'] - 1}")
+    space = SweepSpace(sweep["parameters"])
+    indices = space.shard(sweep["num_shards"], shard)
+    function = load_target(sweep["target"])
+    results = np.asarray(function(space.points(indices), space.names))
+    if len(results) != len(indices):
+        raise ValueError(f"{sweep['target']} returned {len(results)} results for {len(indices)} points")
+
+    path = shard_path(directory, shard)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, indices=indices, results=results)
+    os.replace(tmp_path, path)
+    return path
+
+
+def merge(directory: str) -> str:
+    """
+    Combines the shard files into `sweep.npz` and returns its path. Fails if a shard is missing.
+    """
+    sweep = load_sweep(directory)
+    space = SweepSpace(sweep["parameters"])
+    missing = [s for s in range(sweep["num_shards"]) if not os.path.exists(shard_path(directory, s))]
+    if missing:
+        raise ValueError(f"Missing shards {missing}, run them again with `run {directory} --shard N`")
+
+    results = None
+    for shard in range(sweep["num_shards"]):
+        with np.load(shard_path(directory, shard)) as data:
+            if results is None:
+                results = np.empty((space.size, *data["results"].shape[1:]), dtype=data["results"].dtype)
+            results[data["indices"]] = data["results"]
+
+    path = os.path.join(directory, "sweep.npz")
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    axes = {f"axis_{name}": axis for name, axis in zip(space.names, space.axes)}
+    np.savez_compressed(
+        tmp_path, names=np.array(space.names), results=results.reshape(space.shape + results.shape[1:]), **axes,
+    )
+    os.replace(tmp_path, path)
+    return path
+
+
+def _sbatch(arguments: list[str], dry_run: bool) -> str:
+    """
+    Runs sbatch and returns the job id, or prints the command and returns a placeholder on a dry run.
+    """
+    command = ["sbatch", "--parsable", *arguments]
+    if dry_run:
+        print(shlex.join(command))
+        return "<jobid>"
+    job_id = subprocess.run(command, capture_output=True, text=True, check=True).stdout.strip()
+    # --parsable prints "jobid" or "jobid;cluster"
+    return job_id.split(";")[0]
+
+
+def submit(
+    directory: str, target: str, parameters: list[dict], num_shards: int, max_parallel: int = None,
+    cpus_per_task: int = 1, template: str = TEMPLATE, sbatch_options: list[str] = (), dry_run: bool = False,
+    module: str = None,
+) -> tuple[str, str]:
+    """
+    Writes the sweep and submits the array and the merge job. Returns their job ids.
+
+    `module` is exported to the jobs as `FIQCI_MODULE`, the environment module `batch_script.sh` loads
+    instead of helmi_qiskit, for example helmi_cirq for cirq targets.
+    """
+    space = SweepSpace(parameters)
+    num_shards = min(num_shards, space.size)
+    os.makedirs(directory, exist_ok=True)
+    path, _, name = target.rpartition(":")
+    sweep = {
+        # The array tasks may start in another directory
+        "target": f"{os.path.abspath(path)}:{name}",
+        "parameters": parameters,
+        "num_shards": num_shards,
+        "created": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(directory, "sweep.json"), "w") as f:
+        json.dump(sweep, f, indent=2)
+
+    launcher = os.path.abspath(__file__)
+    directory = os.path.abspath(directory)
+    array = f"0-{num_shards - 1}" + (f"%{max_parallel}" if max_parallel else "")
+    export = [f"--export=ALL,FIQCI_MODULE={module}"] if module else []
+    # batch_script.sh runs `python -u "$@"`, so the launcher and its arguments are passed separately
+    array_id = _sbatch([
+        f"--array={array}", "--job-name=sweep", f"--cpus-per-task={cpus_per_task}",
+        f"--output={directory}/shard-%a.out", f"--error={directory}/shard-%a.err", *export, *sbatch_options,
+        template, launcher, "run", directory,
+    ], dry_run)
+    merge_id = _sbatch([
+        f"--dependency=afterok:{array_id}", "--job-name=sweep-merge",
+        f"--output={directory}/merge.out", f"--error={directory}/merge.err", *export, *sbatch_options,
+        template, launcher, "merge", directory,
+    ], dry_run)
+    print(f"Submitted {space.size} points in {num_shards} shards as job {array_id}, merge job {merge_id}")
+    return array_id, merge_id
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="Run a parameter sweep as a SLURM job array", formatter_class=argparse.RawTextHelpFormatter,
+        epilog="""Example usage:
+        python sweep_launcher.py submit sweep_dir my_sweep.py:evaluate theta=0:1:200 --shards 20
+        python sweep_launcher.py merge sweep_dir
+        """,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = commands.add_parser("submit", help="Write the sweep and submit the job array")
+    submit_parser.add_argument("directory", help="Directory for the sweep, its shards and the merged results")
+    submit_parser.add_argument("target", help="file.py:function evaluating the points of a shard")
+    submit_parser.add_argument("parameters", nargs="+", help="name=start:stop:length or name=v1,v2,...")
+    submit_parser.add_argument("--shards", type=int, default=10, help="Number of array tasks. Default 10.")
+    submit_parser.add_argument("--max-parallel", type=int, help="Array tasks running at the same time")
+    submit_parser.add_argument("--cpus-per-task", type=int, default=1, help="Cores of every array task")
+    submit_parser.add_argument("--template", default=TEMPLATE, help='Batch script running `python -u "$@"`')
+    submit_parser.add_argument(
+        "--module", help="Environment module the jobs load, for example helmi_cirq. Default helmi_qiskit.",
+    )
+    submit_parser.add_argument(
+        "--sbatch", nargs=argparse.REMAINDER, default=[], help="Further sbatch options, for example --account",
+    )
+    submit_parser.add_argument("--dry-run", action="store_true", help="Print the sbatch commands only")
+
+    run_parser = commands.add_parser("run", help="Evaluate one shard")
+    run_parser.add_argument("directory")
+    run_parser.add_argument("--shard", type=int, help="Shard to run, $SLURM_ARRAY_TASK_ID by default")
+
+    merge_parser = commands.add_parser("merge", help="Combine the shards into sweep.npz")
+    merge_parser.add_argument("directory")
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    if args.command == "submit":
+        submit(
+            args.directory, args.target, [parse_parameter(p) for p in args.parameters], args.shards,
+            args.max_parallel, args.cpus_per_task, args.template, args.sbatch, args.dry_run, args.module,
+        )
+    elif args.command == "run":
+        shard = args.shard if args.shard is not None else int(os.environ["SLURM_ARRAY_TASK_ID"])
+        print(f"Wrote {run_shard(args.directory, shard)}")
+    else:
+        print(f"Wrote {merge(args.directory)}")
+
+
+if __name__ == "__main__":
+    main()